@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional
+
+import server.config as config
+import server.metrics as metrics
+import server.session as session
+import server.tracing as tracing
+from server.models import PrecariousnessBaseModel
+from server.models.game_state import GameStateDelta
+from server.session import GameUnitOfWork
+from server.socket_handler import SocketHandler, router
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = router.worker_id
+
+_execution_mode, _game_lease = config.get_game_execution_config()
+_IDLE_TIMEOUT = 600
+_OWNER_CACHE_SECONDS = 1.0
+
+_actors: dict[str, "GameActor"] = {}
+_remote_owners: dict[str, tuple[str, float]] = {}
+_current_actor: ContextVar[Optional["GameActor"]] = ContextVar("current_actor", default=None)
+_socket_handler: Optional[SocketHandler] = None
+_listener_task = None
+
+metrics.Gauge("precariousness_owned_games", "Games whose actor runs on this worker", lambda: len(_actors))
+
+
+class GameActor:
+    """Owns one game's live state on this worker. Operations are queued on the actor's inbox and run one at a time
+    against players and a board held in memory, so they never interleave and never wait on Redis to read state. Each
+    operation's writes are queued for a separate checkpoint task that flushes them to Redis in order. The actor renews
+    its ownership lease while it runs and stops after sitting idle for `_IDLE_TIMEOUT` seconds."""
+
+    def __init__(self, game_id: str):
+        self.game_id = game_id
+        self.inbox: asyncio.Queue[tuple[Callable[[], Awaitable[None]], asyncio.Future]] = asyncio.Queue()
+        self.players = []
+        self.game_board = None
+        self._pending: list[GameUnitOfWork] = []
+        self._owned = True
+        self._flush_lock = asyncio.Lock()
+        self._checkpoint_needed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self._checkpoint_task = asyncio.create_task(self._checkpoint())
+
+    def submit(self, operation: Callable[[], Awaitable[None]]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.inbox.put_nowait((operation, future))
+        return future
+
+    def view(self) -> GameUnitOfWork:
+        return GameUnitOfWork(self.game_id, self.players, self.game_board)
+
+    async def transaction(self, operation: Callable[[GameUnitOfWork], Awaitable[None]]) -> GameUnitOfWork:
+        """Applies `operation` to the in-memory state and queues its writes for the next checkpoint. The operation runs
+        against copies of the players and board, which only replace the actor's once it succeeds, so an operation that
+        fails part way through leaves nothing behind, just like a discarded Redis transaction."""
+        unit_of_work = GameUnitOfWork(self.game_id, [player.copy() for player in self.players], self.game_board.copy_for_update())
+        await operation(unit_of_work)
+        unit_of_work._stamp()
+        # Buzzes are arbitrated in Redis, not by the actor, so a clue reopened for buzzing can't wait for a checkpoint.
+        # Leaving the reset out of the checkpoint stops it from clearing a lock won in the meantime.
+        for clue_id in unit_of_work._reset_buzz_lock_ids:
+            await session.reset_buzz_lock(self.game_id, clue_id)
+        unit_of_work._reset_buzz_lock_ids.clear()
+        self.players, self.game_board = unit_of_work.players, unit_of_work.game_board
+        self._pending.append(unit_of_work)
+        self._checkpoint_needed.set()
+        return unit_of_work
+
+    async def _run(self):
+        _current_actor.set(self)
+        try:
+            game = await session.load_game(self.game_id)
+            self.players, self.game_board = game.players, game.game_board
+            await self._recover()
+        except Exception:
+            logger.error(f"Failed to load game {self.game_id}", exc_info=True)
+            await self._stop()
+            return
+
+        while True:
+            try:
+                operation, future = await asyncio.wait_for(self.inbox.get(), timeout=_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self.inbox.empty():
+                    break
+                continue
+            try:
+                await operation()
+                future.set_result(None)
+            except asyncio.CancelledError:
+                future.set_exception(RuntimeError(f"Game {self.game_id} stopped while running an operation"))
+                raise
+            except Exception as e:
+                future.set_exception(e)
+        await self._stop()
+
+    async def _recover(self):
+        """Replays state changes that reached the game's event log but not a checkpoint, which happens when the game's
+        previous owner stopped between publishing an operation's STATE_CHANGED and flushing its writes."""
+        _, events = await session.read_events(self.game_id)
+        for changes in _unapplied_changes(events, self.game_board.version):
+            logger.info(f"Recovering game {self.game_id} state version {changes.version} from the event log")
+            await self.transaction(lambda unit_of_work: _apply_changes(unit_of_work, changes))
+
+    async def _checkpoint(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._checkpoint_needed.wait(), timeout=_game_lease / 3)
+            except asyncio.TimeoutError:
+                pass
+            self._checkpoint_needed.clear()
+
+            # Renewing the lease before writing means a worker that has lost the game never overwrites its new owner's state.
+            owner = await session.claim_game(self.game_id, WORKER_ID, _game_lease)
+            if owner != WORKER_ID:
+                logger.error(f"Lost ownership of game {self.game_id} to worker {owner}. Dropping {len(self._pending)} unwritten changes")
+                self._owned = False
+                self._pending.clear()
+                self._task.cancel()
+                await self._stop()
+                return
+            await self._flush()
+
+    async def _flush(self):
+        """Writes the pending units of work. A flush that is cancelled or fails puts its batch back for the next one, and
+        only one flush runs at a time so a later flush can't overtake an earlier one's writes."""
+        async with self._flush_lock:
+            if not self._owned:
+                self._pending.clear()
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                await session.checkpoint_games(pending)
+            except asyncio.CancelledError:
+                self._pending = pending + self._pending
+                raise
+            except Exception:
+                logger.error(f"Failed to checkpoint game {self.game_id}. Retrying", exc_info=True)
+                self._pending = pending + self._pending
+                self._checkpoint_needed.set()
+
+    async def _stop(self):
+        if _actors.get(self.game_id) is self:
+            del _actors[self.game_id]
+        for _, future in _drain(self.inbox):
+            future.set_exception(RuntimeError(f"Game {self.game_id} is no longer owned by this worker"))
+        if asyncio.current_task() is not self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            await asyncio.gather(self._checkpoint_task, return_exceptions=True)
+        await asyncio.shield(self._flush())
+        await session.release_game(self.game_id, WORKER_ID)
+
+
+async def _apply_changes(unit_of_work: GameUnitOfWork, changes: GameStateDelta):
+    unit_of_work.apply_changes(changes)
+
+
+def _unapplied_changes(events: list[tuple[int, str, list[str], str]], version: int) -> Iterator[GameStateDelta]:
+    """Yields the logged STATE_CHANGED events that carry on from state version `version`, one version at a time."""
+    for _, operation, _, message in events:
+        if operation != "STATE_CHANGED":
+            continue
+        changes = GameStateDelta.parse_obj(json.loads(message)["payload"])
+        if changes.since_version == version and changes.version == changes.since_version + 1:
+            version = changes.version
+            yield changes
+
+
+def _drain(queue: asyncio.Queue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+async def game_transaction(game_id: str, operation: Callable[[GameUnitOfWork], Awaitable[None]]) -> GameUnitOfWork:
+    """Runs `operation` against the game's state: in memory when called from the game's actor, otherwise as a Redis
+    transaction."""
+    actor = _current_actor.get()
+    if actor is not None and actor.game_id == game_id:
+        return await actor.transaction(operation)
+    return await session.run_game_transaction(game_id, operation)
+
+
+async def load_game(game_id: str) -> GameUnitOfWork:
+    actor = _current_actor.get()
+    if actor is not None and actor.game_id == game_id:
+        return actor.view()
+    return await session.load_game(game_id)
+
+
+async def load_snapshot(game_id: str) -> tuple[int, GameUnitOfWork, list[tuple[int, str, list[str], str]]]:
+    """The game as of its latest event, for catching up a spectator: that event's sequence number, the game's state
+    with every change logged up to it applied, and the logged events. The sequence number is read first, so the state
+    can only be ahead of it. A game whose actor runs on this worker is taken from the actor's memory, which can be
+    ahead of its last checkpoint. Otherwise the state is read from Redis and any logged changes it is missing are
+    applied to it, which covers changes another worker's actor has published but not yet checkpointed."""
+    latest_seq, events = await session.read_events(game_id)
+    events = [event for event in events if event[0] <= latest_seq]
+    actor = _actors.get(game_id)
+    if actor is not None and actor._owned and actor.game_board is not None:
+        return latest_seq, actor.view(), events
+
+    game = await session.load_game(game_id)
+    for changes in _unapplied_changes(events, game.game_board.version):
+        game = GameUnitOfWork(game_id, game.players, game.game_board)
+        game.apply_changes(changes)
+        game._stamp()
+    return latest_seq, game, events
+
+
+async def _find_owner(game_id: str) -> str:
+    if game_id in _actors:
+        return WORKER_ID
+    cached = _remote_owners.get(game_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    owner = await session.claim_game(game_id, WORKER_ID, _game_lease)
+    if owner == WORKER_ID:
+        _remote_owners.pop(game_id, None)
+        if game_id not in _actors:
+            _actors[game_id] = GameActor(game_id)
+    else:
+        _remote_owners[game_id] = (owner, time.monotonic() + _OWNER_CACHE_SECONDS)
+    return owner
+
+
+def _submit_local(game_id: str, operation_name: str, payload: PrecariousnessBaseModel, kwargs: dict, trace_context: Optional[list[str]] = None) -> asyncio.Future:
+    async def run():
+        with tracing.within(trace_context):
+            await _socket_handler.run_operation(game_id, operation_name, payload, **kwargs)
+
+    return _actors[game_id].submit(run)
+
+
+async def execute(game_id: str, operation_name: str, payload: PrecariousnessBaseModel, kwargs: dict):
+    """Executor for `SocketHandler`: runs the operation on the game's actor, creating it if no worker owns the game,
+    or forwards it to the owning worker. Forwarded operations are fire-and-forget, so their errors are only logged
+    by the owner."""
+    owner = await _find_owner(game_id)
+    if owner == WORKER_ID:
+        await _submit_local(game_id, operation_name, payload, kwargs, tracing.current())
+    else:
+        data = {"gameId": game_id, "operation": operation_name, "payload": payload.dict(by_alias=True), "kwargs": kwargs, "trace": tracing.current()}
+        await session.forward_operation(owner, json.dumps(data))
+
+
+def _log_forwarded_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Forwarded operation failed", exc_info=future.exception())
+
+
+async def _run_forwarded_operations():
+    async for data in session.listen_for_operations(WORKER_ID):
+        try:
+            message = json.loads(data)
+            game_id, operation_name = message["gameId"], message["operation"]
+            _, model_type = _socket_handler.operation_handlers[operation_name]
+            payload = model_type.parse_obj(message["payload"])
+            owner = await _find_owner(game_id)
+            if owner != WORKER_ID:
+                logger.warning(f"Received {operation_name} for game {game_id}, which is owned by worker {owner}. Forwarding it")
+                await session.forward_operation(owner, data)
+                continue
+            _submit_local(game_id, operation_name, payload, message["kwargs"], message.get("trace")).add_done_callback(_log_forwarded_failure)
+        except Exception:
+            logger.error(f"Failed to run forwarded operation: {data}", exc_info=True)
+
+
+def start(socket_handler: SocketHandler) -> None:
+    """Routes `socket_handler`'s operations through game actors when GAME_EXECUTION_MODE is 'actor'."""
+    global _socket_handler, _listener_task
+    router.snapshot_loader = load_snapshot
+    if _execution_mode != "actor":
+        return
+    _socket_handler = socket_handler
+    socket_handler.executor = execute
+    if not _listener_task:
+        _listener_task = asyncio.create_task(_run_forwarded_operations())
+
+
+async def stop() -> None:
+    if _listener_task:
+        _listener_task.cancel()
+    for actor in list(_actors.values()):
+        actor._task.cancel()
+        await actor._stop()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+import redis.asyncio as redis
+from redis.asyncio.client import PubSub
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+
+import server.config as config
+import server.metrics as metrics
+from server.memory_store import MemoryClient, MemoryStore
+
+logger = logging.getLogger(__name__)
+
+_memory_store = None
+_cluster_mode = config.get_session_backend() == "redis" and config.get_redis_cluster_mode()
+_node_clients: dict[tuple[str, bool], redis.Redis] = {}
+
+
+class MeteredConnection(redis.Connection):
+    """Counts every command or pipeline sent to Redis towards the session call that sent it."""
+
+    async def send_packed_command(self, command, check_health: bool = True) -> None:
+        metrics.count_redis_round_trip()
+        await super().send_packed_command(command, check_health)
+
+
+def cluster_mode() -> bool:
+    return _cluster_mode
+
+
+def hash_tag(game_id: str) -> str:
+    """The part of a key or channel name that decides its hash slot. In cluster mode a game's ID is wrapped in braces
+    so every key and channel belonging to the game lands in the same slot, which keeps the game's scripts and
+    transactions on one node."""
+    return f"{{{game_id}}}" if _cluster_mode else game_id
+
+
+def create_client(decode_responses: bool = True) -> redis.Redis | RedisCluster | MemoryClient:
+    """Builds a client for the configured session backend. Every in-process client in a worker shares one store, so
+    state and pubsub messages are visible across modules just as they are through Redis."""
+    global _memory_store
+    if config.get_session_backend() == "memory":
+        if _memory_store is None:
+            _memory_store = MemoryStore()
+        return MemoryClient(_memory_store, decode_responses=decode_responses)
+
+    host, port, password = config.get_redis_config()
+    if _cluster_mode:
+        cluster = RedisCluster(
+            host=host,
+            port=int(port),
+            password=password,
+            encoding="utf-8",
+            decode_responses=decode_responses,
+            max_connections=config.get_redis_max_connections(),
+        )
+        cluster.get_connection_kwargs()["connection_class"] = MeteredConnection
+        return cluster
+
+    connection_pool = redis.BlockingConnectionPool(
+        host=host,
+        port=int(port),
+        password=password,
+        encoding="utf-8",
+        decode_responses=decode_responses,
+        max_connections=config.get_redis_max_connections(),
+        connection_class=MeteredConnection,
+    )
+    return redis.StrictRedis(connection_pool=connection_pool)
+
+
+def register_script(client: redis.Redis | RedisCluster | MemoryClient, source: str, local_implementation: Callable[[MemoryStore, list, list], Any]):
+    """Registers a server-side script: the Lua `source` on Redis, or its Python equivalent on the in-process store."""
+    if isinstance(client, MemoryClient):
+        return client.register_script(local_implementation)
+    return client.register_script(source)
+
+
+async def _node_from_key(client: RedisCluster, key: str) -> ClusterNode:
+    await client.initialize()
+    return client.get_node_from_key(key)
+
+
+async def slot_client(client: redis.Redis | RedisCluster | MemoryClient, key: str) -> redis.Redis | MemoryClient:
+    """Returns a client for the node that serves `key`'s hash slot. The cluster client can't run MULTI/EXEC or WATCH,
+    so transactions on a game's keys go straight to the game's node. Outside cluster mode this is `client` itself."""
+    if not isinstance(client, RedisCluster):
+        return client
+    node = await _node_from_key(client, key)
+    decode_responses = client.get_connection_kwargs().get("decode_responses", False)
+    node_client = _node_clients.get((node.name, decode_responses))
+    if node_client is None:
+        connection_pool = redis.BlockingConnectionPool(
+            host=node.host,
+            port=node.port,
+            password=client.get_connection_kwargs().get("password"),
+            encoding="utf-8",
+            decode_responses=decode_responses,
+            max_connections=config.get_redis_max_connections(),
+            connection_class=MeteredConnection,
+        )
+        node_client = _node_clients[(node.name, decode_responses)] = redis.StrictRedis(connection_pool=connection_pool)
+    return node_client
+
+
+class _NodePubSub(PubSub):
+    """A pubsub connection to one cluster node that subscribes to sharded channels. redis-py's asyncio client has no
+    SSUBSCRIBE, so the commands are sent raw and sharded messages are treated like regular ones."""
+
+    PUBLISH_MESSAGE_TYPES = ("message", "pmessage", "smessage")
+    UNSUBSCRIBE_MESSAGE_TYPES = ("unsubscribe", "punsubscribe", "sunsubscribe")
+
+    async def ssubscribe(self, *channels: str):
+        await self.execute_command("SSUBSCRIBE", *channels)
+        self.channels.update(self._normalize_keys(dict.fromkeys(channels)))
+
+    async def sunsubscribe(self, *channels: str):
+        self.pending_unsubscribe_channels.update(self._normalize_keys(dict.fromkeys(channels)))
+        await self.execute_command("SUNSUBSCRIBE", *channels)
+
+    async def on_connect(self, connection):
+        self.pending_unsubscribe_channels.clear()
+        if self.channels:
+            await self.ssubscribe(*(self.encoder.decode(channel, force=True) for channel in self.channels))
+
+
+class ShardedPubSub:
+    """Subscribes to sharded channels across a Redis Cluster with one connection per node serving any of them, so a
+    message is only ever sent to the node that owns its channel's slot. Exposes the parts of `PubSub` the server uses;
+    messages from every node come out of `get_message`."""
+
+    def __init__(self, cluster: RedisCluster):
+        self._cluster = cluster
+        self._nodes: dict[str, tuple[_NodePubSub, asyncio.Task]] = {}
+        self._channel_nodes: dict[str, str] = {}
+        self._messages: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            node_name = (await _node_from_key(self._cluster, channel)).name
+            if node_name not in self._nodes:
+                node_client = await slot_client(self._cluster, channel)
+                pubsub = _NodePubSub(node_client.connection_pool, ignore_subscribe_messages=True)
+                self._nodes[node_name] = (pubsub, asyncio.create_task(self._read(pubsub)))
+            await self._nodes[node_name][0].ssubscribe(channel)
+            self._channel_nodes[channel] = node_name
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels:
+            node_name = self._channel_nodes.pop(channel, None)
+            if node_name is not None:
+                await self._nodes[node_name][0].sunsubscribe(channel)
+
+    async def _read(self, pubsub: _NodePubSub):
+        while True:
+            if not pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except redis.ConnectionError:
+                logger.error("Lost connection to a cluster node's sharded channels. Retrying", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if message is not None:
+                self._messages.put_nowait(message)
+
+    async def get_message(self, ignore_subscribe_messages: bool = True, timeout: Optional[float] = None) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._messages.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        for pubsub, task in self._nodes.values():
+            task.cancel()
+            await pubsub.close()
+        self._nodes.clear()
+        self._channel_nodes.clear()
+
+
+def create_pubsub(client: redis.Redis | RedisCluster | MemoryClient):
+    """A pubsub for `client`: sharded in cluster mode, a regular one otherwise."""
+    if isinstance(client, RedisCluster):
+        return ShardedPubSub(client)
+    return client.pubsub(ignore_subscribe_messages=True)
+
+
+async def publish(client: redis.Redis | RedisCluster | MemoryClient, channel: str, message: str | bytes) -> int:
+    """Publishes to a channel, with SPUBLISH on the node that owns the channel's slot in cluster mode."""
+    if isinstance(client, RedisCluster):
+        return await client.execute_command("SPUBLISH", channel, message, target_nodes=await _node_from_key(client, channel))
+    return await client.publish(channel, message)
+
+
+async def close(client: redis.Redis | RedisCluster | MemoryClient):
+    if isinstance(client, RedisCluster):
+        await client.close()
+        for node_client in _node_clients.values():
+            await node_client.close(close_connection_pool=True)
+        _node_clients.clear()
+    else:
+        await client.close(close_connection_pool=True)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import Optional
+
+import server.codec as codec
+import server.config as config
+import server.session as session
+from server.models.message import PingMessage
+from server.socket_handler import player_channel, router
+
+logger = logging.getLogger(__name__)
+
+_buzz_window, _ping_interval = config.get_buzzer_config()
+_RTT_SMOOTHING = 0.25
+
+_round_trip_times: dict[tuple[str, str], float] = {}
+_outstanding_pings: dict[tuple[str, str], tuple[str, float]] = {}
+
+
+def record_round_trip(game_id: str, player_id: str, ping_id: str) -> None:
+    """Records the round trip of the player's latest ping, timed by the server's own clock. A PONG for any other ping
+    is ignored. Round trips longer than the buzz window are counted as the buzz window, so a player who holds their
+    PONGs back can't buy themselves more than one window's worth of compensation."""
+    outstanding = _outstanding_pings.get((game_id, player_id))
+    if outstanding is None or not secrets.compare_digest(outstanding[0], ping_id):
+        return
+    del _outstanding_pings[(game_id, player_id)]
+    sample = min(time.monotonic() - outstanding[1], _buzz_window)
+    previous = _round_trip_times.get((game_id, player_id))
+    _round_trip_times[(game_id, player_id)] = sample if previous is None else previous + _RTT_SMOOTHING * (sample - previous)
+
+
+def get_round_trip_time(game_id: str, player_id: str) -> float:
+    return _round_trip_times.get((game_id, player_id), 0.0)
+
+
+def forget_player(game_id: str, player_id: str) -> None:
+    _round_trip_times.pop((game_id, player_id), None)
+    _outstanding_pings.pop((game_id, player_id), None)
+
+
+async def measure_round_trip_times(game_id: str, player_id: str):
+    """Pings a player's socket for as long as it is connected. Each ping carries a random ID that the client echoes back
+    in a PONG, which is fed to `record_round_trip`. Pings go through the socket's outbound queue, so time spent queued behind other
+    frames counts towards the player's latency just like it does for a clue."""
+    channel = player_channel(game_id, player_id)
+    while True:
+        ping_id = secrets.token_hex(8)
+        _outstanding_pings[(game_id, player_id)] = ping_id, time.monotonic()
+        router.send_to_local_socket(channel, codec.encode_message(game_id, "PING", PingMessage(ping_id=ping_id)))
+        await asyncio.sleep(_ping_interval)
+
+
+async def arbitrate_buzz(game_id: str, clue_id: str, player_id: str) -> Optional[str]:
+    """Decides who wins a clue's buzz. Returns the winner's player ID if this buzz settled the clue, otherwise None.
+
+    Buzzes are collected for a short window after the first one arrives and ranked by arrival time minus the player's
+    smoothed round trip time. Subtracting the full round trip compensates for both the clue reaching the player and
+    the buzz coming back. Only the buzz that opened the window waits for it to close; every other buzz returns after a
+    single script call."""
+    if _buzz_window <= 0:
+        won, _ = await session.buzz(game_id, clue_id, player_id)
+        if not won:
+            logger.info(f"Player {player_id} buzzed too late.")
+        return player_id if won else None
+
+    buzz_time = time.time() - get_round_trip_time(game_id, player_id)
+    status = await session.enter_buzz_window(game_id, clue_id, player_id, buzz_time, _buzz_window)
+    if status < 0:
+        logger.info(f"Player {player_id} buzzed too late.")
+    if status != 1:
+        return None
+
+    await asyncio.sleep(_buzz_window)
+    return await session.close_buzz_window(game_id, clue_id)
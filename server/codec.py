@@ -0,0 +1,117 @@
+import json
+from typing import Any, Callable, Optional, Type
+
+from fastapi import WebSocket
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_SINGLETON, ModelField
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+_SUBPROTOCOLS = {f"precariousness.{JSON}": JSON, f"precariousness.{MSGPACK}": MSGPACK}
+_encoders: dict[Type[BaseModel], Callable[[BaseModel], dict]] = {}
+
+
+def _field_encoder(field: ModelField) -> Optional[Callable[[Any], Any]]:
+    if not (isinstance(field.type_, type) and issubclass(field.type_, BaseModel)):
+        return None
+    if field.shape == SHAPE_SINGLETON:
+        return lambda value: None if value is None else to_wire(value)
+    if field.shape == SHAPE_LIST:
+        return lambda value: None if value is None else [to_wire(v) for v in value]
+    if field.shape == SHAPE_DICT:
+        return lambda value: None if value is None else {k: to_wire(v) for k, v in value.items()}
+    return _to_wire_value
+
+
+def _to_wire_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return to_wire(value)
+    if isinstance(value, (list, tuple)):
+        return [_to_wire_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_wire_value(v) for k, v in value.items()}
+    return value
+
+
+def _build_encoder(model_type: Type[BaseModel]) -> Callable[[BaseModel], dict]:
+    """Looks up each field's alias and whether it holds nested models once per model type, so encoding an instance is
+    a single pass over its attributes instead of a walk through pydantic's `dict()` machinery."""
+    scalar_fields = []
+    nested_fields = []
+    for name, field in model_type.__fields__.items():
+        encoder = _field_encoder(field)
+        if encoder is None:
+            scalar_fields.append((name, field.alias))
+        else:
+            nested_fields.append((name, field.alias, encoder))
+
+    def encode(model: BaseModel) -> dict:
+        wire = {alias: getattr(model, name) for name, alias in scalar_fields}
+        for name, alias, encoder in nested_fields:
+            wire[alias] = encoder(getattr(model, name))
+        return wire
+
+    _encoders[model_type] = encode
+    return encode
+
+
+def to_wire(model: BaseModel) -> dict:
+    """Equivalent to `model.dict(by_alias=True)` for the flat models sent over sockets."""
+    encoder = _encoders.get(type(model)) or _build_encoder(type(model))
+    return encoder(model)
+
+
+def encode_message(game_id: str, operation: str, payload: BaseModel | list[BaseModel]) -> bytes:
+    """Encodes an outbound `SocketMessage` as JSON without building the envelope model."""
+    if isinstance(payload, list):
+        wire_payload = [to_wire(p) for p in payload]
+    else:
+        wire_payload = to_wire(payload)
+    return json.dumps({"operation": operation, "payload": wire_payload, "gameId": game_id}).encode()
+
+
+def transcode(data: bytes, encoding: str) -> bytes:
+    """Converts a JSON encoded message to the socket's encoding."""
+    if encoding == MSGPACK:
+        return msgpack.packb(json.loads(data))
+    return data
+
+
+def encode_batch(messages: list[bytes], encoding: str) -> bytes:
+    """Joins messages already in the socket's encoding into one frame holding an array of them."""
+    if encoding == MSGPACK:
+        return msgpack.Packer().pack_array_header(len(messages)) + b"".join(messages)
+    return b"[" + b",".join(messages) + b"]"
+
+
+def decode_frame(message: dict, encoding: str) -> Any:
+    """Decodes an inbound websocket frame. Binary frames on a MessagePack socket are MessagePack; everything else
+    is JSON."""
+    if message.get("bytes") is not None:
+        if encoding == MSGPACK:
+            return msgpack.unpackb(message["bytes"])
+        return json.loads(message["bytes"])
+    return json.loads(message["text"])
+
+
+def negotiate(websocket: WebSocket) -> Optional[str]:
+    """Picks the socket's encoding from the subprotocols the client offered, preferring MessagePack when it's
+    installed. Returns the subprotocol to accept, if any, and records the encoding on the socket's state."""
+    websocket.state.encoding = JSON
+    offered = [p for p in websocket.scope.get("subprotocols", []) if p in _SUBPROTOCOLS]
+    for subprotocol in sorted(offered, key=lambda p: _SUBPROTOCOLS[p] != MSGPACK):
+        if _SUBPROTOCOLS[subprotocol] == MSGPACK and msgpack is None:
+            continue
+        websocket.state.encoding = _SUBPROTOCOLS[subprotocol]
+        return subprotocol
+    return None
+
+
+def socket_encoding(websocket: WebSocket) -> str:
+    return getattr(websocket.state, "encoding", JSON)
@@ -48,3 +48,75 @@ def get_redis_config() -> tuple[str, str, Optional[str]]:
             raise KeyError(f"Required environment variables missing: {', '.join(_errors)}")
 
         return host, port, None
+
+
+def get_redis_max_connections() -> int:
+    return int(os.environ.get("REDIS_MAX_CONNECTIONS", 64))
+
+
+def get_redis_cluster_mode() -> bool:
+    return os.environ.get("REDIS_CLUSTER", "false").lower() in ("1", "true", "yes")
+
+
+def get_socket_queue_config() -> tuple[int, str]:
+    max_queue_size = int(os.environ.get("SOCKET_QUEUE_SIZE", 256))
+    overflow_policy = os.environ.get("SOCKET_OVERFLOW_POLICY", "drop").lower()
+    if overflow_policy not in ("drop", "close"):
+        raise ValueError(f"Invalid SOCKET_OVERFLOW_POLICY: {overflow_policy}. Expected 'drop' or 'close'")
+    return max_queue_size, overflow_policy
+
+
+def get_socket_batch_window() -> float:
+    return int(os.environ.get("SOCKET_BATCH_WINDOW_MS", 5)) / 1000
+
+
+def get_spectator_queue_size() -> int:
+    return int(os.environ.get("SPECTATOR_QUEUE_SIZE", 16))
+
+
+def get_board_cache_size() -> int:
+    return int(os.environ.get("BOARD_CACHE_SIZE", 1024))
+
+
+def get_buzzer_config() -> tuple[float, float]:
+    buzz_window = int(os.environ.get("BUZZ_WINDOW_MS", 150)) / 1000
+    ping_interval = int(os.environ.get("RTT_PING_INTERVAL_MS", 2000)) / 1000
+    return buzz_window, ping_interval
+
+
+def get_clue_time() -> float:
+    return int(os.environ.get("CLUE_TIME_MS", 20000)) / 1000
+
+
+def get_event_log_size() -> int:
+    return int(os.environ.get("EVENT_LOG_MAX_LEN", 1000))
+
+
+def get_player_grace_period() -> float:
+    return int(os.environ.get("PLAYER_GRACE_PERIOD_MS", 60000)) / 1000
+
+
+def get_game_execution_config() -> tuple[str, float]:
+    execution_mode = os.environ.get("GAME_EXECUTION_MODE", "direct").lower()
+    if execution_mode not in ("direct", "actor"):
+        raise ValueError(f"Invalid GAME_EXECUTION_MODE: {execution_mode}. Expected 'direct' or 'actor'")
+    game_lease = int(os.environ.get("GAME_LEASE_MS", 15000)) / 1000
+    return execution_mode, game_lease
+
+
+def get_session_backend() -> str:
+    backend = os.environ.get("SESSION_BACKEND", "redis").lower()
+    if backend not in ("redis", "memory"):
+        raise ValueError(f"Invalid SESSION_BACKEND: {backend}. Expected 'redis' or 'memory'")
+    return backend
+
+
+def get_tracing_config() -> tuple[float, Optional[str], Optional[str]]:
+    sample_rate = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+    if not 0 <= sample_rate <= 1:
+        raise ValueError(f"Invalid TRACE_SAMPLE_RATE: {sample_rate}. Expected a number from 0 to 1")
+    trace_file = os.environ.get("TRACE_FILE")
+    otlp_endpoint = os.environ.get("TRACE_OTLP_ENDPOINT")
+    if not trace_file and not otlp_endpoint:
+        trace_file = "traces.jsonl"
+    return sample_rate, trace_file, otlp_endpoint
@@ -1,15 +1,24 @@
+import asyncio
 import logging
 import random
 import sys
 import uuid
 from json import JSONDecodeError
+from typing import Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Query, status
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import ValidationError
 
+import server.actors as actors
+import server.buzzer as buzzer
+import server.codec as codec
+import server.config as config
+import server.metrics as metrics
 import server.session as session
+import server.timers as timers
+import server.tracing as tracing
 from server.exceptions import InvalidPlayerId, InvalidOperation
 from server.log import configure_logging
 from server.models.game_state import GameBoard, Player
@@ -36,15 +45,18 @@ from server.models.message import (
     ClueExpiredMessage,
     GameId,
     ClueWithGameId,
+    StateRequest,
+    PongMessage,
+    PlayerLeftMessage,
+    MarkAnswerUsedMessage,
 )
 from server.socket_handler import (
     SocketHandler,
-    register_socket_route,
     player_channel,
     host_channel,
     gameboard_channel,
     publish_message,
-    unregister_socket_route,
+    router,
 )
 
 configure_logging()
@@ -55,6 +67,9 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 
 socket_handler = SocketHandler()
 
+_player_grace_period = config.get_player_grace_period()
+_grace_period_tasks: set[asyncio.Task] = set()
+
 
 class RequestError(Exception):
     def __init__(self, message: str, status_code=500):
@@ -88,11 +103,39 @@ async def bad_request(_: Request, exc: RequestError):
     return exc.to_json_response()
 
 
+@app.on_event("startup")
+async def start_session_store():
+    await session.start()
+    await router.start()
+    await tracing.start()
+    actors.start(socket_handler)
+    timers.start(socket_handler)
+
+
+@app.on_event("shutdown")
+async def close_session_store():
+    await timers.stop()
+    await actors.stop()
+    await router.stop()
+    await tracing.stop()
+    await session.close()
+
+
 @app.get("/status")
 async def health_check():
     return JSONResponse(content={"message": "ok"}, status_code=200)
 
 
+@app.get("/stats")
+async def stats():
+    return JSONResponse(content={"boardCache": session.get_board_cache_stats()})
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/player")
 async def player_init():
     return FileResponse("static/player.html")
@@ -111,7 +154,7 @@ async def gameboard_init():
 @app.post("/init_game")
 async def initialize_game(game_board: GameBoard):
     game_id = session.generate_game_id()
-    session.save_game_board(game_id, game_board)
+    await session.save_game_board(game_id, game_board)
 
     response = JSONResponse(content={"gameId": game_id})
     response.set_cookie("game-id", game_id)
@@ -120,72 +163,119 @@ async def initialize_game(game_board: GameBoard):
 
 @app.post("/new_player")
 async def register_new_player(game_id_request: GameId):
-    if not session.game_exists(game_id_request.game_id):
+    if not await session.game_exists(game_id_request.game_id):
         raise RequestError(status_code=400, message=f"Game ID \"{game_id_request.game_id}\" does not exist")
 
     new_player_id = str(uuid.uuid4())
-    response = JSONResponse(content={"playerId": new_player_id})
+    resume_token = await session.save_resume_token(game_id_request.game_id, new_player_id)
+    response = JSONResponse(content={"playerId": new_player_id, "resumeToken": resume_token})
     response.set_cookie("game-id", game_id_request.game_id)
     return response
 
 
 @app.post("/new_host")
 async def register_host(game_id_request: GameId):
-    if not session.game_exists(game_id_request.game_id):
+    if not await session.game_exists(game_id_request.game_id):
         raise RequestError(status_code=400, message=f"Game ID \"{game_id_request.game_id}\" does not exist")
-    if session.host_exists(game_id_request.game_id):
+    if await session.host_exists(game_id_request.game_id):
         raise RequestError(status_code=400, message=f"A host for game ID \"{game_id_request.game_id}\" already exists")
-    session.save_host(game_id_request.game_id)
+    await session.save_host(game_id_request.game_id)
 
-    players = session.get_all_players(game_id_request.game_id)
+    players = await session.get_all_players(game_id_request.game_id)
     response = JSONResponse(content=[p.dict(by_alias=True) for p in players])
     response.set_cookie("game-id", game_id_request.game_id)
     return response
 
 
 @app.post("/get_game_board_state")
-async def get_game_board_state(game_id_request: GameId):
-    return session.get_game_board(game_id_request.game_id)
+async def get_game_board_state(state_request: StateRequest):
+    if state_request.since_version is None:
+        return await session.get_game_board(state_request.game_id)
+
+    changes = await session.get_state_changes(state_request.game_id, state_request.since_version)
+    if changes.version <= state_request.since_version:
+        return Response(status_code=304)
+    return JSONResponse(content=changes.dict(by_alias=True, include={"since_version", "version", "current_round", "answered_tile_ids"}))
 
 
 @app.post("/get_players_state")
-async def get_players_state(game_id_request: GameId):
-    return session.get_all_players(game_id_request.game_id)
+async def get_players_state(state_request: StateRequest):
+    if state_request.since_version is None:
+        return await session.get_all_players(state_request.game_id)
+
+    changes = await session.get_state_changes(state_request.game_id, state_request.since_version)
+    if changes.version <= state_request.since_version:
+        return Response(status_code=304)
+    return JSONResponse(content=changes.dict(by_alias=True, include={"since_version", "version", "players", "removed_player_ids"}))
 
 
 @app.post("/mark_answer_used")
 async def mark_answer_used(tile: ClueWithGameId):
-    game_board = session.get_game_board(tile.game_id)
-    categories = game_board.rounds[game_board.current_round]
-    category = next((c for c in categories if c.key == tile.category_key), None)
-    if not category:
-        raise KeyError(f"Category does not exist: {tile.category_key}")
-    category.tiles[tile.amount].answered = True
-    logger.info(f"Marked {game_board.current_round} -> {tile.category_key} -> {tile.amount} as used")
-    session.save_game_board(tile.game_id, game_board)
+    await socket_handler.execute(tile.game_id, "MARK_ANSWER_USED", MarkAnswerUsedMessage(category_key=tile.category_key, amount=tile.amount))
 
 
 @app.websocket("/player_socket/{game_id}/{player_id}")
-async def init_player_socket(websocket: WebSocket, game_id, player_id: str):
-    await websocket.accept()
-    await register_socket_route(player_channel(game_id, player_id), websocket)
-    await socket_handler.handle_operation(websocket, player_id=player_id)
+async def init_player_socket(
+    websocket: WebSocket,
+    game_id,
+    player_id: str,
+    last_seq: Optional[int] = Query(None, alias="lastSeq"),
+    resume_token: Optional[str] = Query(None, alias="resumeToken"),
+    batch: bool = Query(False),
+):
+    await websocket.accept(subprotocol=codec.negotiate(websocket))
+    if not await session.check_resume_token(game_id, player_id, resume_token):
+        logger.error(f"Rejected player socket \"{player_id}\" with an invalid resume token")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    websocket.state.connection_id = uuid.uuid4().hex
+    await session.save_player_connection(game_id, player_id, websocket.state.connection_id)
+    await router.register(game_id, player_channel(game_id, player_id), websocket, last_seq, batch)
+    if last_seq is not None:
+        logger.info(f"Player socket \"{player_id}\" resumed after event {last_seq}")
+    round_trip_task = asyncio.create_task(buzzer.measure_round_trip_times(game_id, player_id))
+    try:
+        await socket_handler.handle_operation(websocket, player_id=player_id)
+    finally:
+        round_trip_task.cancel()
+        buzzer.forget_player(game_id, player_id)
 
 
 @app.websocket("/host_socket/{game_id}")
-async def init_host_socket(websocket: WebSocket, game_id: str):
-    await websocket.accept()
-    await register_socket_route(host_channel(game_id), websocket)
+async def init_host_socket(websocket: WebSocket, game_id: str, last_seq: Optional[int] = Query(None, alias="lastSeq"), batch: bool = Query(False)):
+    await websocket.accept(subprotocol=codec.negotiate(websocket))
+    await router.register(game_id, host_channel(game_id), websocket, last_seq, batch)
     await socket_handler.handle_operation(websocket)
 
 
 @app.websocket("/gameboard_socket/{game_id}")
-async def init_gameboard_socket(websocket: WebSocket, game_id: str):
-    await websocket.accept()
-    await register_socket_route(gameboard_channel(game_id), websocket)
+async def init_gameboard_socket(websocket: WebSocket, game_id: str, last_seq: Optional[int] = Query(None, alias="lastSeq"), batch: bool = Query(False)):
+    await websocket.accept(subprotocol=codec.negotiate(websocket))
+    await router.register(game_id, gameboard_channel(game_id), websocket, last_seq, batch)
     await socket_handler.handle_operation(websocket)
 
 
+@app.websocket("/spectator_socket/{game_id}")
+async def init_spectator_socket(websocket: WebSocket, game_id: str):
+    """A read-only view of the game for its audience. The only thing a spectator can send is a REQUEST_SNAPSHOT, which
+    resyncs it from a fresh snapshot of the game; anything else is ignored."""
+    await websocket.accept(subprotocol=codec.negotiate(websocket))
+    if not await session.game_exists(game_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    spectator = await router.add_spectator(game_id, websocket)
+    try:
+        while (frame := await websocket.receive())["type"] != "websocket.disconnect":
+            try:
+                data = codec.decode_frame(frame, spectator.encoding)
+            except (ValueError, TypeError):
+                continue
+            if isinstance(data, dict) and data.get("operation") == "REQUEST_SNAPSHOT":
+                router.resync_spectator(game_id, spectator)
+    finally:
+        await router.remove_spectator(game_id, spectator)
+
+
 @socket_handler.error(InvalidOperation)
 async def handle_invalid_operation(websocket: WebSocket, exc: InvalidOperation):
     message = f"Invalid operation: {exc.operation_name}"
@@ -212,19 +302,36 @@ async def handle_websocket_disconnect(websocket: WebSocket, exc: WebSocketDiscon
     game_id = websocket.path_params["game_id"]
     if "player_id" in websocket.path_params:
         player_id = websocket.path_params["player_id"]
-        session.remove_player(game_id, player_id)
-        await unregister_socket_route(player_channel(game_id, player_id))
-        logger.warning(f"Player socket \"{player_id}\" disconnected")
+        router.detach(player_channel(game_id, player_id), websocket)
+        task = asyncio.create_task(_end_grace_period(game_id, player_id, websocket.state.connection_id))
+        _grace_period_tasks.add(task)
+        task.add_done_callback(_grace_period_tasks.discard)
+        logger.warning(f"Player socket \"{player_id}\" disconnected. Holding their place for {_player_grace_period} seconds")
     elif websocket.url.path.startswith("/host_socket"):
-        await unregister_socket_route(host_channel(game_id))
+        router.detach(host_channel(game_id), websocket)
+        await router.release(game_id, host_channel(game_id))
         logger.error("Host socket disconnected")
     else:
-        await unregister_socket_route(gameboard_channel(game_id))
+        router.detach(gameboard_channel(game_id), websocket)
+        await router.release(game_id, gameboard_channel(game_id))
         logger.error("Gameboard socket disconnected")
 
     return None
 
 
+async def _end_grace_period(game_id: str, player_id: str, connection_id: str):
+    """Removes a disconnected player once the grace period is over, unless one of their sockets has reconnected
+    since, on this worker or any other."""
+    await asyncio.sleep(_player_grace_period)
+    try:
+        if await session.end_player_connection(game_id, player_id, connection_id):
+            await socket_handler.execute(game_id, "PLAYER_LEFT", PlayerLeftMessage(), player_id=player_id)
+            logger.warning(f"Player \"{player_id}\" did not reconnect and was removed")
+        await router.release(game_id, player_channel(game_id, player_id))
+    except Exception:
+        logger.error(f"Failed to end the grace period for player \"{player_id}\"", exc_info=True)
+
+
 @socket_handler.error(Exception)
 async def handle_exception(websocket: WebSocket, _: Exception):
     message = "Server error"
@@ -235,43 +342,63 @@ async def handle_exception(websocket: WebSocket, _: Exception):
 @socket_handler.operation("PLAYER_INIT", PlayerInitMessage)
 async def handle_player_init(game_id: str, inbound_message: PlayerInitMessage, player_id: str):
     new_player = Player(id=player_id, name=inbound_message.player_name, score=0)
-    session.save_player(game_id, new_player)
+
+    async def join(game: session.GameUnitOfWork):
+        game.save_player(new_player)
+
+    await actors.game_transaction(game_id, join)
     logger.info(f"Player initialized: ({new_player.name}){player_id}")
     outbound_message = PlayerJoinedMessage(player_id=player_id, player_name=inbound_message.player_name, player_score=0)
     await publish_message(game_id, "PLAYER_JOINED", outbound_message, [host_channel(game_id), gameboard_channel(game_id)])
 
 
+@socket_handler.operation("PLAYER_LEFT", PlayerLeftMessage, internal=True)
+async def handle_player_left(game_id: str, _: PlayerLeftMessage, player_id: str):
+    async def leave(game: session.GameUnitOfWork):
+        game.remove_player(player_id)
+
+    await actors.game_transaction(game_id, leave)
+
+
+@socket_handler.operation("MARK_ANSWER_USED", MarkAnswerUsedMessage, internal=True)
+async def handle_mark_answer_used(game_id: str, mark_answer_used_message: MarkAnswerUsedMessage):
+    """Started by the /mark_answer_used endpoint, so in actor mode the tile is marked by the game's actor rather than
+    written to Redis behind its back."""
+
+    async def mark(game: session.GameUnitOfWork):
+        game.mark_tile_answered(game.game_board.get_tile(mark_answer_used_message.category_key, mark_answer_used_message.amount))
+
+    game = await actors.game_transaction(game_id, mark)
+    logger.info(f"Marked {game.game_board.current_round} -> {mark_answer_used_message.category_key} -> {mark_answer_used_message.amount} as used")
+
+
 @socket_handler.operation("START_GAME", StartGameMessage)
 async def handle_start_game(game_id: str, _: StartGameMessage):
     all_players_in_message = AllPlayersIn()
     await publish_message(game_id, "ALL_PLAYERS_IN", all_players_in_message, gameboard_channel(game_id))
-    players = session.get_all_players(game_id)
+    players = (await actors.load_game(game_id)).players
     random_player = list(players)[random.randint(0, len(players)) - 1]
-    await _next_turn(random_player, game_id)
+    await _next_turn(random_player, players, game_id)
 
 
-@socket_handler.operation("SELECT_CATEGORY", SelectCategoryMessage)
+@socket_handler.operation("SELECT_CATEGORY", SelectCategoryMessage, stateless=True)
 async def handle_category_selected(game_id: str, select_category_message: SelectCategoryMessage, player_id: str):
     category_selected_message = CategorySelectedMessage(category_key=select_category_message.category_key)
     await publish_message(game_id, "CATEGORY_SELECTED", category_selected_message, [host_channel(game_id), gameboard_channel(game_id)])
 
 
-@socket_handler.operation("DESELECT_CATEGORY", DeselectCategoryMessage)
+@socket_handler.operation("DESELECT_CATEGORY", DeselectCategoryMessage, stateless=True)
 async def handle_deselect_category(game_id: str, deselect_category_message: DeselectCategoryMessage, player_id: str):
     await publish_message(game_id, "CATEGORY_DESELECTED", deselect_category_message, [host_channel(game_id), gameboard_channel(game_id)])
 
 
 @socket_handler.operation("SELECT_CLUE", SelectClueMessage)
 async def handle_clue_selected(game_id: str, select_clue_message: SelectClueMessage, player_id: str):
-    game_board = session.get_game_board(game_id)
-    categories = game_board.rounds[game_board.current_round]
-    category = next((c for c in categories if c.key == select_clue_message.category_key), None)
-    if not category:
-        raise KeyError(f"Category does not exist: {select_clue_message.category_key}")
-    clue_text = category.tiles[select_clue_message.amount].clue
+    game = await actors.load_game(game_id)
+    clue_text = game.game_board.get_tile(select_clue_message.category_key, select_clue_message.amount).clue
     clue_selected_message = ClueSelectedMessage(clue_text=clue_text, **select_clue_message.dict())
 
-    player_ids = [p.id for p in session.get_all_players(game_id)]
+    player_ids = [p.id for p in game.players]
     await publish_message(
         game_id, "CLUE_SELECTED", clue_selected_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
     )
@@ -280,40 +407,50 @@ async def handle_clue_selected(game_id: str, select_clue_message: SelectClueMess
 @socket_handler.operation("CLUE_REVEALED", ClueRevealedMessage)
 async def handle_clue_revealed(game_id: str, clue_revealed_message: ClueRevealedMessage):
     print("Inside CLUE_REVEALED handler")
-    game_board = session.get_game_board(game_id)
-    tile = game_board.get_tile(clue_revealed_message.category_key, clue_revealed_message.amount)
+    game = await actors.load_game(game_id)
+    tile = game.game_board.get_tile(clue_revealed_message.category_key, clue_revealed_message.amount)
 
     clue_info_message = ClueInfo(clue=tile.clue, correct_response=tile.correct_response, clue_id=tile.id)
-    player_ids = [p.id for p in session.get_all_players(game_id)]
+    player_ids = [p.id for p in game.players]
     print("Sending CLUE_REVEALED message to host and players: ", player_ids)
     await publish_message(game_id, "CLUE_REVEALED", clue_info_message, [host_channel(game_id), *player_channel(game_id, player_ids)])
+    await timers.start_clue_timer(game_id, clue_revealed_message)
 
 
-@socket_handler.operation("PLAYER_BUZZ", PlayerBuzzMessage)
+@socket_handler.operation("PLAYER_BUZZ", PlayerBuzzMessage, stateless=True)
 async def handle_player_buzz(game_id: str, buzz_message: PlayerBuzzMessage, player_id: str):
     clue_id = buzz_message.clue_id
-    if session.check_buzz_lock(game_id, clue_id):
-        session.add_player_buzz(game_id, clue_id, player_id)
-        player_buzz_message = PlayerBuzzMessage(player_id=buzz_message.player_id, clue_id=clue_id)
-        player_ids = [p.id for p in session.get_all_players(game_id)]
+    winner_id = await buzzer.arbitrate_buzz(game_id, clue_id, player_id)
+    if winner_id:
+        await timers.pause_clue_timer(game_id)
+        player_buzz_message = PlayerBuzzMessage(player_id=winner_id, clue_id=clue_id)
+        player_ids = [p.id for p in await session.get_all_players(game_id)]
         await publish_message(
             game_id, "PLAYER_BUZZED", player_buzz_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
         )
-    else:
-        logger.info(f"Player {buzz_message.player_id} buzzed too late.")
+
+
+@socket_handler.operation("PONG", PongMessage, stateless=True)
+async def handle_pong(game_id: str, pong_message: PongMessage, player_id: str):
+    buzzer.record_round_trip(game_id, player_id, pong_message.ping_id)
 
 
 @socket_handler.operation("RESPONSE_CORRECT", ResponseCorrectMessage)
 async def handle_response_correct(game_id: str, response_correct_message: ResponseCorrectMessage):
-    players = session.get_all_players(game_id)
+    async def judge(game: session.GameUnitOfWork):
+        tile = game.game_board.get_tile(response_correct_message.category_key, str(response_correct_message.amount))
+        player = game.get_player(response_correct_message.player_id)
+        player.score += int(response_correct_message.amount)
+        game.save_player(player)
 
-    player = next((p for p in players if p.id == response_correct_message.player_id))
-    player.score += int(response_correct_message.amount)
-    session.save_player(game_id, player)
+        game.mark_tile_answered(tile)
+        if game.game_board.remaining_tile_count() == 0:
+            game.advance_round()
 
-    game_board = session.get_game_board(game_id)
-    tile = game_board.get_tile(response_correct_message.category_key, str(response_correct_message.amount))
-    tile.answered = True
+    game = await actors.game_transaction(game_id, judge)
+    await timers.stop_clue_timer(game_id)
+    players = game.players
+    player = game.get_player(response_correct_message.player_id)
 
     clue_answered_message = ClueAnswered(
         category_key=response_correct_message.category_key, amount=response_correct_message.amount, answered_correctly=True, player_id=player.id
@@ -325,28 +462,32 @@ async def handle_response_correct(game_id: str, response_correct_message: Respon
     await publish_message(
         game_id, "TURN_OVER", clue_answered_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
     )
-    await publish_message(game_id, "PLAYER_STATE_CHANGED", players, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)])
+    await publish_message(game_id, "STATE_CHANGED", game.changes(), [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)])
 
-    remaining_tiles = game_board.get_remaining_tiles()
-    if len(remaining_tiles) == 0:
-        await _next_round(players, game_board, game_id)
-    session.save_game_board(game_id, game_board)
-    await _next_turn(player, game_id)
+    if game.round_advanced:
+        await _next_round(players, game.game_board, game_id)
+    await _next_turn(player, players, game_id)
 
 
 @socket_handler.operation("RESPONSE_INCORRECT", ResponseIncorrectMessage)
 async def handle_response_incorrect(game_id: str, response_incorrect_message: ResponseIncorrectMessage):
-    players = session.get_all_players(game_id)
-    player = next((p for p in players if p.id == response_incorrect_message.player_id))
-    player.score -= int(response_incorrect_message.amount)
-    session.save_player(game_id, player)
+    players_buzzed = set()
+
+    async def judge(game: session.GameUnitOfWork):
+        nonlocal players_buzzed
+        tile = game.game_board.get_tile(response_incorrect_message.category_key, str(response_incorrect_message.amount))
+        player = game.get_player(response_incorrect_message.player_id)
+        player.score -= int(response_incorrect_message.amount)
+        game.save_player(player)
+
+        game.mark_tile_answered(tile)
+        game.reset_buzz_lock(tile.id)
+        players_buzzed = await game.get_players_buzzed(tile.id)
 
-    game_board = session.get_game_board(game_id)
-    tile = game_board.get_tile(response_incorrect_message.category_key, str(response_incorrect_message.amount))
-    tile.answered = True
-    session.save_game_board(game_id, game_board)
+    game = await actors.game_transaction(game_id, judge)
+    players = game.players
+    player = game.get_player(response_incorrect_message.player_id)
 
-    players_buzzed = session.get_players_buzzed(game_id, tile.id)
     clue_answered_message = ClueAnswered(
         category_key=response_incorrect_message.category_key,
         amount=response_incorrect_message.amount,
@@ -358,24 +499,32 @@ async def handle_response_incorrect(game_id: str, response_incorrect_message: Re
     await publish_message(
         game_id, "CLUE_ANSWERED", clue_answered_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
     )
-    await publish_message(game_id, "PLAYER_STATE_CHANGED", players, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)])
+    await publish_message(game_id, "STATE_CHANGED", game.changes(), [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)])
 
-    session.reset_buzz_lock(game_id, tile.id)
-    if len(players_buzzed) == len(players):
+    if len(players_buzzed) < len(players):
+        await timers.resume_clue_timer(game_id)
+    else:
+        await timers.stop_clue_timer(game_id)
         await publish_message(
             game_id, "TURN_OVER", clue_answered_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
         )
 
         next_player = get_next_player_when_clue_not_answered_correctly(players)
-        await _next_turn(next_player, game_id)
+        await _next_turn(next_player, players, game_id)
 
 
-@socket_handler.operation("CLUE_EXPIRED", ClueExpiredMessage)
+@socket_handler.operation("CLUE_EXPIRED", ClueExpiredMessage, internal=True)
 async def handle_clue_expired(game_id: str, clue_expired_message: ClueExpiredMessage):
-    players = session.get_all_players(game_id)
-    game_board = session.get_game_board(game_id)
-    tile = game_board.get_tile(clue_expired_message.category_key, clue_expired_message.amount)
-    tile.answered = True
+    """Started by the clue's timer in `server.timers`, which makes sure each timer expires its clue only once."""
+
+    async def expire(game: session.GameUnitOfWork):
+        tile = game.game_board.get_tile(clue_expired_message.category_key, clue_expired_message.amount)
+        game.mark_tile_answered(tile)
+        if game.game_board.remaining_tile_count() == 0:
+            game.advance_round()
+
+    game = await actors.game_transaction(game_id, expire)
+    players = game.players
 
     clue_answered_message = ClueAnswered(category_key=clue_expired_message.category_key, amount=clue_expired_message.amount, answered_correctly=False)
     player_ids = [p.id for p in players]
@@ -385,14 +534,13 @@ async def handle_clue_expired(game_id: str, clue_expired_message: ClueExpiredMes
     await publish_message(
         game_id, "TURN_OVER", clue_answered_message, [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)]
     )
+    await publish_message(game_id, "STATE_CHANGED", game.changes(), [host_channel(game_id), gameboard_channel(game_id), *player_channel(game_id, player_ids)])
 
-    remaining_tiles = game_board.get_remaining_tiles()
-    if len(remaining_tiles) == 0:
-        await _next_round(players, game_board, game_id)
-    session.save_game_board(game_id, game_board)
+    if game.round_advanced:
+        await _next_round(players, game.game_board, game_id)
 
     next_player = get_next_player_when_clue_not_answered_correctly(players)
-    await _next_turn(next_player, game_id)
+    await _next_turn(next_player, players, game_id)
 
 
 def get_next_player_when_clue_not_answered_correctly(players: list[Player]) -> Player:
@@ -400,11 +548,11 @@ def get_next_player_when_clue_not_answered_correctly(players: list[Player]) -> P
     return sorted_by_amount[0]
 
 
-async def _next_turn(next_player: Player, game_id: str):
+async def _next_turn(next_player: Player, players: list[Player], game_id: str):
     waiting_for_player_message = WaitingForPlayerMessage(player_name=next_player.name)
     await publish_message(game_id, "WAITING_FOR_PLAYER_CHOICE", waiting_for_player_message, [host_channel(game_id), gameboard_channel(game_id)])
 
-    for player in session.get_all_players(game_id):
+    for player in players:
         if player.id == next_player.id:
             await publish_message(game_id, "PLAYER_TURN_START", PlayerTurnStartMessage(), player_channel(game_id, player.id))
         else:
@@ -412,8 +560,6 @@ async def _next_turn(next_player: Player, game_id: str):
 
 
 async def _next_round(players: list[Player], game_board: GameBoard, game_id: str):
-    game_board.current_round += 1
-
     if game_board.current_round >= len(game_board.rounds):
         logger.debug("Game over")
         player_ids = [p.id for p in players]
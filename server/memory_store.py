@@ -0,0 +1,355 @@
+import asyncio
+import fnmatch
+import heapq
+import time
+from typing import Any, Callable, Optional
+
+from redis.exceptions import ResponseError, WatchError
+
+
+def _stream_id(entry_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class MemoryStore:
+    """An in-process stand-in for the subset of Redis the server uses: strings, hashes, sets, sorted sets and streams
+    with key expiry, WATCH-style change tracking and pubsub. Commands run synchronously, so each one, and each script,
+    is atomic with respect to the event loop. Expired keys are removed at the start of the next command."""
+
+    def __init__(self):
+        self._data: dict[str, Any] = {}
+        self._expires: dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._versions: dict[str, int] = {}
+        self._clock = 0
+        self._subscribers: dict[str, set["MemoryPubSub"]] = {}
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._expiry_heap)
+            if self._expires.get(key) == deadline:
+                self._remove(key)
+
+    def _touch(self, key: str):
+        self._clock += 1
+        self._versions[key] = self._clock
+
+    def _remove(self, key: str) -> bool:
+        self._expires.pop(key, None)
+        self._versions.pop(key, None)
+        return self._data.pop(key, None) is not None
+
+    def _read(self, key: str, default_factory: Callable = None):
+        self._purge_expired()
+        value = self._data.get(key)
+        if value is None and default_factory is not None:
+            value = self._data[key] = default_factory()
+        return value
+
+    def version(self, key: str) -> Optional[int]:
+        self._purge_expired()
+        return self._versions.get(key)
+
+    def get(self, name: str) -> Optional[str]:
+        return self._read(name)
+
+    def set(self, name: str, value, ex: int = None, px: int = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._read(name) is not None:
+            return None
+        self._read(name)
+        self._data[name] = str(value)
+        self._expires.pop(name, None)
+        self._touch(name)
+        if ex is not None:
+            self.expire(name, ex)
+        elif px is not None:
+            self._set_deadline(name, int(px) / 1000)
+        return True
+
+    def incr(self, name: str) -> int:
+        value = int(self._read(name) or 0) + 1
+        self._data[name] = str(value)
+        self._touch(name)
+        return value
+
+    def expire(self, name: str, time: int) -> bool:
+        if self._read(name) is None:
+            return False
+        self._set_deadline(name, int(time))
+        return True
+
+    def _set_deadline(self, name: str, seconds: float):
+        deadline = time.monotonic() + seconds
+        self._expires[name] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, name))
+
+    def exists(self, *names: str) -> int:
+        self._purge_expired()
+        return sum(1 for name in names if name in self._data)
+
+    def delete(self, *names: str) -> int:
+        self._purge_expired()
+        return sum(1 for name in names if self._remove(name))
+
+    def hset(self, name: str, key: str = None, value=None, mapping: dict = None) -> int:
+        fields = dict(mapping or {})
+        if key is not None:
+            fields[key] = value
+        hash_value = self._read(name, dict)
+        added = sum(1 for field in fields if field not in hash_value)
+        hash_value.update({field: str(v) for field, v in fields.items()})
+        self._touch(name)
+        return added
+
+    def hsetnx(self, name: str, key: str, value) -> int:
+        hash_value = self._read(name, dict)
+        if key in hash_value:
+            return 0
+        hash_value[key] = str(value)
+        self._touch(name)
+        return 1
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        return (self._read(name) or {}).get(key)
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        return dict(self._read(name) or {})
+
+    def hvals(self, name: str) -> list[str]:
+        return list((self._read(name) or {}).values())
+
+    def hdel(self, name: str, *keys: str) -> int:
+        hash_value = self._read(name)
+        if hash_value is None:
+            return 0
+        removed = sum(1 for key in keys if hash_value.pop(key, None) is not None)
+        if not hash_value:
+            self._remove(name)
+        elif removed:
+            self._touch(name)
+        return removed
+
+    def sadd(self, name: str, *values) -> int:
+        set_value = self._read(name, set)
+        added = len({str(v) for v in values} - set_value)
+        set_value.update(str(v) for v in values)
+        self._touch(name)
+        return added
+
+    def srem(self, name: str, *values) -> int:
+        set_value = self._read(name)
+        if set_value is None:
+            return 0
+        removed = len(set_value & {str(v) for v in values})
+        set_value.difference_update(str(v) for v in values)
+        if not set_value:
+            self._remove(name)
+        elif removed:
+            self._touch(name)
+        return removed
+
+    def smembers(self, name: str) -> "set[str]":
+        return set(self._read(name) or set())
+
+    def zadd(self, name: str, mapping: dict, nx: bool = False) -> int:
+        zset_value = self._read(name, dict)
+        added = 0
+        for member, score in mapping.items():
+            if member in zset_value and nx:
+                continue
+            added += member not in zset_value
+            zset_value[str(member)] = float(score)
+        self._touch(name)
+        return added
+
+    def zrange(self, name: str, start: int, end: int) -> list[str]:
+        members = sorted((self._read(name) or {}).items(), key=lambda item: (item[1], item[0]))
+        return [member for member, _ in members[start:None if end == -1 else end + 1]]
+
+    def zrangebyscore(self, name: str, min: float, max: float, start: int = None, num: int = None, withscores: bool = False) -> list:
+        members = sorted(
+            ((member, score) for member, score in (self._read(name) or {}).items() if float(min) <= score <= float(max)), key=lambda item: (item[1], item[0])
+        )
+        members = members[start or 0:None if num is None else (start or 0) + num]
+        return members if withscores else [member for member, _ in members]
+
+    def zscore(self, name: str, value: str) -> Optional[float]:
+        return (self._read(name) or {}).get(str(value))
+
+    def zrem(self, name: str, *values) -> int:
+        zset_value = self._read(name)
+        if zset_value is None:
+            return 0
+        removed = sum(1 for value in values if zset_value.pop(str(value), None) is not None)
+        if not zset_value:
+            self._remove(name)
+        elif removed:
+            self._touch(name)
+        return removed
+
+    def xadd(self, name: str, fields: dict, id: str = "*", maxlen: int = None, approximate: bool = True) -> str:
+        stream = self._read(name, list)
+        last_id = _stream_id(stream[-1][0]) if stream else (0, 0)
+        if id == "*":
+            now = int(time.time() * 1000)
+            entry_id = (now, 0) if now > last_id[0] else (last_id[0], last_id[1] + 1)
+        else:
+            entry_id = _stream_id(id)
+            if entry_id <= last_id:
+                raise ResponseError("The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.append((f"{entry_id[0]}-{entry_id[1]}", {field: str(v) for field, v in fields.items()}))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[:len(stream) - maxlen]
+        self._touch(name)
+        return stream[-1][0]
+
+    def xrange(self, name: str, min: str = "-", max: str = "+", count: int = None) -> list[tuple[str, dict[str, str]]]:
+        low = (0, 0) if min == "-" else _stream_id(min)
+        high = None if max == "+" else _stream_id(max)
+        entries = [
+            (entry_id, dict(fields))
+            for entry_id, fields in self._read(name) or []
+            if low <= _stream_id(entry_id) and (high is None or _stream_id(entry_id) <= high)
+        ]
+        return entries if count is None else entries[:count]
+
+    def keys(self, pattern: str = "*") -> list[str]:
+        self._purge_expired()
+        return [key for key in self._data if fnmatch.fnmatchcase(key, pattern)]
+
+    def publish(self, channel: str, message: str) -> int:
+        subscribers = self._subscribers.get(channel, set())
+        for subscriber in subscribers:
+            subscriber._receive(channel, message)
+        return len(subscribers)
+
+
+class MemoryPipeline:
+    """Queues commands and runs them together on `execute`, like a Redis pipeline. Between `watch` and `multi`
+    commands run immediately; `execute` raises `WatchError` if a watched key changed in the meantime."""
+
+    def __init__(self, store: MemoryStore):
+        self._store = store
+        self._commands: list[tuple[str, tuple, dict]] = []
+        self._watched: dict[str, Optional[int]] = {}
+        self._immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.reset()
+
+    def __getattr__(self, name: str):
+        command = getattr(self._store, name)
+        if self._immediate:
+            async def run(*args, **kwargs):
+                return command(*args, **kwargs)
+            return run
+
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def watch(self, *names: str):
+        self._watched.update({name: self._store.version(name) for name in names})
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    async def execute(self) -> list:
+        try:
+            if any(self._store.version(name) != version for name, version in self._watched.items()):
+                raise WatchError("Watched variable changed.")
+            return [getattr(self._store, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        finally:
+            await self.reset()
+
+    async def reset(self):
+        self._commands.clear()
+        self._watched.clear()
+        self._immediate = False
+
+
+class MemoryPubSub:
+    def __init__(self, store: MemoryStore, decode_responses: bool):
+        self._store = store
+        self._decode_responses = decode_responses
+        self._messages: asyncio.Queue[dict] = asyncio.Queue()
+        self.channels: set[str] = set()
+
+    def _receive(self, channel: str, message: str):
+        data = message if self._decode_responses or not isinstance(message, str) else message.encode()
+        self._messages.put_nowait({"type": "message", "pattern": None, "channel": channel, "data": data})
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self._store._subscribers.setdefault(channel, set()).add(self)
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or list(self.channels):
+            subscribers = self._store._subscribers.get(channel, set())
+            subscribers.discard(self)
+            if not subscribers:
+                self._store._subscribers.pop(channel, None)
+            self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: Optional[float] = 0.0) -> Optional[dict]:
+        if timeout is None:
+            return await self._messages.get()
+        try:
+            return await asyncio.wait_for(self._messages.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        await self.unsubscribe()
+
+
+class MemoryScript:
+    def __init__(self, store: MemoryStore, implementation: Callable[[MemoryStore, list, list], Any]):
+        self._store = store
+        self._implementation = implementation
+
+    async def __call__(self, keys: list = None, args: list = None):
+        return self._implementation(self._store, list(keys or []), list(args or []))
+
+
+class MemoryClient:
+    """Exposes a `MemoryStore` through the same coroutine API as the asyncio Redis client. Scripts are registered as
+    Python functions that take the store, keys and args, in place of Lua source."""
+
+    def __init__(self, store: MemoryStore, decode_responses: bool = True):
+        self._store = store
+        self._decode_responses = decode_responses
+
+    def __getattr__(self, name: str):
+        command = getattr(self._store, name)
+
+        async def run(*args, **kwargs):
+            return command(*args, **kwargs)
+        return run
+
+    def pipeline(self, transaction: bool = True) -> MemoryPipeline:
+        return MemoryPipeline(self._store)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> MemoryPubSub:
+        return MemoryPubSub(self._store, self._decode_responses)
+
+    def register_script(self, implementation: Callable[[MemoryStore, list, list], Any]) -> MemoryScript:
+        return MemoryScript(self._store, implementation)
+
+    async def script_load(self, _):
+        return None
+
+    async def scan_iter(self, match: str = "*"):
+        for key in self._store.keys(match):
+            yield key
+
+    async def close(self, close_connection_pool: Optional[bool] = None):
+        pass
@@ -0,0 +1,142 @@
+"""Process-wide metrics, rendered in the Prometheus text format by the `/metrics` endpoint.
+
+Everything runs on the worker's event loop, so counters are plain numbers updated without locks, and each labelled
+series is allocated once, the first time its label is seen. Gauges are computed by a callback when the endpoint is
+scraped. Every worker process keeps its own metrics."""
+import functools
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+_DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_metrics: list["Counter | Histogram | Gauge"] = []
+_current_session_call: ContextVar[str] = ContextVar("current_session_call", default="other")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(label: Optional[str], value: str, extra: str = "") -> str:
+    pairs = [f"{label}=\"{_escape(value)}\""] if label else []
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values: dict[str, float] = {}
+        _metrics.append(self)
+
+    def inc(self, label_value: str = "", amount: float = 1) -> None:
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        yield f"# TYPE {self.name} counter"
+        for label_value, value in self._values.items():
+            yield f"{self.name}{_labels(self.label, label_value)} {value}"
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label: Optional[str] = None, buckets: tuple[float, ...] = _DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, _HistogramSeries] = {}
+        _metrics.append(self)
+
+    def observe(self, label_value: str, value: float) -> None:
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def samples(self) -> Iterator[str]:
+        yield f"# TYPE {self.name} histogram"
+        for label_value, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series.counts):
+                cumulative += count
+                bucket_label = f"le=\"{bound}\""
+                yield f"{self.name}_bucket{_labels(self.label, label_value, bucket_label)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label, label_value)} {series.total}"
+            yield f"{self.name}_count{_labels(self.label, label_value)} {series.count}"
+
+
+class Gauge:
+    """A value read when the metrics are scraped. The callback returns a number, or a dict of numbers by label value."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float | dict[str, float]], label: Optional[str] = None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label = label
+        _metrics.append(self)
+
+    def samples(self) -> Iterator[str]:
+        yield f"# TYPE {self.name} gauge"
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {"": values}
+        for label_value, value in values.items():
+            yield f"{self.name}{_labels(self.label, label_value)} {value}"
+
+
+operation_duration = Histogram("precariousness_operation_duration_seconds", "Time spent in socket operation handlers", "operation")
+socket_errors = Counter("precariousness_socket_errors_total", "Socket errors by the exception type whose handler took them", "type")
+session_call_duration = Histogram("precariousness_session_call_duration_seconds", "Time spent in session store calls", "function")
+redis_round_trips = Counter("precariousness_redis_round_trips_total", "Commands or pipelines sent to Redis, by the session call that sent them", "function")
+pubsub_messages = Counter("precariousness_pubsub_messages_total", "Game event frames received from Redis pubsub")
+publish_to_deliver = Histogram("precariousness_publish_to_deliver_seconds", "Time from publishing a game event to routing it to this worker's sockets")
+socket_batch_size = Histogram(
+    "precariousness_socket_batch_messages", "Messages coalesced into each frame written to a socket that takes batches", buckets=(1, 2, 3, 4, 6, 8, 16, 32, 64)
+)
+spectator_snapshots = Counter("precariousness_spectator_snapshots_total", "State snapshots sent to spectators that joined or fell behind")
+socket_queue_overflows = Counter("precariousness_socket_queue_overflows_total", "Outbound socket queues that filled up, by overflow policy", "policy")
+
+
+def session_call(func):
+    """Times a session store coroutine and attributes the Redis round trips it makes to it."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_session_call.set(name)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            session_call_duration.observe(name, time.perf_counter() - started)
+            _current_session_call.reset(token)
+
+    return wrapper
+
+
+def count_redis_round_trip() -> None:
+    redis_round_trips.inc(_current_session_call.get())
+
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
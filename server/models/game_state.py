@@ -1,6 +1,7 @@
+import json
 import re
 
-from pydantic import Field, root_validator, ValidationError
+from pydantic import Field, PrivateAttr, root_validator, ValidationError
 
 from server.models import PrecariousnessBaseModel
 
@@ -12,6 +13,7 @@ class Tile(PrecariousnessBaseModel):
     clue: str
     correct_response: str
     answered: bool = False
+    version: int = 0
 
 
 class Category(PrecariousnessBaseModel):
@@ -26,8 +28,20 @@ class Category(PrecariousnessBaseModel):
 
 
 class GameBoard(PrecariousnessBaseModel):
+    """A game's rounds of categories. Alongside the content the board keeps, for each round, the position of every
+    category by key and the number of tiles still unanswered, so looking up a tile and checking whether a round is over
+    cost the same however big the board is. Tiles must be marked answered through `mark_tile_answered`, which keeps the
+    counts right and swaps in an answered copy of the tile instead of changing it, so boards made by `with_state` can
+    share their tiles with the board they were made from."""
     rounds: list[list[Category]] = Field(default_factory=list)
     current_round: int = Field(default=0, alias="currentRound")
+    version: int = 0
+    _category_positions: list[dict[str, int]] = PrivateAttr(default_factory=list)
+    _remaining_tiles: list[int] = PrivateAttr(default_factory=list)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._index_tiles()
 
     @root_validator(pre=True)
     def pre_process(cls, values: dict) -> dict:
@@ -40,22 +54,102 @@ class GameBoard(PrecariousnessBaseModel):
         except LookupError:
             raise ValidationError("Malformed GameBoard")
 
+    @classmethod
+    def load_trusted(cls, raw: str | bytes) -> "GameBoard":
+        """Rebuilds a board from JSON produced by `GameBoard.json()`, skipping validation. Only use this for boards that
+        were validated before they were stored."""
+        data = json.loads(raw)
+        rounds = [
+            [
+                Category.construct(name=category["name"], key=category["key"], tiles={a: Tile.construct(**t) for a, t in category["tiles"].items()})
+                for category in game_round
+            ]
+            for game_round in data["rounds"]
+        ]
+        board = cls.construct(rounds=rounds, current_round=data["current_round"])
+        board._index_tiles()
+        return board
+
+    def _index_tiles(self) -> None:
+        self._category_positions = [{category.key: position for position, category in enumerate(game_round)} for game_round in self.rounds]
+        self._count_remaining_tiles()
+
+    def _count_remaining_tiles(self) -> None:
+        self._remaining_tiles = [sum(not tile.answered for category in game_round for tile in category.tiles.values()) for game_round in self.rounds]
+
+    def with_state(self, current_round: int, answered_tile_versions: dict[str, int], version: int) -> "GameBoard":
+        """Returns a board with the per-game state kept alongside the board's content applied: the current round, the
+        state version each answered tile was marked at and the game's current state version. The new board shares this
+        board's unanswered tiles and indexes and only copies answered tiles, so this board is left unchanged and can
+        back any number of games' boards."""
+        rounds = []
+        for game_round in self.rounds:
+            categories = []
+            for category in game_round:
+                tiles = {}
+                for amount, tile in category.tiles.items():
+                    tile_version = answered_tile_versions.get(tile.id)
+                    if tile_version is not None:
+                        tile = tile.copy(update={"answered": True, "version": tile_version})
+                    elif tile.answered or tile.version:
+                        tile = tile.copy(update={"answered": False, "version": 0})
+                    tiles[amount] = tile
+                categories.append(Category.construct(name=category.name, key=category.key, tiles=tiles))
+            rounds.append(categories)
+        board = GameBoard.construct(rounds=rounds, current_round=current_round, version=version)
+        board._category_positions = self._category_positions
+        board._count_remaining_tiles()
+        return board
+
+    def copy_for_update(self) -> "GameBoard":
+        """Returns a copy that can be changed without changing this board. Tiles are shared, since `mark_tile_answered`
+        replaces a tile rather than changing it."""
+        rounds = [
+            [Category.construct(name=category.name, key=category.key, tiles=dict(category.tiles)) for category in game_round] for game_round in self.rounds
+        ]
+        board = GameBoard.construct(rounds=rounds, current_round=self.current_round, version=self.version)
+        board._category_positions = self._category_positions
+        board._remaining_tiles = list(self._remaining_tiles)
+        return board
+
     def get_tile(self, category_key: str, amount: str) -> Tile:
-        categories = self.rounds[self.current_round]
-        category = next((c for c in categories if c.key == category_key), None)
-        if not category:
-            raise KeyError(f"Category does not exist: {category}")
-        return category.tiles[amount]
+        position = self._category_positions[self.current_round].get(category_key)
+        if position is None:
+            raise KeyError(f"Category does not exist: {category_key}")
+        return self.rounds[self.current_round][position].tiles[amount]
+
+    def get_tile_by_id(self, tile_id: str) -> Tile:
+        round_num, category_num, amount = tile_id.split("_", 2)
+        return self.rounds[int(round_num)][int(category_num)].tiles[amount]
+
+    def mark_tile_answered(self, tile: Tile) -> Tile:
+        """Replaces the tile with an answered copy and returns the copy, or the board's tile if it was already answered."""
+        round_num, category_num, amount = tile.id.split("_", 2)
+        tiles = self.rounds[int(round_num)][int(category_num)].tiles
+        if tiles[amount].answered:
+            return tiles[amount]
+        tiles[amount] = tiles[amount].copy(update={"answered": True})
+        self._remaining_tiles[int(round_num)] -= 1
+        return tiles[amount]
 
-    def get_remaining_tiles(self) -> list[Tile]:
-        remaining_answers = []
-        categories = self.rounds[self.current_round]
-        for category in categories:
-            remaining_answers.extend([a for a in category.tiles.values() if not a.answered])
-        return remaining_answers
+    def remaining_tile_count(self) -> int:
+        """The number of unanswered tiles in the current round."""
+        return self._remaining_tiles[self.current_round]
 
 
 class Player(PrecariousnessBaseModel):
     id: str
     name: str
     score: int
+    version: int = 0
+
+
+class GameStateDelta(PrecariousnessBaseModel):
+    """What changed in a game after `since_version`, up to and including `version`. Players are sent whole; tiles only
+    ever change by being answered, so they are sent as IDs."""
+    since_version: int = Field(alias="sinceVersion")
+    version: int
+    current_round: int = Field(alias="currentRound")
+    answered_tile_ids: list[str] = Field(default_factory=list, alias="answeredTileIds")
+    players: list[Player] = Field(default_factory=list)
+    removed_player_ids: list[str] = Field(default_factory=list, alias="removedPlayerIds")
@@ -25,6 +25,10 @@ class ClueWithGameId(GameId, Clue):
     pass
 
 
+class StateRequest(GameId):
+    since_version: Optional[int] = Field(alias="sinceVersion")
+
+
 """
 Inbound socket communication models
 """
@@ -76,6 +80,18 @@ class ClueExpiredMessage(Clue):
     pass
 
 
+class MarkAnswerUsedMessage(Clue):
+    pass
+
+
+class PongMessage(PrecariousnessBaseModel):
+    ping_id: str = Field(alias="pingId")
+
+
+class PlayerLeftMessage(PrecariousnessBaseModel):
+    pass
+
+
 class ErrorMessage(PrecariousnessBaseModel):
     error: str
 
@@ -85,6 +101,27 @@ Outbound socket communication models
 """
 
 
+class PingMessage(PrecariousnessBaseModel):
+    ping_id: str = Field(alias="pingId")
+
+
+class EventsMissedMessage(PrecariousnessBaseModel):
+    last_seq: int = Field(alias="lastSeq")
+
+
+class GameSnapshotMessage(PrecariousnessBaseModel):
+    """Everything a spectator needs to show a game, as of event `seq`: the board's categories and which of their tiles
+    are answered (but not their clues), the players, and the gameboard's events since the current turn began, which say
+    whose turn it is and which clue is up. `version` is the game's state version, so STATE_CHANGED events the snapshot
+    already includes can be told apart."""
+    seq: int
+    version: int
+    current_round: int = Field(alias="currentRound")
+    rounds: list[list[dict]]
+    players: list[Player]
+    events: list[dict]
+
+
 class PlayerJoinedMessage(PrecariousnessBaseModel):
     player_id: str = Field(alias="playerId")
     player_name: str = Field(alias="playerName")
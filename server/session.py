@@ -1,108 +1,925 @@
+import asyncio
+import json
+import logging
 import random
+import secrets
+import time
+import zlib
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
-import redis
+import redis.asyncio as redis
 
+import server.backends as backends
 import server.config as config
-from server.models.game_state import GameBoard, Player
+import server.metrics as metrics
+from server.exceptions import InvalidPlayerId
+from server.models.game_state import GameBoard, GameStateDelta, Player, Tile
 
-host, port, password = config.get_redis_config()
-_session_db = redis.StrictRedis(host=host, port=int(port), password=password, charset="utf-8", decode_responses=True)
+logger = logging.getLogger(__name__)
+
+_session_db = backends.create_client()
 
 
 _GAME_CODE_CHARACTERS = "BCDFGHJKLMNPQRSTVWXZ"
 _GAME_CODE_LENGTH = 4
 _SESSION_EXPIRY = 43200  # 12 hours
+_EVENT_LOG_SIZE = config.get_event_log_size()
+_CURRENT_ROUND_FIELD = "current_round"
+_BOARD_INVALIDATION_CHANNEL = "board_invalidation"
+_CLUE_TIMER_SHARDS = 16
+
+_board_cache: OrderedDict[str, tuple[int, GameBoard]] = OrderedDict()
+_board_cache_size = config.get_board_cache_size()
+_board_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_invalidation_task = None
+
+_BUZZ_SCRIPT = """
+local won = redis.call("INCR", KEYS[1]) == 1
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+if won then
+    redis.call("SADD", KEYS[2], ARGV[1])
+    redis.call("EXPIRE", KEYS[2], ARGV[2])
+end
+return {won and 1 or 0, redis.call("SMEMBERS", KEYS[2])}
+"""
+
+
+def _buzz_locally(db, keys, args):
+    won = db.incr(keys[0]) == 1
+    db.expire(keys[0], args[1])
+    if won:
+        db.sadd(keys[1], args[0])
+        db.expire(keys[1], args[1])
+    return [1 if won else 0, list(db.smembers(keys[1]))]
+
+
+_buzz_script = backends.register_script(_session_db, _BUZZ_SCRIPT, _buzz_locally)
+
+_ENTER_BUZZ_WINDOW_SCRIPT = """
+if tonumber(redis.call("GET", KEYS[1]) or "0") > 0 then
+    return -1
+end
+redis.call("ZADD", KEYS[2], "NX", ARGV[2], ARGV[1])
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+if redis.call("SET", KEYS[3], ARGV[1], "NX", "PX", ARGV[4]) then
+    return 1
+end
+return 0
+"""
+
+
+def _enter_buzz_window_locally(db, keys, args):
+    if int(db.get(keys[0]) or 0) > 0:
+        return -1
+    db.zadd(keys[1], {args[0]: args[1]}, nx=True)
+    db.expire(keys[1], args[2])
+    return 1 if db.set(keys[2], args[0], nx=True, px=args[3]) else 0
+
+
+_enter_buzz_window_script = backends.register_script(_session_db, _ENTER_BUZZ_WINDOW_SCRIPT, _enter_buzz_window_locally)
+
+_CLOSE_BUZZ_WINDOW_SCRIPT = """
+local winner = redis.call("ZRANGE", KEYS[3], 0, 0)[1]
+redis.call("DEL", KEYS[3], KEYS[4])
+if not winner or redis.call("INCR", KEYS[1]) ~= 1 then
+    return false
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+redis.call("SADD", KEYS[2], winner)
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+return winner
+"""
+
+
+def _close_buzz_window_locally(db, keys, args):
+    winner = next(iter(db.zrange(keys[2], 0, 0)), None)
+    db.delete(keys[2], keys[3])
+    if winner is None or db.incr(keys[0]) != 1:
+        return None
+    db.expire(keys[0], args[0])
+    db.sadd(keys[1], winner)
+    db.expire(keys[1], args[0])
+    return winner
+
+
+_close_buzz_window_script = backends.register_script(_session_db, _CLOSE_BUZZ_WINDOW_SCRIPT, _close_buzz_window_locally)
+
+_CLAIM_GAME_SCRIPT = """
+local owner = redis.call("GET", KEYS[1])
+if not owner or owner == ARGV[1] then
+    redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2])
+    return ARGV[1]
+end
+return owner
+"""
+
+
+def _claim_game_locally(db, keys, args):
+    owner = db.get(keys[0])
+    if owner is None or owner == args[0]:
+        db.set(keys[0], args[0], px=args[1])
+        return args[0]
+    return owner
+
+
+_claim_game_script = backends.register_script(_session_db, _CLAIM_GAME_SCRIPT, _claim_game_locally)
+
+_DELETE_IF_EQUAL_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def _delete_if_equal_locally(db, keys, args):
+    return db.delete(keys[0]) if db.get(keys[0]) == args[0] else 0
+
+
+_delete_if_equal_script = backends.register_script(_session_db, _DELETE_IF_EQUAL_SCRIPT, _delete_if_equal_locally)
+
+
+_APPEND_EVENT_SCRIPT = """
+local seq = redis.call("INCR", KEYS[1])
+redis.call("EXPIRE", KEYS[1], ARGV[5])
+local message = string.sub(ARGV[3], 1, -2) .. ',"seq":' .. seq .. '}'
+redis.call("XADD", KEYS[2], "MAXLEN", "~", ARGV[4], seq .. "-0", "operation", ARGV[2], "channels", ARGV[1], "message", message)
+redis.call("EXPIRE", KEYS[2], ARGV[5])
+local frame = "[" .. seq .. "," .. ARGV[1] .. "," .. ARGV[7] .. "," .. ARGV[8] .. "]\\n" .. message
+if ARGV[6] ~= "" then
+    redis.call("SPUBLISH", ARGV[6], frame)
+    return seq
+end
+for _, channel in ipairs(redis.call("SMEMBERS", KEYS[3])) do
+    redis.call("PUBLISH", channel, frame)
+end
+return seq
+"""
+
+
+def _append_event_locally(db, keys, args):
+    seq = db.incr(keys[0])
+    db.expire(keys[0], args[4])
+    message = f'{args[2][:-1]},"seq":{seq}}}'
+    db.xadd(keys[1], {"operation": args[1], "channels": args[0], "message": message}, id=f"{seq}-0", maxlen=int(args[3]))
+    db.expire(keys[1], args[4])
+    for channel in [args[5]] if args[5] else db.smembers(keys[2]):
+        db.publish(channel, f"[{seq},{args[0]},{args[6]},{args[7]}]\n{message}")
+    return seq
+
+
+_append_event_script = backends.register_script(_session_db, _APPEND_EVENT_SCRIPT, _append_event_locally)
+
+_ARM_CLUE_TIMER_SCRIPT = """
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+redis.call("HSET", KEYS[2], ARGV[1], ARGV[3])
+redis.call("HDEL", KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def _arm_clue_timer_locally(db, keys, args):
+    db.zadd(keys[0], {args[0]: args[1]})
+    db.hset(keys[1], args[0], args[2])
+    db.hdel(keys[2], args[0])
+    return 1
+
+
+_arm_clue_timer_script = backends.register_script(_session_db, _ARM_CLUE_TIMER_SCRIPT, _arm_clue_timer_locally)
+
+_PAUSE_CLUE_TIMER_SCRIPT = """
+local deadline = redis.call("ZSCORE", KEYS[1], ARGV[1])
+if not deadline then
+    return -1
+end
+redis.call("ZREM", KEYS[1], ARGV[1])
+local remaining = math.max(tonumber(deadline) - tonumber(ARGV[2]), 0)
+redis.call("HSET", KEYS[3], ARGV[1], remaining)
+return remaining
+"""
+
+
+def _pause_clue_timer_locally(db, keys, args):
+    deadline = db.zscore(keys[0], args[0])
+    if deadline is None:
+        return -1
+    db.zrem(keys[0], args[0])
+    remaining = max(int(deadline) - int(args[1]), 0)
+    db.hset(keys[2], args[0], remaining)
+    return remaining
+
+
+_pause_clue_timer_script = backends.register_script(_session_db, _PAUSE_CLUE_TIMER_SCRIPT, _pause_clue_timer_locally)
+
+_RESUME_CLUE_TIMER_SCRIPT = """
+local remaining = redis.call("HGET", KEYS[3], ARGV[1])
+if not remaining then
+    return -1
+end
+redis.call("HDEL", KEYS[3], ARGV[1])
+local deadline = tonumber(ARGV[2]) + tonumber(remaining)
+redis.call("ZADD", KEYS[1], deadline, ARGV[1])
+return deadline
+"""
+
+
+def _resume_clue_timer_locally(db, keys, args):
+    remaining = db.hget(keys[2], args[0])
+    if remaining is None:
+        return -1
+    db.hdel(keys[2], args[0])
+    deadline = int(args[1]) + int(remaining)
+    db.zadd(keys[0], {args[0]: deadline})
+    return deadline
+
+
+_resume_clue_timer_script = backends.register_script(_session_db, _RESUME_CLUE_TIMER_SCRIPT, _resume_clue_timer_locally)
+
+_CANCEL_CLUE_TIMER_SCRIPT = """
+redis.call("ZREM", KEYS[1], ARGV[1])
+redis.call("HDEL", KEYS[2], ARGV[1])
+redis.call("HDEL", KEYS[3], ARGV[1])
+return 1
+"""
+
+
+def _cancel_clue_timer_locally(db, keys, args):
+    db.zrem(keys[0], args[0])
+    db.hdel(keys[1], args[0])
+    db.hdel(keys[2], args[0])
+    return 1
+
+
+_cancel_clue_timer_script = backends.register_script(_session_db, _CANCEL_CLUE_TIMER_SCRIPT, _cancel_clue_timer_locally)
+
+_CLAIM_CLUE_TIMER_SCRIPT = """
+if tonumber(redis.call("ZSCORE", KEYS[1], ARGV[1]) or "-1") ~= tonumber(ARGV[2]) then
+    return false
+end
+redis.call("ZREM", KEYS[1], ARGV[1])
+local clue = redis.call("HGET", KEYS[2], ARGV[1])
+redis.call("HDEL", KEYS[2], ARGV[1])
+return clue
+"""
+
+
+def _claim_clue_timer_locally(db, keys, args):
+    if db.zscore(keys[0], args[0]) != float(args[1]):
+        return None
+    db.zrem(keys[0], args[0])
+    clue = db.hget(keys[1], args[0])
+    db.hdel(keys[1], args[0])
+    return clue
+
+
+_claim_clue_timer_script = backends.register_script(_session_db, _CLAIM_CLUE_TIMER_SCRIPT, _claim_clue_timer_locally)
 
 
 def _game_board_key(game_id: str):
-    return f"{game_id}:board"
+    return f"{backends.hash_tag(game_id)}:board"
+
+
+def _board_state_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:board_state"
+
 
+def _board_version_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:board_version"
 
-def _player_key(game_id: str, player_id: str):
-    return f"{game_id}:player:{player_id}"
+
+def _state_version_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:state_version"
+
+
+def _players_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:players"
+
+
+def _removed_players_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:removed_players"
 
 
 def _buzz_lock_key(game_id: str, clue_id: str) -> str:
-    return f"{game_id}:buzz_lock:{clue_id}"
+    return f"{backends.hash_tag(game_id)}:buzz_lock:{clue_id}"
 
 
 def _players_buzzed_key(game_id: str, clue_id: str) -> str:
-    return f"{game_id}:player_buzz:{clue_id}"
+    return f"{backends.hash_tag(game_id)}:player_buzz:{clue_id}"
+
+
+def _buzz_window_key(game_id: str, clue_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:buzz_window:{clue_id}"
+
+
+def _buzz_window_owner_key(game_id: str, clue_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:buzz_window_owner:{clue_id}"
 
 
 def _player_answered_key(game_id: str, clue_id) -> str:
-    return f"{game_id}:player_answered:{clue_id}"
+    return f"{backends.hash_tag(game_id)}:player_answered:{clue_id}"
 
 
-def _all_players_prefix(game_id: str) -> str:
+def _legacy_player_prefix(game_id: str = "*") -> str:
     return f"{game_id}:player:*"
 
 
 def _host_key(game_id: str) -> str:
-    return f"{game_id}:host"
+    return f"{backends.hash_tag(game_id)}:host"
 
 
-def generate_game_id() -> str:
-    code = []
-    for _ in range(_GAME_CODE_LENGTH):
-        idx = random.randint(0, len(_GAME_CODE_CHARACTERS) - 1)
-        code.append(_GAME_CODE_CHARACTERS[idx])
-    return "".join(code)
+def _game_owner_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:owner"
+
+
+def _event_sequence_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:event_seq"
+
+
+def _event_log_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:events"
+
+
+def _clue_timer_keys(game_id: str) -> list[str]:
+    """The deadlines of running clue timers, the clue each one is for and the time left on paused ones, by game ID.
+    Timers are spread over `_CLUE_TIMER_SHARDS` shards by game ID, so in cluster mode they're spread across hash
+    slots. A shard's three keys share a slot, so the timer scripts still work."""
+    return _clue_timer_shard_keys(zlib.crc32(game_id.encode()) % _CLUE_TIMER_SHARDS)
+
 
+def _clue_timer_shard_keys(shard: int) -> list[str]:
+    return [f"{backends.hash_tag(f'clue_timers:{shard}')}:{name}" for name in ("deadlines", "clues", "paused")]
 
-def get_game_board(game_id: str) -> GameBoard:
-    raw_record = _session_db.get(_game_board_key(game_id))
-    return GameBoard.parse_raw(raw_record)
 
+def _game_workers_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:workers"
 
-def save_game_board(game_id: str, game_board: GameBoard) -> None:
-    _session_db.set(_game_board_key(game_id), game_board.json(), ex=_SESSION_EXPIRY)
 
+def _resume_tokens_key(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:resume_tokens"
 
-def game_exists(game_id: str) -> bool:
-    return _session_db.exists(_game_board_key(game_id)) != 0
+
+def _player_connection_key(game_id: str, player_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:player_connection:{player_id}"
+
+
+def game_events_channel(game_id: str) -> str:
+    return f"{backends.hash_tag(game_id)}:event_channel"
+
+
+def _worker_operations_channel(worker_id: str) -> str:
+    return f"worker:{worker_id}:operations"
+
+
+async def _game_db(game_id: str):
+    """The client to run a game's transactions on. Every key of a game shares a hash slot, so in cluster mode this is a
+    connection to the node serving it."""
+    return await backends.slot_client(_session_db, _players_key(game_id))
+
+
+def generate_game_id() -> str:
+    code = []
+    for _ in range(_GAME_CODE_LENGTH):
+        idx = random.randint(0, len(_GAME_CODE_CHARACTERS) - 1)
+        code.append(_GAME_CODE_CHARACTERS[idx])
+    return "".join(code)
 
 
-def get_player(game_id: str, player_id: str) -> Player:
-    record = _session_db.get(_player_key(game_id, player_id))
+def _cache_board(game_id: str, version: int, game_board: GameBoard) -> None:
+    _board_cache[game_id] = (version, game_board)
+    _board_cache.move_to_end(game_id)
+    while len(_board_cache) > _board_cache_size:
+        _board_cache.popitem(last=False)
+
+
+def get_board_cache_stats() -> dict[str, int]:
+    return {**_board_cache_stats, "size": len(_board_cache)}
+
+
+async def _listen_for_board_invalidations():
+    pubsub = backends.create_pubsub(_session_db)
+    await pubsub.subscribe(_BOARD_INVALIDATION_CHANNEL)
+    while True:
+        try:
+            message = await pubsub.get_message(timeout=None)
+        except redis.ConnectionError:
+            logger.error("Lost connection to board invalidation channel. Retrying", exc_info=True)
+            await asyncio.sleep(1)
+            continue
+        if message is None:
+            continue
+        game_id, version = message["data"].rsplit(":", 1)
+        cached = _board_cache.get(game_id)
+        if cached is not None and cached[0] < int(version):
+            del _board_cache[game_id]
+            _board_cache_stats["invalidations"] += 1
+
+
+async def start() -> None:
+    """Loads server-side scripts and starts listening for board cache invalidations."""
+    scripts = (
+        _BUZZ_SCRIPT,
+        _ENTER_BUZZ_WINDOW_SCRIPT,
+        _CLOSE_BUZZ_WINDOW_SCRIPT,
+        _CLAIM_GAME_SCRIPT,
+        _DELETE_IF_EQUAL_SCRIPT,
+        _APPEND_EVENT_SCRIPT,
+        _ARM_CLUE_TIMER_SCRIPT,
+        _PAUSE_CLUE_TIMER_SCRIPT,
+        _RESUME_CLUE_TIMER_SCRIPT,
+        _CANCEL_CLUE_TIMER_SCRIPT,
+        _CLAIM_CLUE_TIMER_SCRIPT,
+    )
+    for script in scripts:
+        await _session_db.script_load(script)
+
+    global _invalidation_task
+    if not _invalidation_task:
+        _invalidation_task = asyncio.create_task(_listen_for_board_invalidations())
+
+
+def _queue_game_board_reads(pipe: redis.client.Pipeline, game_id: str) -> None:
+    pipe.get(_board_version_key(game_id))
+    pipe.hgetall(_board_state_key(game_id))
+    pipe.get(_state_version_key(game_id))
+
+
+async def _build_game_board(game_id: str, version: Optional[str], state: dict[str, str], state_version: Optional[str]) -> GameBoard:
+    version = int(version or 0)
+    cached = _board_cache.get(game_id)
+    if cached is not None and cached[0] == version:
+        _board_cache_stats["hits"] += 1
+        _board_cache.move_to_end(game_id)
+        cached_board = cached[1]
+    else:
+        _board_cache_stats["misses"] += 1
+        cached_board = GameBoard.load_trusted(await _session_db.get(_game_board_key(game_id)))
+        _cache_board(game_id, version, cached_board)
+
+    current_round = int(state.pop(_CURRENT_ROUND_FIELD, 0))
+    return cached_board.with_state(current_round, {tile_id: int(v) for tile_id, v in state.items()}, int(state_version or 0))
+
+
+@metrics.session_call
+async def get_game_board(game_id: str) -> GameBoard:
+    """Board content never changes after it is saved, so parsed boards are kept in an in-process LRU cache keyed by
+    game and board version. Other workers' saves evict entries through the invalidation channel, and the version read
+    alongside the tile state guards against a missed notification. Every call returns its own board, which shares the
+    cached board's unanswered tiles and leaves the cached board unchanged."""
+    async with _session_db.pipeline(transaction=False) as pipe:
+        _queue_game_board_reads(pipe, game_id)
+        version, state, state_version = await pipe.execute()
+    return await _build_game_board(game_id, version, state, state_version)
+
+
+@metrics.session_call
+async def save_game_board(game_id: str, game_board: GameBoard) -> None:
+    """Stores the board's content once. Answered tiles and the current round live in a separate hash that is updated
+    field by field through a `GameUnitOfWork`. Tiles that are already answered are recorded at state version 0. The
+    board goes into the board cache as it is, so callers must not change it afterwards."""
+    state = {_CURRENT_ROUND_FIELD: game_board.current_round}
+    for game_round in game_board.rounds:
+        for category in game_round:
+            state.update({tile.id: 0 for tile in category.tiles.values() if tile.answered})
+
+    game_db = await _game_db(game_id)
+    async with game_db.pipeline(transaction=True) as pipe:
+        pipe.incr(_board_version_key(game_id))
+        pipe.expire(_board_version_key(game_id), time=_SESSION_EXPIRY)
+        pipe.set(_game_board_key(game_id), game_board.json(), ex=_SESSION_EXPIRY)
+        pipe.delete(_board_state_key(game_id))
+        pipe.hset(_board_state_key(game_id), mapping=state)
+        pipe.expire(_board_state_key(game_id), time=_SESSION_EXPIRY)
+        version, *_ = await pipe.execute()
+
+    _cache_board(game_id, version, game_board)
+    await backends.publish(_session_db, _BOARD_INVALIDATION_CHANNEL, f"{game_id}:{version}")
+
+
+class GameUnitOfWork:
+    """A game's players and board, loaded together, with the writes made to them queued until the unit of work is
+    committed by `run_game_transaction`. Committing a change takes the game's next state version, which is stamped on
+    every player and tile it touched so clients can ask for just the changes since a version they already have."""
+
+    def __init__(self, game_id: str, players: list[Player], game_board: GameBoard):
+        self.game_id = game_id
+        self.players = players
+        self.game_board = game_board
+        self._starting_round = game_board.current_round
+        self._since_version = game_board.version
+        self.version = game_board.version
+        self._saved_players: dict[str, Player] = {}
+        self._removed_player_ids: set[str] = set()
+        self._answered_tiles: dict[str, Tile] = {}
+        self._reset_buzz_lock_ids: set[str] = set()
+
+    def get_player(self, player_id: str) -> Player:
+        player = next((p for p in self.players if p.id == player_id), None)
+        if player is None:
+            raise InvalidPlayerId(player_id)
+        return player
+
+    def save_player(self, player: Player) -> None:
+        if all(p is not player for p in self.players):
+            self.players = [p for p in self.players if p.id != player.id] + [player]
+        self._saved_players[player.id] = player
+        self._removed_player_ids.discard(player.id)
+
+    def remove_player(self, player_id: str) -> None:
+        self.players = [p for p in self.players if p.id != player_id]
+        self._saved_players.pop(player_id, None)
+        self._removed_player_ids.add(player_id)
+
+    def mark_tile_answered(self, tile: Tile) -> None:
+        tile = self.game_board.mark_tile_answered(tile)
+        self._answered_tiles[tile.id] = tile
+
+    def apply_changes(self, changes: GameStateDelta) -> None:
+        """Repeats the changes recorded by another unit of work's `changes()`."""
+        for player in changes.players:
+            self.save_player(player)
+        for player_id in changes.removed_player_ids:
+            self.remove_player(player_id)
+        for tile_id in changes.answered_tile_ids:
+            self.mark_tile_answered(self.game_board.get_tile_by_id(tile_id))
+        self.game_board.current_round = changes.current_round
+
+    def advance_round(self) -> None:
+        self.game_board.current_round += 1
+
+    @property
+    def round_advanced(self) -> bool:
+        return self.game_board.current_round != self._starting_round
+
+    def reset_buzz_lock(self, clue_id: str) -> None:
+        self._reset_buzz_lock_ids.add(clue_id)
+
+    async def get_players_buzzed(self, clue_id: str) -> set[str]:
+        return await _session_db.smembers(_players_buzzed_key(self.game_id, clue_id))
+
+    def changes(self) -> GameStateDelta:
+        return GameStateDelta(
+            since_version=self._since_version,
+            version=self.version,
+            current_round=self.game_board.current_round,
+            answered_tile_ids=list(self._answered_tiles),
+            players=list(self._saved_players.values()),
+            removed_player_ids=list(self._removed_player_ids),
+        )
+
+    def _stamp(self) -> None:
+        """Assigns the game's next state version to everything this unit of work changed."""
+        if not (self._saved_players or self._removed_player_ids or self._answered_tiles or self.round_advanced):
+            return
+        self.version = self.game_board.version = self._since_version + 1
+        for player in self._saved_players.values():
+            player.version = self.version
+        for tile in self._answered_tiles.values():
+            tile.version = self.version
+
+    def _queue_writes(self, pipe: redis.client.Pipeline) -> None:
+        if self._saved_players:
+            pipe.hset(_players_key(self.game_id), mapping={p.id: p.json() for p in self._saved_players.values()})
+            pipe.expire(_players_key(self.game_id), time=_SESSION_EXPIRY)
+            pipe.hdel(_removed_players_key(self.game_id), *self._saved_players)
+        if self._removed_player_ids:
+            pipe.hdel(_players_key(self.game_id), *self._removed_player_ids)
+            pipe.hdel(_resume_tokens_key(self.game_id), *self._removed_player_ids)
+            pipe.hset(_removed_players_key(self.game_id), mapping={player_id: self.version for player_id in self._removed_player_ids})
+            pipe.expire(_removed_players_key(self.game_id), time=_SESSION_EXPIRY)
+        board_state = {tile_id: self.version for tile_id in self._answered_tiles}
+        if self.round_advanced:
+            board_state[_CURRENT_ROUND_FIELD] = self.game_board.current_round
+        if board_state:
+            pipe.hset(_board_state_key(self.game_id), mapping=board_state)
+        if self.version != self._since_version:
+            pipe.set(_state_version_key(self.game_id), self.version, ex=_SESSION_EXPIRY)
+        for clue_id in self._reset_buzz_lock_ids:
+            pipe.set(_buzz_lock_key(self.game_id, clue_id), 0, ex=_SESSION_EXPIRY)
+
+
+async def _read_game(game_id: str) -> GameUnitOfWork:
+    async with _session_db.pipeline(transaction=False) as reads:
+        reads.hvals(_players_key(game_id))
+        _queue_game_board_reads(reads, game_id)
+        raw_players, version, state, state_version = await reads.execute()
+    players = [Player.parse_raw(p) for p in raw_players]
+    return GameUnitOfWork(game_id, players, await _build_game_board(game_id, version, state, state_version))
+
+
+@metrics.session_call
+async def load_game(game_id: str) -> GameUnitOfWork:
+    """Loads a game's players and board in one round trip. Nothing queued on the returned unit of work is written."""
+    return await _read_game(game_id)
+
+
+@metrics.session_call
+async def run_game_transaction(game_id: str, operation: Callable[[GameUnitOfWork], Awaitable[None]]) -> GameUnitOfWork:
+    """Runs `operation` against a freshly loaded unit of work and commits its writes atomically. The game's player,
+    board state and state version keys are watched while the operation runs; if another writer changes them first, the
+    whole operation is retried on fresh state, so it must not have side effects beyond the unit of work. Costs three
+    round trips: WATCH, one pipelined read of players and board, and MULTI/EXEC."""
+    watched_keys = [_players_key(game_id), _board_state_key(game_id), _state_version_key(game_id)]
+    game_db = await _game_db(game_id)
+    async with game_db.pipeline(transaction=True) as transaction:
+        while True:
+            try:
+                await transaction.watch(*watched_keys)
+                unit_of_work = await _read_game(game_id)
+
+                await operation(unit_of_work)
+                unit_of_work._stamp()
+
+                transaction.multi()
+                unit_of_work._queue_writes(transaction)
+                await transaction.execute()
+                return unit_of_work
+            except redis.WatchError:
+                logger.info(f"Game {game_id} changed during a transaction. Retrying")
+                continue
+
+
+@metrics.session_call
+async def checkpoint_games(units_of_work: list[GameUnitOfWork]) -> None:
+    """Writes units of work for one game that have already been applied in memory, in order, as one MULTI/EXEC."""
+    game_db = await _game_db(units_of_work[0].game_id)
+    async with game_db.pipeline(transaction=True) as pipe:
+        for unit_of_work in units_of_work:
+            unit_of_work._queue_writes(pipe)
+        await pipe.execute()
+
+
+@metrics.session_call
+async def game_exists(game_id: str) -> bool:
+    return await _session_db.exists(_game_board_key(game_id)) != 0
+
+
+@metrics.session_call
+async def get_player(game_id: str, player_id: str) -> Player:
+    record = await _session_db.hget(_players_key(game_id), player_id)
     return Player.parse_raw(record)
 
 
-def get_all_players(game_id: str) -> list[Player]:
-    keys = [k for k in _session_db.scan_iter(_all_players_prefix(game_id))]
-    return [Player.parse_raw(p) for p in _session_db.mget(keys)]
+@metrics.session_call
+async def get_all_players(game_id: str) -> list[Player]:
+    return [Player.parse_raw(p) for p in await _session_db.hvals(_players_key(game_id))]
+
+
+@metrics.session_call
+async def save_player(game_id: str, player: Player) -> None:
+    async def save(game: GameUnitOfWork):
+        game.save_player(player)
+
+    await run_game_transaction(game_id, save)
+
+
+@metrics.session_call
+async def get_state_changes(game_id: str, since_version: int) -> GameStateDelta:
+    """Collects everything that changed in a game after `since_version` from the version stamps, without loading the
+    board's content."""
+    async with _session_db.pipeline(transaction=False) as reads:
+        reads.get(_state_version_key(game_id))
+        reads.hgetall(_board_state_key(game_id))
+        reads.hvals(_players_key(game_id))
+        reads.hgetall(_removed_players_key(game_id))
+        version, state, raw_players, removed_players = await reads.execute()
+
+    current_round = int(state.pop(_CURRENT_ROUND_FIELD, 0))
+    players = [Player.parse_raw(p) for p in raw_players]
+    return GameStateDelta(
+        since_version=since_version,
+        version=int(version or 0),
+        current_round=current_round,
+        answered_tile_ids=[tile_id for tile_id, v in state.items() if int(v) > since_version],
+        players=[p for p in players if p.version > since_version],
+        removed_player_ids=[player_id for player_id, v in removed_players.items() if int(v) > since_version],
+    )
+
+
+@metrics.session_call
+async def migrate_legacy_players() -> int:
+    """Moves player records stored under the old one-key-per-player layout ("{game_id}:player:{player_id}") into the
+    per-game player hash. Safe to run against a live server; returns the number of records moved. The old layout
+    predates cluster mode, so there is nothing to migrate there."""
+    migrated = 0
+    if backends.cluster_mode():
+        return migrated
+    async for key in _session_db.scan_iter(_legacy_player_prefix()):
+        game_id, _, player_id = key.split(":", 2)
+        record = await _session_db.get(key)
+        if record is None:
+            continue
+        async with _session_db.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(_players_key(game_id), player_id, record)
+            pipe.expire(_players_key(game_id), time=_SESSION_EXPIRY)
+            pipe.delete(key)
+            await pipe.execute()
+        migrated += 1
+    return migrated
+
+
+@metrics.session_call
+async def get_players_buzzed(game_id: str, clue_id: str) -> list[str]:
+    return await _session_db.smembers(_players_buzzed_key(game_id, clue_id))
+
+
+@metrics.session_call
+async def buzz(game_id: str, clue_id: str, player_id: str) -> tuple[bool, set[str]]:
+    """Takes the clue's buzz lock and, if this player won it, records them as having buzzed. Runs as one script so
+    simultaneous buzzes can't interleave. Returns whether the player won and everyone who has buzzed on the clue."""
+    won, players_buzzed = await _buzz_script(
+        keys=[_buzz_lock_key(game_id, clue_id), _players_buzzed_key(game_id, clue_id)], args=[player_id, _SESSION_EXPIRY]
+    )
+    return won == 1, set(players_buzzed)
+
+
+@metrics.session_call
+async def enter_buzz_window(game_id: str, clue_id: str, player_id: str, buzz_time: float, window: float) -> int:
+    """Records a buzz in the clue's arbitration window, ranked by `buzz_time`. Returns 1 if this buzz opened the window
+    (the caller must close it after `window` seconds), 0 if it joined an open window and -1 if the clue has already been
+    won. The window's owner marker outlives the window, so a worker that dies mid-window doesn't wedge the clue."""
+    keys = [_buzz_lock_key(game_id, clue_id), _buzz_window_key(game_id, clue_id), _buzz_window_owner_key(game_id, clue_id)]
+    return await _enter_buzz_window_script(keys=keys, args=[player_id, buzz_time, _SESSION_EXPIRY, int(window * 4000) + 1000])
+
+
+@metrics.session_call
+async def close_buzz_window(game_id: str, clue_id: str) -> Optional[str]:
+    """Awards the clue's buzz lock to the earliest buzz in the window. Returns the winner's player ID."""
+    keys = [
+        _buzz_lock_key(game_id, clue_id),
+        _players_buzzed_key(game_id, clue_id),
+        _buzz_window_key(game_id, clue_id),
+        _buzz_window_owner_key(game_id, clue_id),
+    ]
+    return await _close_buzz_window_script(keys=keys, args=[_SESSION_EXPIRY])
 
 
-def save_player(game_id: str, player: Player) -> None:
-    _session_db.set(_player_key(game_id, player.id), player.json(), ex=_SESSION_EXPIRY)
+@metrics.session_call
+async def reset_buzz_lock(game_id: str, clue_id: str) -> None:
+    await _session_db.set(_buzz_lock_key(game_id, clue_id), 0, ex=_SESSION_EXPIRY)
 
 
-def remove_player(game_id: str, player_id: str) -> None:
-    _session_db.delete(_player_key(game_id, player_id))
+@metrics.session_call
+async def arm_clue_timer(game_id: str, deadline_ms: int, clue: str) -> None:
+    """Starts the game's clue timer, replacing any it already had. `clue` is handed back by `claim_clue_timer`."""
+    await _arm_clue_timer_script(keys=_clue_timer_keys(game_id), args=[game_id, deadline_ms, clue])
+
+
+@metrics.session_call
+async def pause_clue_timer(game_id: str, now_ms: int) -> int:
+    """Stops the game's clue timer and keeps the time it had left. Returns that time, or -1 if no timer was running."""
+    return await _pause_clue_timer_script(keys=_clue_timer_keys(game_id), args=[game_id, now_ms])
+
+
+@metrics.session_call
+async def resume_clue_timer(game_id: str, now_ms: int) -> int:
+    """Restarts a paused clue timer with the time it had left. Returns its new deadline, or -1 if none was paused."""
+    return await _resume_clue_timer_script(keys=_clue_timer_keys(game_id), args=[game_id, now_ms])
+
+
+@metrics.session_call
+async def cancel_clue_timer(game_id: str) -> None:
+    await _cancel_clue_timer_script(keys=_clue_timer_keys(game_id), args=[game_id])
+
+
+@metrics.session_call
+async def claim_clue_timer(game_id: str, deadline_ms: int) -> Optional[str]:
+    """Removes the game's clue timer if it is still running with `deadline_ms`, so exactly one caller gets to expire
+    the clue. Returns the clue it was armed with, or None if the timer was paused, cancelled, re-armed or claimed."""
+    return await _claim_clue_timer_script(keys=_clue_timer_keys(game_id), args=[game_id, deadline_ms])
+
+
+@metrics.session_call
+async def get_overdue_clue_timers(before_ms: int, count: int) -> list[tuple[str, int]]:
+    """Up to `count` running clue timers whose deadline is before `before_ms`, as (game ID, deadline) pairs, earliest
+    first."""
+    async with _session_db.pipeline(transaction=False) as pipe:
+        for shard in range(_CLUE_TIMER_SHARDS):
+            pipe.zrangebyscore(_clue_timer_shard_keys(shard)[0], "-inf", before_ms, start=0, num=count, withscores=True)
+        shards = await pipe.execute()
+    overdue = sorted((deadline, game_id) for shard in shards for game_id, deadline in shard)[:count]
+    return [(game_id, int(deadline)) for deadline, game_id in overdue]
+
 
+@metrics.session_call
+async def save_host(game_id: str) -> None:
+    await _session_db.set(_host_key(game_id), 1, ex=_SESSION_EXPIRY)
 
-def add_player_buzz(game_id: str, clue_id: str, player_id: str) -> None:
-    _session_db.sadd(_players_buzzed_key(game_id, clue_id), player_id)
-    _session_db.expire(_players_buzzed_key(game_id, clue_id), time=_SESSION_EXPIRY)
 
+@metrics.session_call
+async def host_exists(game_id: str) -> bool:
+    return await _session_db.exists(_host_key(game_id)) != 0
 
-def get_players_buzzed(game_id: str, clue_id: str) -> list[str]:
-    return _session_db.smembers(_players_buzzed_key(game_id, clue_id))
 
+@metrics.session_call
+async def save_resume_token(game_id: str, player_id: str) -> str:
+    """Issues the token a player's sockets must present, which lets a dropped socket take back its player. The token is
+    removed in the same transaction as the player, so a socket that comes back after its grace period is turned away."""
+    token = secrets.token_urlsafe(16)
+    game_db = await _game_db(game_id)
+    async with game_db.pipeline(transaction=True) as pipe:
+        pipe.hset(_resume_tokens_key(game_id), player_id, token)
+        pipe.expire(_resume_tokens_key(game_id), time=_SESSION_EXPIRY)
+        await pipe.execute()
+    return token
+
+
+@metrics.session_call
+async def check_resume_token(game_id: str, player_id: str, token: Optional[str]) -> bool:
+    expected = await _session_db.hget(_resume_tokens_key(game_id), player_id)
+    return expected is not None and token is not None and secrets.compare_digest(expected, token)
 
-def check_buzz_lock(game_id: str, clue_id: str) -> int:
-    ok = _session_db.incr(_buzz_lock_key(game_id, clue_id)) == 1
-    _session_db.expire(_buzz_lock_key(game_id, clue_id), time=_SESSION_EXPIRY)
-    return ok
 
+@metrics.session_call
+async def save_player_connection(game_id: str, player_id: str, connection_id: str) -> None:
+    """Records `connection_id` as the player's current socket, superseding any earlier one."""
+    await _session_db.set(_player_connection_key(game_id, player_id), connection_id, ex=_SESSION_EXPIRY)
+
+
+@metrics.session_call
+async def end_player_connection(game_id: str, player_id: str, connection_id: str) -> bool:
+    """Forgets the player's socket if it is still `connection_id`. Returns False if the player has connected again
+    since, from this worker or another."""
+    return await _delete_if_equal_script(keys=[_player_connection_key(game_id, player_id)], args=[connection_id]) == 1
 
-def reset_buzz_lock(game_id: str, clue_id: str) -> None:
-    _session_db.set(_buzz_lock_key(game_id, clue_id), 0, ex=_SESSION_EXPIRY)
+
+@metrics.session_call
+async def claim_game(game_id: str, worker_id: str, lease: float) -> str:
+    """Takes or renews the lease that makes `worker_id` the owner of a game. Returns the game's current owner."""
+    return await _claim_game_script(keys=[_game_owner_key(game_id)], args=[worker_id, int(lease * 1000)])
 
 
-def save_host(game_id: str) -> None:
-    _session_db.set(_host_key(game_id), 1, ex=_SESSION_EXPIRY)
+@metrics.session_call
+async def release_game(game_id: str, worker_id: str) -> None:
+    await _delete_if_equal_script(keys=[_game_owner_key(game_id)], args=[worker_id])
 
 
-def host_exists(game_id: str) -> bool:
-    return _session_db.exists(_host_key(game_id)) != 0
+@metrics.session_call
+async def append_event(game_id: str, recipients: str, operation: str, message: str, trace_context: str = "null") -> int:
+    """Gives an outbound message the game's next event sequence number, appends it to the game's event log and
+    publishes it to every worker registered with `add_game_worker` (or, in cluster mode, to the game's sharded channel),
+    all in one script so the log and the published order always agree. `recipients` is the JSON encoded list of socket channels the message is for and `message` its
+    JSON encoding, which gets a "seq" field. `trace_context` is the JSON encoded trace and span IDs of a traced publish,
+    which go in the broadcast frame's header but not the log. The log keeps roughly the last EVENT_LOG_MAX_LEN events.
+    Returns the sequence number."""
+    return await _append_event_script(
+        keys=[_event_sequence_key(game_id), _event_log_key(game_id), _game_workers_key(game_id)],
+        args=[recipients, operation, message, _EVENT_LOG_SIZE, _SESSION_EXPIRY, game_events_channel(game_id) if backends.cluster_mode() else "", repr(time.time()), trace_context],
+    )
+
+
+@metrics.session_call
+async def add_game_worker(game_id: str, channel: str) -> None:
+    """Registers a worker's pubsub channel to receive the game's events."""
+    game_db = await _game_db(game_id)
+    async with game_db.pipeline(transaction=True) as pipe:
+        pipe.sadd(_game_workers_key(game_id), channel)
+        pipe.expire(_game_workers_key(game_id), time=_SESSION_EXPIRY)
+        await pipe.execute()
+
+
+@metrics.session_call
+async def remove_game_worker(game_id: str, channel: str) -> None:
+    await _session_db.srem(_game_workers_key(game_id), channel)
+
+
+@metrics.session_call
+async def read_events(game_id: str, after_seq: int = 0) -> tuple[int, list[tuple[int, str, list[str], str]]]:
+    """Returns the game's latest event sequence number and the logged events after `after_seq` as (seq, operation,
+    recipients, message) tuples. Events older than the log's cap are gone, so the first one returned can be later than
+    `after_seq + 1`."""
+    async with _session_db.pipeline(transaction=False) as reads:
+        reads.get(_event_sequence_key(game_id))
+        reads.xrange(_event_log_key(game_id), min=f"{after_seq + 1}-0")
+        latest_seq, entries = await reads.execute()
+    events = [(int(entry_id.split("-")[0]), fields["operation"], json.loads(fields["channels"]), fields["message"]) for entry_id, fields in entries]
+    return int(latest_seq or 0), events
+
+
+@metrics.session_call
+async def forward_operation(worker_id: str, data: str) -> None:
+    await backends.publish(_session_db, _worker_operations_channel(worker_id), data)
+
+
+async def listen_for_operations(worker_id: str) -> AsyncIterator[str]:
+    """Yields operations forwarded to `worker_id` by other workers."""
+    pubsub = backends.create_pubsub(_session_db)
+    await pubsub.subscribe(_worker_operations_channel(worker_id))
+    try:
+        while True:
+            try:
+                message = await pubsub.get_message(timeout=None)
+            except redis.ConnectionError:
+                logger.error("Lost connection to the forwarded operations channel. Retrying", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if message is not None:
+                yield message["data"]
+    finally:
+        await pubsub.close()
+
+
+async def close() -> None:
+    if _invalidation_task:
+        _invalidation_task.cancel()
+    await backends.close(_session_db)
@@ -1,36 +1,50 @@
 import asyncio
 import json
 import logging
-from typing import Type, Callable, Awaitable
+import time
+import uuid
+from typing import Type, Callable, Awaitable, Optional
 
 import redis.asyncio as redis
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect, status
 from starlette.websockets import WebSocketState
 
+import server.backends as backends
+import server.codec as codec
 import server.config as config
+import server.metrics as metrics
+import server.session as session
+import server.tracing as tracing
 from server.exceptions import InvalidOperation
 from server.models import PrecariousnessBaseModel, SocketMessage
+from server.models.message import EventsMissedMessage, GameSnapshotMessage
 
 logger = logging.getLogger(__name__)
 
 
-host, port, password = config.get_redis_config()
-user_part = f":{password}@" if password is not None else ""
-_redis_client = redis.StrictRedis.from_url(f"redis://{user_part}{host}:{port}")
-_redis_pubsub = _redis_client.pubsub()
+_redis_client = backends.create_client(decode_responses=False)
 
 
 class SocketHandler:
     def __init__(self):
         self.operation_handlers: dict[str, tuple[Callable, Type[PrecariousnessBaseModel]]] = {}
         self.error_handlers: dict[Type, Callable[[WebSocket, Exception], Awaitable[str | dict]]] = {}
+        self.stateless_operations: set[str] = set()
+        self.internal_operations: set[str] = set()
+        self.executor: Optional[Callable[[str, str, PrecariousnessBaseModel, dict], Awaitable[None]]] = None
 
-    def operation(self, operation_name: str, model_type: Type[PrecariousnessBaseModel]):
+    def operation(self, operation_name: str, model_type: Type[PrecariousnessBaseModel], stateless: bool = False, internal: bool = False):
+        """Registers an operation handler. Stateless operations don't touch game state and always run on the worker that
+        received them, bypassing the executor. Internal operations can only be started by the server through `execute`."""
         if operation_name in self.operation_handlers:
             raise KeyError(f"Operation name '{operation_name}' already in use")
 
         def decorator(func):
             self.operation_handlers[operation_name] = (func, model_type)
+            if stateless:
+                self.stateless_operations.add(operation_name)
+            if internal:
+                self.internal_operations.add(operation_name)
 
         return decorator
 
@@ -46,30 +60,66 @@ class SocketHandler:
     async def handle_operation(self, websocket: WebSocket, **kwargs):
         while websocket.application_state == WebSocketState.CONNECTED:
             try:
-                data = await websocket.receive_json()
-                logger.debug(f"Processing message: {json.dumps(data)}")
-                message = SocketMessage.parse_obj(data)
-                if message.operation not in self.operation_handlers:
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+                data = codec.decode_frame(frame, codec.socket_encoding(websocket))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Processing message: {json.dumps(data)}")
+                message = _parse_envelope(data)
+                if message.operation not in self.operation_handlers or message.operation in self.internal_operations:
                     raise InvalidOperation(message.operation)
                 logger.info(f"Routing operation: {message.operation}")
-                func, model_type = self.operation_handlers[message.operation]
+                _, model_type = self.operation_handlers[message.operation]
                 payload = model_type.parse_obj(message.payload)
-                await func(message.game_id, payload, **kwargs)
+                with tracing.start_trace(f"receive {message.operation}", game_id=message.game_id or ""):
+                    await self.execute(message.game_id, message.operation, payload, **kwargs)
+            except WebSocketDisconnect as e:
+                await self.handle_error(websocket, e)
+                return
             except Exception as e:
                 await self.handle_error(websocket, e)
 
+    async def execute(self, game_id: str, operation_name: str, payload: PrecariousnessBaseModel, **kwargs):
+        """Runs an operation through the executor if one is set, otherwise directly on this worker."""
+        if self.executor is not None and operation_name not in self.stateless_operations:
+            await self.executor(game_id, operation_name, payload, kwargs)
+        else:
+            await self.run_operation(game_id, operation_name, payload, **kwargs)
+
+    async def run_operation(self, game_id: str, operation_name: str, payload: PrecariousnessBaseModel, **kwargs):
+        func, _ = self.operation_handlers[operation_name]
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"handle {operation_name}"):
+                await func(game_id, payload, **kwargs)
+        finally:
+            metrics.operation_duration.observe(operation_name, time.perf_counter() - started)
+
     async def handle_error(self, websocket: WebSocket, exc: Exception):
         bases = type(exc).mro()
         for base in bases:
             if base in self.error_handlers:
+                metrics.socket_errors.inc(base.__name__)
                 error_message = await self.error_handlers[base](websocket, exc)
                 if error_message and websocket.application_state == WebSocketState.CONNECTED:
                     await websocket.send_json({"error": error_message})
                 return
+        metrics.socket_errors.inc(type(exc).__name__)
         logger.warning(f"No handler registered for exception: {type(exc)}")
         raise exc
 
 
+def _parse_envelope(data) -> SocketMessage:
+    """Builds the envelope without validation when it is well formed, which it almost always is. Anything else goes
+    through pydantic so the sender gets the usual validation error."""
+    if not isinstance(data, dict):
+        return SocketMessage.parse_obj(data)
+    if isinstance(data.get("operation"), str) and isinstance(data.get("payload", {}), (dict, list)) and isinstance(data.get("gameId"), (str, type(None))):
+        return SocketMessage.construct(operation=data["operation"], payload=data.get("payload", {}), game_id=data.get("gameId"))
+    return SocketMessage.parse_obj(data)
+
+
 def player_channel(game_id: str, player_ids: str | list[str]) -> str | list[str]:
     if not isinstance(player_ids, list):
         player_ids = [player_ids]
@@ -86,41 +136,440 @@ def gameboard_channel(game_id: str) -> str:
     return f"{game_id}:channel:gameboard"
 
 
-_sockets: dict[str, WebSocket] = {}
-_routing_task = None
-
-
-async def _route_messages():
-    while True:
-        channel_data = await _redis_pubsub.get_message(ignore_subscribe_messages=True)
-        if channel_data is not None:
-            channel = channel_data["channel"].decode()
-            await _sockets[channel].send_text(channel_data["data"])
-
-
-async def register_socket_route(channel: str, websocket: WebSocket):
-    await _redis_pubsub.subscribe(channel)
-    _sockets[channel] = websocket
-    logger.info(f"Registered websocket for channel \"{channel}\"")
-
-    global _routing_task
-    if not _routing_task:
-        _routing_task = asyncio.create_task(_route_messages())
-
-
-async def unregister_socket_route(channel: str):
-    await _redis_pubsub.unsubscribe(channel)
-    del _sockets[channel]
-
-
-async def publish_message(game_id: str, operation: str, message: PrecariousnessBaseModel | list[PrecariousnessBaseModel], channels: str | list[str]):
-    if isinstance(message, list):
-        message = [m.dict(by_alias=True) for m in message]
-        data = SocketMessage(operation=operation, payload=message, game_id=game_id).dict(by_alias=True)
-    else:
-        data = SocketMessage(operation=operation, payload=message.dict(by_alias=True), game_id=game_id).dict(by_alias=True)
+def spectator_channel(game_id: str) -> str:
+    """Holds the game's place in a worker's routing while it has spectators. Nothing is ever published to it."""
+    return f"{game_id}:channel:spectators"
+
+
+def worker_channel(worker_id: str) -> str:
+    return f"worker:{worker_id}:events"
+
+
+_max_queue_size, _overflow_policy = config.get_socket_queue_config()
+_batch_window = config.get_socket_batch_window()
+_spectator_queue_size = config.get_spectator_queue_size()
+
+
+def _finish_spans(items: list[tuple[bytes, Optional[tracing.Span]]], **attributes) -> None:
+    for _, span in items:
+        if span is not None:
+            span.finish(**attributes)
+
+
+class SocketWriter:
+    """Owns the outbound side of one websocket. Frames are queued by the router and written by a dedicated task, so a
+    slow client only ever delays its own messages. Game events are tracked by sequence number so a socket that is
+    resuming never gets the same event twice or out of order. A socket that takes batches is sent everything queued
+    within SOCKET_BATCH_WINDOW_MS of the first message as one frame holding an array of messages, so the burst of
+    events a single operation publishes costs one frame instead of one each."""
+
+    def __init__(self, channel: str, websocket: WebSocket, last_seq: Optional[int] = None, batch: bool = False):
+        self.channel = channel
+        self.websocket = websocket
+        self.encoding = codec.socket_encoding(websocket)
+        self.batch = batch
+        self.last_seq = last_seq or 0
+        self.queue: asyncio.Queue[tuple[bytes, Optional[tracing.Span]]] = asyncio.Queue(maxsize=_max_queue_size)
+        self.task = asyncio.create_task(self._drain())
+        self._held: Optional[list[tuple[int, bytes, Optional[tracing.Span]]]] = [] if last_seq is not None else None
+        self._close_task: Optional[asyncio.Task] = None
+
+    def deliver(self, seq: int, data: bytes, span: Optional[tracing.Span] = None) -> None:
+        """Queues a game event unless the socket has already been sent it. Events that arrive while the socket is
+        replaying the event log are held until `finish_replay`. A traced event's `span` is finished once the event is
+        written to the socket, or with a `dropped` reason if it never is."""
+        if self._held is not None:
+            self._held.append((seq, data, span))
+        elif seq > self.last_seq:
+            self.last_seq = seq
+            self.enqueue(data, span)
+        elif span is not None:
+            span.finish(dropped="duplicate")
+
+    def finish_replay(self, events: list[tuple[int, bytes]]) -> None:
+        held, self._held = self._held or [], None
+        for seq, data, span in sorted([(seq, data, None) for seq, data in events] + held, key=lambda event: event[0]):
+            self.deliver(seq, data, span)
+
+    def enqueue(self, data: bytes, span: Optional[tracing.Span] = None) -> None:
+        try:
+            self.queue.put_nowait((data, span))
+        except asyncio.QueueFull:
+            metrics.socket_queue_overflows.inc(_overflow_policy)
+            if _overflow_policy == "close":
+                logger.warning(f"Outbound queue for channel \"{self.channel}\" is full. Closing socket")
+                router.detach(self.channel, self.websocket)
+                self.stop()
+                _finish_spans([(data, span)], dropped="closed")
+                self._close_task = asyncio.create_task(self._close())
+            else:
+                logger.warning(f"Outbound queue for channel \"{self.channel}\" is full. Dropping oldest message")
+                _finish_spans([self.queue.get_nowait()], dropped="overflow")
+                self.queue.put_nowait((data, span))
+
+    def stop(self) -> None:
+        self.task.cancel()
+        queued = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+        _finish_spans(queued + [(data, span) for _, data, span in self._held or []], dropped="closed")
+
+    async def _drain(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.batch:
+                if _batch_window > 0:
+                    await asyncio.sleep(_batch_window)
+                while not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                metrics.socket_batch_size.observe("", len(batch))
+            if self.websocket.application_state != WebSocketState.CONNECTED:
+                _finish_spans(batch, dropped="disconnected")
+                continue
+            try:
+                await self.websocket.send_bytes(batch[0][0] if len(batch) == 1 else codec.encode_batch([data for data, _ in batch], self.encoding))
+            except Exception:
+                logger.warning(f"Failed to write to socket for channel \"{self.channel}\"", exc_info=True)
+            _finish_spans(batch)
+
+    async def _close(self):
+        try:
+            if self.websocket.application_state == WebSocketState.CONNECTED:
+                await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        except Exception:
+            logger.warning(f"Failed to close socket for channel \"{self.channel}\"", exc_info=True)
+
+
+class Spectator:
+    """A read-only viewer's websocket. Its short outbound queue holds frames shared with the rest of the audience. A
+    spectator starts out `behind`, and goes back to it when it fills its queue or asks to be resynced: its queue is
+    emptied and it gets no events until its audience sends it a snapshot of the game. Like a `SocketWriter` it tracks
+    the last event it was sent, so no event reaches it twice."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.encoding = codec.socket_encoding(websocket)
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=_spectator_queue_size)
+        self.behind = True
+        self.last_seq = 0
+        self.task = asyncio.create_task(self._drain())
+
+    def stop(self) -> None:
+        self.task.cancel()
+
+    async def _drain(self):
+        while True:
+            data = await self.queue.get()
+            if self.websocket.application_state != WebSocketState.CONNECTED:
+                continue
+            try:
+                await self.websocket.send_bytes(data)
+            except Exception:
+                logger.warning("Failed to write to a spectator socket", exc_info=True)
+
+
+class Audience:
+    """A game's spectators on this worker. They are shown what the gameboard is shown, piggybacking on the gameboard's
+    events, so spectators add no channels to an event's recipients and no traffic to Redis however many there are.
+    Each event is encoded once per encoding and the same bytes are queued for every spectator. Spectators that are
+    behind wait for a snapshot: a GAME_SNAPSHOT message stamped with the event sequence number it was taken at, which
+    is loaded and encoded once for everyone waiting on it. Events that arrive while a snapshot is loading are held, and
+    the ones after the snapshot's sequence number are sent right behind it."""
+
+    def __init__(self, game_id: str, load_snapshot: Callable[[str], Awaitable[tuple[int, session.GameUnitOfWork, list[tuple[int, str, list[str], str]]]]]):
+        self.game_id = game_id
+        self.spectators: set[Spectator] = set()
+        self._load_snapshot = load_snapshot
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._held: list[tuple[int, dict[str, bytes]]] = []
+
+    def add(self, spectator: Spectator) -> None:
+        self.spectators.add(spectator)
+        self.request_snapshot()
+
+    def broadcast(self, seq: int, encoded: dict[str, bytes]) -> None:
+        """Queues event `seq` for every spectator that is keeping up. `encoded` holds the event by encoding, starting
+        with JSON, and gains any other encoding a spectator needs."""
+        if self._snapshot_task is not None:
+            self._held.append((seq, encoded))
+        for spectator in self.spectators:
+            if spectator.behind:
+                # Only does anything if the last snapshot failed, in which case this retries it.
+                self.request_snapshot()
+            elif seq > spectator.last_seq:
+                self._queue(spectator, seq, encoded)
+
+    def resync(self, spectator: Spectator) -> None:
+        """Drops whatever the spectator has queued and sends it a fresh snapshot."""
+        spectator.behind = True
+        while not spectator.queue.empty():
+            spectator.queue.get_nowait()
+        self.request_snapshot()
+
+    def request_snapshot(self) -> None:
+        if self._snapshot_task is None:
+            self._held = []
+            self._snapshot_task = asyncio.create_task(self._send_snapshot())
+
+    def _queue(self, spectator: Spectator, seq: int, encoded: dict[str, bytes]) -> None:
+        if spectator.encoding not in encoded:
+            encoded[spectator.encoding] = codec.transcode(encoded[codec.JSON], spectator.encoding)
+        try:
+            spectator.queue.put_nowait(encoded[spectator.encoding])
+            spectator.last_seq = seq
+        except asyncio.QueueFull:
+            logger.info(f"A spectator of game {self.game_id} fell behind. Skipping it to a snapshot")
+            self.resync(spectator)
+
+    async def _send_snapshot(self):
+        try:
+            seq, game, events = await self._load_snapshot(self.game_id)
+            snapshot = {codec.JSON: codec.encode_message(self.game_id, "GAME_SNAPSHOT", _game_snapshot(self.game_id, seq, game, events))}
+            held = [(event_seq, encoded) for event_seq, encoded in self._held if event_seq > seq]
+            for spectator in [spectator for spectator in self.spectators if spectator.behind]:
+                spectator.behind = False
+                self._queue(spectator, seq, snapshot)
+                for event_seq, encoded in held:
+                    if spectator.behind:
+                        break
+                    self._queue(spectator, event_seq, encoded)
+                metrics.spectator_snapshots.inc()
+        except Exception:
+            logger.error(f"Failed to send a snapshot of game {self.game_id} to its spectators", exc_info=True)
+        finally:
+            self._snapshot_task = None
+            self._held = []
+
+    def stop(self) -> None:
+        for spectator in self.spectators:
+            spectator.stop()
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+
+
+def _game_snapshot(game_id: str, seq: int, game: session.GameUnitOfWork, events: list[tuple[int, str, list[str], str]]) -> GameSnapshotMessage:
+    """Builds a spectator's snapshot from the game's state and its logged events up to `seq`. The current turn's events
+    are the gameboard's events from the latest WAITING_FOR_PLAYER_CHOICE on, or every logged gameboard event if no turn
+    has started yet. STATE_CHANGED events are left out, since the state already includes them."""
+    turn_events = [(operation, message) for _, operation, channels, message in events if gameboard_channel(game_id) in channels and operation != "STATE_CHANGED"]
+    turn_start = max((i for i, (operation, _) in enumerate(turn_events) if operation == "WAITING_FOR_PLAYER_CHOICE"), default=0)
+    rounds = [
+        [
+            {"name": category.name, "key": category.key, "tiles": {amount: {"id": tile.id, "answered": tile.answered} for amount, tile in category.tiles.items()}}
+            for category in game_round
+        ]
+        for game_round in game.game_board.rounds
+    ]
+    return GameSnapshotMessage.construct(
+        seq=seq,
+        version=game.game_board.version,
+        current_round=game.game_board.current_round,
+        rounds=rounds,
+        players=game.players,
+        events=[json.loads(message) for _, message in turn_events[turn_start:]],
+    )
+
+
+class SocketRouter:
+    """This worker's routing table from socket channels to the websockets connected to it. The worker subscribes to one
+    Redis channel of its own rather than one per game. Each game keeps a registry of the workers that have any of its
+    sockets, and its events are published to just those workers' channels. In cluster mode the worker instead
+    subscribes to the sharded channel of each game it has sockets for, which is served by the node holding the game's
+    keys. `snapshot_loader` is what spectators' snapshots are loaded with, which `server.actors` provides since it
+    knows where a game's latest state is."""
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.channel = worker_channel(worker_id)
+        self.sockets: dict[str, SocketWriter] = {}
+        self.audiences: dict[str, Audience] = {}
+        self.snapshot_loader: Optional[Callable[[str], Awaitable[tuple[int, session.GameUnitOfWork, list[tuple[int, str, list[str], str]]]]]] = None
+        self.game_channels: dict[str, set[str]] = {}
+        self._pubsub = None
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._pubsub = backends.create_pubsub(_redis_client)
+            if not backends.cluster_mode():
+                await self._pubsub.subscribe(self.channel)
+            self._task = asyncio.create_task(self._route_messages())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        for game_id in list(self.game_channels):
+            await self._unsubscribe(game_id)
+        await self._pubsub.close()
+
+    async def _route_messages(self):
+        while True:
+            try:
+                channel_data = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except redis.ConnectionError:
+                logger.error("Lost connection to Redis pubsub. Retrying", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if channel_data is not None:
+                self.deliver(channel_data["data"])
+
+    async def _subscribe(self, game_id: str):
+        if backends.cluster_mode():
+            await self._pubsub.subscribe(session.game_events_channel(game_id))
+        else:
+            await session.add_game_worker(game_id, self.channel)
+
+    async def _unsubscribe(self, game_id: str):
+        if backends.cluster_mode():
+            await self._pubsub.unsubscribe(session.game_events_channel(game_id))
+        else:
+            await session.remove_game_worker(game_id, self.channel)
+
+    def deliver(self, frame: bytes):
+        """A broadcast frame is a JSON header holding the event's sequence number, its recipient channels, when it was
+        published and, for a traced event, the trace and span IDs of its publish, then a newline, and the JSON encoded
+        message. Only the header is decoded here; the message bytes are handed to each local recipient as-is, or
+        converted once per frame for sockets that negotiated another encoding."""
+        header, data = frame.split(b"\n", 1)
+        seq, channels, published_at, trace_context = json.loads(header)
+        received_at = time.time()
+        metrics.pubsub_messages.inc()
+        metrics.publish_to_deliver.observe("", received_at - published_at)
+        route_span = None
+        if trace_context is not None:
+            route_span = tracing.start_span("route", trace_context, int(published_at * 1e9), seq=seq, worker=self.worker_id)
+            route_span.finish(int(received_at * 1e9))
+        encoded = {codec.JSON: data}
+        for channel in channels:
+            writer = self.sockets.get(channel)
+            if writer is not None:
+                if writer.encoding not in encoded:
+                    encoded[writer.encoding] = codec.transcode(data, writer.encoding)
+                span = None if route_span is None else tracing.start_span("deliver", route_span.context(), int(received_at * 1e9), channel=channel)
+                writer.deliver(seq, encoded[writer.encoding], span)
+            if self.audiences:
+                audience = self.audiences.get(channel)
+                if audience is not None:
+                    audience.broadcast(seq, encoded)
+
+    async def _add_game_channel(self, game_id: str, channel: str):
+        if game_id not in self.game_channels:
+            self.game_channels[game_id] = set()
+            await self._subscribe(game_id)
+        self.game_channels[game_id].add(channel)
+
+    async def register(self, game_id: str, channel: str, websocket: WebSocket, last_seq: Optional[int] = None, batch: bool = False):
+        """Starts routing the game's events to `websocket`. A socket that is reconnecting passes the sequence number
+        of the last event it received and is first sent the events it missed from the game's event log. `batch` is
+        whether the socket takes frames holding several messages."""
+        await self._add_game_channel(game_id, channel)
+        if channel in self.sockets:
+            self.sockets[channel].stop()
+        writer = self.sockets[channel] = SocketWriter(channel, websocket, last_seq, batch)
+        logger.info(f"Registered websocket for channel \"{channel}\"")
+
+        if last_seq is not None:
+            await _replay_events(game_id, writer, last_seq)
+
+    async def unregister(self, game_id: str, channel: str):
+        writer = self.sockets.pop(channel, None)
+        if writer is not None:
+            writer.stop()
+        channels = self.game_channels.get(game_id, set())
+        channels.discard(channel)
+        if not channels and game_id in self.game_channels:
+            del self.game_channels[game_id]
+            await self._unsubscribe(game_id)
+
+    async def add_spectator(self, game_id: str, websocket: WebSocket) -> Spectator:
+        """Adds `websocket` to the game's audience on this worker. It is sent a snapshot of the game, then the events
+        the gameboard is sent."""
+        audience = self.audiences.get(gameboard_channel(game_id))
+        if audience is None:
+            audience = self.audiences[gameboard_channel(game_id)] = Audience(game_id, self.snapshot_loader)
+            await self._add_game_channel(game_id, spectator_channel(game_id))
+        spectator = Spectator(websocket)
+        audience.add(spectator)
+        return spectator
+
+    async def remove_spectator(self, game_id: str, spectator: Spectator) -> None:
+        spectator.stop()
+        audience = self.audiences.get(gameboard_channel(game_id))
+        if audience is None:
+            return
+        audience.spectators.discard(spectator)
+        if not audience.spectators:
+            audience.stop()
+            del self.audiences[gameboard_channel(game_id)]
+            await self.unregister(game_id, spectator_channel(game_id))
+
+    def resync_spectator(self, game_id: str, spectator: Spectator) -> None:
+        audience = self.audiences.get(gameboard_channel(game_id))
+        if audience is not None and spectator in audience.spectators:
+            audience.resync(spectator)
+
+    def detach(self, channel: str, websocket: WebSocket) -> None:
+        """Stops writing to `websocket` but keeps its channel's place in the game's routing, so a socket that
+        reconnects to the channel slots straight back in. Does nothing if another socket has already taken over the
+        channel."""
+        writer = self.sockets.get(channel)
+        if writer is not None and writer.websocket is websocket:
+            del self.sockets[channel]
+            writer.stop()
+
+    async def release(self, game_id: str, channel: str) -> None:
+        """Drops a detached channel from the game's routing unless a socket has reattached to it."""
+        if channel not in self.sockets:
+            await self.unregister(game_id, channel)
+
+    def send_to_local_socket(self, channel: str, data: bytes) -> bool:
+        """Queues a JSON encoded message for a socket connected to this worker without going through Redis."""
+        writer = self.sockets.get(channel)
+        if writer is None:
+            return False
+        writer.enqueue(codec.transcode(data, writer.encoding))
+        return True
+
+
+async def _replay_events(game_id: str, writer: SocketWriter, last_seq: int):
+    """Sends a resuming socket the logged events it missed. Events published meanwhile are held by the writer and
+    merged in by sequence number. If the log no longer reaches back to `last_seq` the socket is told with an
+    EVENTS_MISSED message, after which it gets whatever the log still has."""
+    try:
+        latest_seq, events = await session.read_events(game_id, last_seq)
+    except Exception:
+        logger.error(f"Failed to read the event log for game {game_id}", exc_info=True)
+        latest_seq, events = last_seq, []
+    if last_seq > latest_seq or (latest_seq > last_seq and (not events or events[0][0] > last_seq + 1)):
+        logger.warning(f"Event log for game {game_id} doesn't reach back to {last_seq} for channel \"{writer.channel}\"")
+        writer.last_seq = min(last_seq, latest_seq)
+        writer.enqueue(codec.transcode(codec.encode_message(game_id, "EVENTS_MISSED", EventsMissedMessage(last_seq=latest_seq)), writer.encoding))
+    missed = [(seq, codec.transcode(message.encode(), writer.encoding)) for seq, _, recipients, message in events if writer.channel in recipients]
+    writer.finish_replay(missed)
+    logger.info(f"Replayed {len(missed)} events to channel \"{writer.channel}\"")
+
+
+router = SocketRouter(uuid.uuid4().hex)
+
+metrics.Gauge("precariousness_sockets", "Websockets connected to this worker", lambda: len(router.sockets))
+metrics.Gauge("precariousness_games", "Games with a websocket connected to this worker", lambda: len(router.game_channels))
+metrics.Gauge(
+    "precariousness_socket_queue_depth",
+    "Messages waiting in each socket's outbound queue",
+    lambda: {channel: writer.queue.qsize() for channel, writer in router.sockets.items()},
+    "channel",
+)
+metrics.Gauge("precariousness_spectators", "Spectator websockets connected to this worker", lambda: sum(len(a.spectators) for a in router.audiences.values()))
+
+
+async def publish_message(game_id: str, operation: str, message: PrecariousnessBaseModel | list[PrecariousnessBaseModel], channels: str | list[str]) -> int:
+    """Appends the message to the game's event log and broadcasts it to `channels`. Returns its sequence number."""
     if not isinstance(channels, list):
         channels = [channels]
 
-    for channel in channels:
-        await _redis_client.publish(channel, json.dumps(data))
+    data = codec.encode_message(game_id, operation, message).decode()
+    span = tracing.start_span(f"publish {operation}", recipients=len(channels))
+    if span is None:
+        return await session.append_event(game_id, json.dumps(channels), operation, data)
+    seq = await session.append_event(game_id, json.dumps(channels), operation, data, json.dumps(span.context()))
+    span.finish(seq=seq)
+    return seq
@@ -0,0 +1,161 @@
+"""Server-side clue timers.
+
+A clue's timer starts when the gameboard reveals it, pauses while a player who buzzed is being judged, resumes after an
+incorrect response and stops once the clue is answered. When it runs out the clue is expired with the internal
+CLUE_EXPIRED operation, so the game no longer depends on the gameboard's browser tab keeping time.
+
+Deadlines are kept in Redis, sharded by game ID, where a script lets exactly one worker claim each expiry. The worker that starts or
+resumes a timer also puts it on an in-process timing wheel, which fires it on time with O(1) arming and cancelling
+however many games are running. Every worker also checks Redis once a second for deadlines that passed a while ago
+without being claimed, which picks up the timers of workers that stopped or restarted."""
+import asyncio
+import logging
+import math
+import time
+from typing import Optional
+
+import server.config as config
+import server.session as session
+from server.models.message import ClueExpiredMessage, ClueRevealedMessage
+from server.socket_handler import SocketHandler
+
+logger = logging.getLogger(__name__)
+
+_clue_time = config.get_clue_time()
+_TICK_MS = 50
+_WHEEL_SIZE = 512
+_RECOVERY_INTERVAL = 1.0
+_RECOVERY_GRACE_MS = 2000
+_RECOVERY_BATCH = 100
+
+_socket_handler: Optional[SocketHandler] = None
+_ticker_task = None
+_expiries: set[asyncio.Task] = set()
+
+
+class TimingWheel:
+    """A hashed timing wheel of `size` slots, each `tick_ms` wide. A timer goes in the slot its deadline's tick maps to
+    and is only fired once its deadline has passed, so deadlines more than one turn of the wheel away wait in their
+    slot for later turns. Holds one timer per key."""
+
+    def __init__(self, tick_ms: int, size: int):
+        self.tick_ms = tick_ms
+        self.slots: list[dict[str, int]] = [{} for _ in range(size)]
+        self.timers: dict[str, int] = {}
+        self.current_tick = time.time_ns() // 1_000_000 // tick_ms
+
+    def arm(self, key: str, deadline_ms: int) -> None:
+        self.cancel(key)
+        tick = max(math.ceil(deadline_ms / self.tick_ms), self.current_tick + 1)
+        slot = tick % len(self.slots)
+        self.slots[slot][key] = deadline_ms
+        self.timers[key] = slot
+
+    def cancel(self, key: str) -> None:
+        slot = self.timers.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self, now_ms: int) -> list[tuple[str, int]]:
+        """Moves the wheel up to `now_ms` and returns the timers that are due as (key, deadline) pairs."""
+        due = []
+        while self.current_tick < now_ms // self.tick_ms:
+            self.current_tick += 1
+            slot = self.slots[self.current_tick % len(self.slots)]
+            for key, deadline_ms in list(slot.items()):
+                if deadline_ms <= now_ms:
+                    del slot[key]
+                    del self.timers[key]
+                    due.append((key, deadline_ms))
+        return due
+
+
+_wheel = TimingWheel(_TICK_MS, _WHEEL_SIZE)
+
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+async def start_clue_timer(game_id: str, clue: ClueRevealedMessage) -> None:
+    deadline_ms = _now_ms() + int(_clue_time * 1000)
+    expired_message = ClueExpiredMessage(category_key=clue.category_key, amount=clue.amount)
+    await session.arm_clue_timer(game_id, deadline_ms, expired_message.json(by_alias=True))
+    _wheel.arm(game_id, deadline_ms)
+
+
+async def pause_clue_timer(game_id: str) -> None:
+    _wheel.cancel(game_id)
+    await session.pause_clue_timer(game_id, _now_ms())
+
+
+async def resume_clue_timer(game_id: str) -> None:
+    deadline_ms = await session.resume_clue_timer(game_id, _now_ms())
+    if deadline_ms >= 0:
+        _wheel.arm(game_id, deadline_ms)
+
+
+async def stop_clue_timer(game_id: str) -> None:
+    _wheel.cancel(game_id)
+    await session.cancel_clue_timer(game_id)
+
+
+async def _expire(game_id: str, deadline_ms: int):
+    try:
+        clue = await session.claim_clue_timer(game_id, deadline_ms)
+        if clue is None:
+            return
+        logger.info(f"Clue timer ran out for game {game_id}")
+        await _socket_handler.execute(game_id, "CLUE_EXPIRED", ClueExpiredMessage.parse_raw(clue))
+    except Exception:
+        logger.error(f"Failed to expire the clue for game {game_id}", exc_info=True)
+
+
+def _spawn_expiry(game_id: str, deadline_ms: int):
+    task = asyncio.create_task(_expire(game_id, deadline_ms))
+    _expiries.add(task)
+    task.add_done_callback(_expiries.discard)
+
+
+async def _recover_overdue_timers():
+    try:
+        overdue = await session.get_overdue_clue_timers(_now_ms() - _RECOVERY_GRACE_MS, _RECOVERY_BATCH)
+    except Exception:
+        logger.error("Failed to read overdue clue timers", exc_info=True)
+        return
+    for game_id, deadline_ms in overdue:
+        logger.warning(f"Clue timer for game {game_id} wasn't fired by the worker that started it. Firing it")
+        _spawn_expiry(game_id, deadline_ms)
+
+
+async def _tick():
+    ticks_per_recovery = int(_RECOVERY_INTERVAL * 1000 / _TICK_MS)
+    ticks = 0
+    while True:
+        await asyncio.sleep(_TICK_MS / 1000)
+        for game_id, deadline_ms in _wheel.advance(_now_ms()):
+            _spawn_expiry(game_id, deadline_ms)
+        ticks += 1
+        if ticks % ticks_per_recovery == 0:
+            await _recover_overdue_timers()
+
+
+def start(socket_handler: SocketHandler) -> None:
+    """Starts firing clue timers through `socket_handler`'s CLUE_EXPIRED operation."""
+    global _socket_handler, _ticker_task
+    _socket_handler = socket_handler
+    if not _ticker_task:
+        _ticker_task = asyncio.create_task(_tick())
+
+
+async def stop() -> None:
+    """Stops the ticker, then cancels the expiries still in flight and waits for them, so none of them outlives the
+    session store."""
+    global _ticker_task
+    if _ticker_task:
+        _ticker_task.cancel()
+        _ticker_task = None
+    expiries = list(_expiries)
+    for task in expiries:
+        task.cancel()
+    await asyncio.gather(*expiries, return_exceptions=True)
@@ -0,0 +1,193 @@
+"""Sampled tracing of socket operations, from the frame arriving through to every socket write it causes.
+
+A sampled inbound operation starts a trace. Its spans cover the handler, each `publish_message` call, the event's trip
+through Redis pubsub to each worker's router and its wait in each recipient socket's outbound queue. The trace and
+parent span IDs travel with the event in its broadcast frame header, so spans recorded on other workers join the same
+trace. Finished spans are exported once a second in the OTLP/JSON span format: appended to TRACE_FILE one span per
+line, and/or posted to an OTLP/HTTP collector at TRACE_OTLP_ENDPOINT. Unsampled operations only pay for one random
+number and a context variable lookup per span."""
+import asyncio
+import json
+import logging
+import random
+import time
+import urllib.request
+import uuid
+from contextvars import ContextVar, Token
+from typing import Optional
+
+import server.config as config
+
+logger = logging.getLogger(__name__)
+
+TraceContext = tuple[str, str]
+
+_EXPORT_INTERVAL = 1.0
+_MAX_PENDING_SPANS = 10000
+
+_sample_rate, _trace_file, _otlp_endpoint = config.get_tracing_config()
+_current_context: ContextVar[Optional[TraceContext]] = ContextVar("current_trace_context", default=None)
+_finished: list[dict] = []
+_export_task = None
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """One timed step of a trace. Entering the span makes it the parent of spans started in the same context, and
+    leaving it records it for export."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "attributes", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], start: Optional[int] = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = start or time.time_ns()
+        self.attributes = attributes
+        self._token: Optional[Token] = None
+
+    def context(self) -> TraceContext:
+        return self.trace_id, self.span_id
+
+    def finish(self, end: Optional[int] = None, **attributes) -> None:
+        if len(_finished) >= _MAX_PENDING_SPANS:
+            return
+        self.attributes.update(attributes)
+        _finished.append({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(end or time.time_ns()),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+        })
+
+    def __enter__(self) -> "Span":
+        self._token = _current_context.set(self.context())
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_context.reset(self._token)
+        if exc_type is None:
+            self.finish()
+        else:
+            self.finish(error=exc_type.__name__)
+
+
+class _NoSpan:
+    """Stands in for a span when the operation isn't being traced."""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def current() -> Optional[TraceContext]:
+    """The trace and span IDs that new spans in this context are children of, or None if it isn't traced."""
+    return _current_context.get()
+
+
+def start_trace(name: str, **attributes) -> Span | _NoSpan:
+    """Starts a new trace for TRACE_SAMPLE_RATE of calls."""
+    if _sample_rate <= 0 or random.random() >= _sample_rate:
+        return _NO_SPAN
+    return Span(name, uuid.uuid4().hex, None, **attributes)
+
+
+def start_span(name: str, parent: Optional[TraceContext] = None, start: Optional[int] = None, **attributes) -> Optional[Span]:
+    """Starts a child of `parent`, or of the context's current span. Returns None if neither is being traced."""
+    parent = parent or _current_context.get()
+    if parent is None:
+        return None
+    return Span(name, parent[0], parent[1], start, **attributes)
+
+
+def span(name: str, **attributes) -> Span | _NoSpan:
+    """`start_span` for use as a context manager."""
+    return start_span(name, **attributes) or _NO_SPAN
+
+
+class within:
+    """Makes `context`, received from another task or worker, the parent of spans started inside the block."""
+
+    __slots__ = ("context", "_token")
+
+    def __init__(self, context: Optional[TraceContext | list[str]]):
+        self.context = tuple(context) if context else None
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> None:
+        if self.context is not None:
+            self._token = _current_context.set(self.context)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            _current_context.reset(self._token)
+
+
+def _write_file(spans: list[dict]) -> None:
+    with open(_trace_file, "a") as trace_file:
+        trace_file.write("".join(json.dumps(s) + "\n" for s in spans))
+
+
+def _post_otlp(spans: list[dict]) -> None:
+    body = {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", "precariousness")]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+    request = urllib.request.Request(_otlp_endpoint, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=5):
+        pass
+
+
+async def _export():
+    global _finished
+    spans, _finished = _finished, []
+    if not spans:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        if _trace_file:
+            await loop.run_in_executor(None, _write_file, spans)
+        if _otlp_endpoint:
+            await loop.run_in_executor(None, _post_otlp, spans)
+    except Exception:
+        logger.warning(f"Failed to export {len(spans)} spans", exc_info=True)
+
+
+async def _export_periodically():
+    while True:
+        await asyncio.sleep(_EXPORT_INTERVAL)
+        await _export()
+
+
+async def start():
+    global _export_task
+    if _sample_rate > 0 and _export_task is None:
+        logger.info(f"Tracing {_sample_rate:.2%} of socket operations")
+        _export_task = asyncio.create_task(_export_periodically())
+
+
+async def stop():
+    global _export_task
+    if _export_task is not None:
+        _export_task.cancel()
+        _export_task = None
+        await _export()
@@ -7,12 +7,36 @@ function hideScreens() {
 
 class SocketMessageRouter {
 
-    constructor(ws_url) {
+    constructor(ws_url, params = {}) {
         this.handlers = new Map()
-        this.websocket = new WebSocket(ws_url)
+        this.url = ws_url
+        this.params = params
+        this.lastSeq = null
+        this.reconnectDelay = 1000
+        this.textDecoder = new TextDecoder()
+        this.connect()
+    }
+
+    // Opens the websocket, asking for events that arrive together to be sent as one frame. After a reconnect the URL
+    // carries the sequence number of the last game event received, so the server sends the events missed in between.
+    connect() {
+        const subprotocols = typeof msgpack === "undefined" ? ["precariousness.json"] : ["precariousness.msgpack", "precariousness.json"]
+        const params = new URLSearchParams(this.params)
+        params.set("batch", "true")
+        if (this.lastSeq !== null) {
+            params.set("lastSeq", this.lastSeq)
+        }
+        const query = params.toString()
+        this.websocket = new WebSocket(query ? this.url + "?" + query : this.url, subprotocols)
+        this.websocket.binaryType = "arraybuffer"
 
         this.websocket.onmessage = (event) => this.onMessage(event)
         this.websocket.onopen = (event) => this.onOpen(event)
+        this.websocket.onclose = (event) => this.onClose(event)
+    }
+
+    get usesMessagePack() {
+        return this.websocket.protocol === "precariousness.msgpack"
     }
 
     addRoute(route, handler) {
@@ -23,36 +47,74 @@ class SocketMessageRouter {
     }
 
     onOpen(event) {
-        console.debug("Websocket opened:", event)
+        console.debug("Websocket opened:", event, "protocol:", this.websocket.protocol)
+        this.reconnectDelay = 1000
     }
 
+    onClose(event) {
+        if (event.code === 1000 || event.code === 1008) {
+            return
+        }
+        console.warn("Websocket closed:", event.code, "reconnecting in", this.reconnectDelay, "ms")
+        setTimeout(() => this.connect(), this.reconnectDelay)
+        this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000)
+    }
+
+    decode(data) {
+        if (typeof data === "string") {
+            return JSON.parse(data)
+        }
+        if (this.usesMessagePack) {
+            return msgpack.decode(data)
+        }
+        return JSON.parse(this.textDecoder.decode(data))
+    }
+
+    // A frame holds one message, or an array of messages that are routed in order.
     onMessage(event) {
-        event.data.text().then((rawMessage) => {
-            console.debug("Received message:", rawMessage)
-            const message = JSON.parse(rawMessage)
-            if ("error" in message) {
-                console.error(message.error)
+        const data = this.decode(event.data)
+        const messages = Array.isArray(data) ? data : [data]
+        for (const message of messages) {
+            this.route(message)
+        }
+    }
+
+    route(message) {
+        console.debug("Received message:", message)
+        if ("error" in message) {
+            console.error(message.error)
+        } else if (message.operation === "PING") {
+            this.sendMessage("PONG", message.gameId, message.payload)
+        } else if (message.seq !== undefined && this.lastSeq !== null && message.seq <= this.lastSeq) {
+            console.debug("Skipping event already received:", message.seq)
+        } else if (message.operation === "EVENTS_MISSED" && !this.handlers.has("EVENTS_MISSED")) {
+            console.warn("Missed game events that are no longer available. Reloading")
+            location.reload()
+        } else {
+            if (message.seq !== undefined) {
+                this.lastSeq = message.seq
+            }
+            let operation = message.operation
+            if (this.handlers.has(operation)) {
+                this.handlers.get(operation)(message.payload)
             } else {
-                let operation = message.operation
-                if (this.handlers.has(operation)) {
-                    this.handlers.get(operation)(message.payload)
-                } else {
-                    console.warn("Encountered unregistered route:", message)
-                }
+                console.warn("Encountered unregistered route:", message)
             }
-        })
+        }
     }
 
     sendMessage(operation, gameId, obj) {
         const message = {"operation": operation, "gameId": gameId, "payload": obj}
         console.debug("Sending message:", message)
-        this.websocket.send(JSON.stringify(message))
+        this.websocket.send(this.usesMessagePack ? msgpack.encode(message) : JSON.stringify(message))
     }
 }
 
 
 const service = {
     headers: {"Content-Type": "application/json"},
+    gameBoardStates: new Map(),
+    playersStates: new Map(),
 
     _logAndThrow: function(response, exceptionMessage) {
         return response.json().then((body) => {
@@ -93,23 +155,80 @@ const service = {
             })
     },
     getGameBoardState: function (gameId) {
-        const postBody = {gameId: gameId}
+        const cached = this.gameBoardStates.get(gameId)
+        const postBody = cached ? {gameId: gameId, sinceVersion: cached.version} : {gameId: gameId}
         return fetch("/get_game_board_state", {method: "POST", headers: this.headers, body: JSON.stringify(postBody)})
             .then((response) => {
+                if (response.status === 304) {
+                    return cached
+                }
                 if (!response.ok) {
                     return this._logAndThrow(response, "Failed to get game board")
                 }
-                return response.json()
+                return response.json().then((body) => {
+                    if (!cached) {
+                        this.gameBoardStates.set(gameId, body)
+                        return body
+                    }
+                    this._applyBoardChanges(cached, body)
+                    return cached
+                })
             })
     },
     getPlayersState: function (gameId) {
-        const postBody = {gameId: gameId}
+        const cached = this.playersStates.get(gameId) || {version: 0, players: []}
+        const postBody = {gameId: gameId, sinceVersion: cached.version}
         return fetch("/get_players_state", {method: "POST", headers: this.headers, body: JSON.stringify(postBody)})
             .then((response) => {
+                if (response.status === 304) {
+                    return cached.players
+                }
                 if (!response.ok) {
                     return this._logAndThrow(response, "Failed to get players state")
                 }
-                return response.json()
+                return response.json().then((body) => {
+                    this._applyPlayerChanges(cached, body)
+                    this.playersStates.set(gameId, cached)
+                    return cached.players
+                })
             })
+    },
+    // Applies changes pushed over a socket to the cached state. Returns the updated players, or null if the cache
+    // had missed earlier changes and was dropped, in which case the next fetch catches up.
+    applyStateChanges: function (gameId, changes) {
+        const board = this.gameBoardStates.get(gameId)
+        if (board && board.version >= changes.sinceVersion) {
+            this._applyBoardChanges(board, changes)
+        } else {
+            this.gameBoardStates.delete(gameId)
+        }
+        const playersState = this.playersStates.get(gameId)
+        if (playersState && playersState.version >= changes.sinceVersion) {
+            this._applyPlayerChanges(playersState, changes)
+            return playersState.players
+        }
+        return null
+    },
+    _applyBoardChanges: function (board, changes) {
+        const answered = new Set(changes.answeredTileIds)
+        for (let round of board.rounds) {
+            for (let category of round) {
+                for (let tile of Object.values(category.tiles)) {
+                    if (answered.has(tile.id)) {
+                        tile.answered = true
+                        tile.version = changes.version
+                    }
+                }
+            }
+        }
+        board.currentRound = changes.currentRound
+        board.version = Math.max(board.version, changes.version)
+    },
+    _applyPlayerChanges: function (playersState, changes) {
+        const players = new Map(playersState.players.map((p) => [p.id, p]))
+        changes.players.forEach((p) => players.set(p.id, p))
+        changes.removedPlayerIds.forEach((id) => players.delete(id))
+        playersState.players = Array.from(players.values())
+        playersState.version = Math.max(playersState.version, changes.version)
     }
 }
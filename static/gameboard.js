@@ -1,4 +1,4 @@
-const NewGameBoard = function (gameBoardData, playersState, canvasElement, onClueReveal, onClueExpired) {
+const NewGameBoard = function (gameBoardData, playersState, canvasElement, onClueReveal) {
     let GAMEBOARD_STOP_GAME_LOOP = false
     let board = null
     let statusBar = null
@@ -13,7 +13,7 @@ const NewGameBoard = function (gameBoardData, playersState, canvasElement, onClu
     const CATEGORY_FONT_SIZE = "26"
     const CATEGORY_FONT = "Angkor"
     const STATUS_FONT = "50px Angkor"
-    const TIME_BAR_DURATION = 20000
+    const TIME_BAR_DURATION = 20000  // Display only. The server expires clues after CLUE_TIME_MS
     const REFERENCE_RESOLUTION_WIDTH = 1920
     const TEXT_SHADOW_OFFSET = 5
 
@@ -706,7 +706,7 @@ const NewGameBoard = function (gameBoardData, playersState, canvasElement, onClu
             let col = categoryToColumn(categoryKey)
             let row = amountToRow(col, amount)
             board.tiles[col][row].reveal()
-            statusBar.startTimeBar(TIME_BAR_DURATION, () => onClueExpired(categoryKey, amount))
+            statusBar.startTimeBar(TIME_BAR_DURATION, null)
         },
         pauseTimeBar: function () {
             statusBar.pauseTimeBar()
@@ -0,0 +1,156 @@
+// A minimal MessagePack codec covering the types used by socket messages: nil, booleans, numbers, strings, binary,
+// arrays and maps with string keys.
+const msgpack = (function () {
+    const textEncoder = new TextEncoder()
+    const textDecoder = new TextDecoder()
+
+    function encode(value) {
+        const bytes = []
+        write(value, bytes)
+        return new Uint8Array(bytes)
+    }
+
+    function pushUint(bytes, value, size) {
+        for (let shift = (size - 1) * 8; shift >= 0; shift -= 8) {
+            bytes.push(Math.floor(value / Math.pow(2, shift)) & 0xff)
+        }
+    }
+
+    function writeLength(bytes, length, fix, fixMax, small, medium, large) {
+        if (fix !== null && length <= fixMax) {
+            bytes.push(fix | length)
+        } else if (small !== null && length <= 0xff) {
+            bytes.push(small, length)
+        } else if (length <= 0xffff) {
+            bytes.push(medium)
+            pushUint(bytes, length, 2)
+        } else {
+            bytes.push(large)
+            pushUint(bytes, length, 4)
+        }
+    }
+
+    function write(value, bytes) {
+        if (value === null || value === undefined) {
+            bytes.push(0xc0)
+        } else if (value === true || value === false) {
+            bytes.push(value ? 0xc3 : 0xc2)
+        } else if (typeof value === "number") {
+            if (Number.isInteger(value) && value >= 0 && value <= 0xffffffff) {
+                if (value < 0x80) {
+                    bytes.push(value)
+                } else {
+                    bytes.push(0xce)
+                    pushUint(bytes, value, 4)
+                }
+            } else if (Number.isInteger(value) && value < 0 && value >= -0x20) {
+                bytes.push(value & 0xff)
+            } else {
+                const view = new DataView(new ArrayBuffer(8))
+                view.setFloat64(0, value)
+                bytes.push(0xcb, ...new Uint8Array(view.buffer))
+            }
+        } else if (typeof value === "string") {
+            const encoded = textEncoder.encode(value)
+            writeLength(bytes, encoded.length, 0xa0, 31, 0xd9, 0xda, 0xdb)
+            bytes.push(...encoded)
+        } else if (value instanceof Uint8Array) {
+            writeLength(bytes, value.length, null, 0, 0xc4, 0xc5, 0xc6)
+            bytes.push(...value)
+        } else if (Array.isArray(value)) {
+            writeLength(bytes, value.length, 0x90, 15, null, 0xdc, 0xdd)
+            value.forEach((item) => write(item, bytes))
+        } else {
+            const keys = Object.keys(value).filter((key) => value[key] !== undefined)
+            writeLength(bytes, keys.length, 0x80, 15, null, 0xde, 0xdf)
+            keys.forEach((key) => {
+                write(key, bytes)
+                write(value[key], bytes)
+            })
+        }
+    }
+
+    function decode(buffer) {
+        const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer)
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+        let offset = 0
+
+        function readUint(size) {
+            let value = 0
+            for (let i = 0; i < size; i++) {
+                value = value * 256 + bytes[offset++]
+            }
+            return value
+        }
+
+        function readInt(size) {
+            const value = [view.getInt8, view.getInt16, null, view.getInt32][size - 1].call(view, offset)
+            offset += size
+            return value
+        }
+
+        function readString(length) {
+            const value = textDecoder.decode(bytes.subarray(offset, offset + length))
+            offset += length
+            return value
+        }
+
+        function readArray(length) {
+            const value = []
+            for (let i = 0; i < length; i++) {
+                value.push(read())
+            }
+            return value
+        }
+
+        function readMap(length) {
+            const value = {}
+            for (let i = 0; i < length; i++) {
+                const key = read()
+                value[key] = read()
+            }
+            return value
+        }
+
+        function read() {
+            const type = bytes[offset++]
+            if (type < 0x80) return type
+            if (type >= 0xe0) return type - 0x100
+            if (type >= 0xa0 && type <= 0xbf) return readString(type & 0x1f)
+            if (type >= 0x90 && type <= 0x9f) return readArray(type & 0x0f)
+            if (type >= 0x80 && type <= 0x8f) return readMap(type & 0x0f)
+            switch (type) {
+                case 0xc0: return null
+                case 0xc2: return false
+                case 0xc3: return true
+                case 0xc4: case 0xc5: case 0xc6: {
+                    const length = readUint(1 << (type - 0xc4))
+                    offset += length
+                    return bytes.slice(offset - length, offset)
+                }
+                case 0xca: offset += 4; return view.getFloat32(offset - 4)
+                case 0xcb: offset += 8; return view.getFloat64(offset - 8)
+                case 0xcc: return readUint(1)
+                case 0xcd: return readUint(2)
+                case 0xce: return readUint(4)
+                case 0xcf: return readUint(8)
+                case 0xd0: return readInt(1)
+                case 0xd1: return readInt(2)
+                case 0xd2: return readInt(4)
+                case 0xd3: offset += 8; return Number(view.getBigInt64(offset - 8))
+                case 0xd9: return readString(readUint(1))
+                case 0xda: return readString(readUint(2))
+                case 0xdb: return readString(readUint(4))
+                case 0xdc: return readArray(readUint(2))
+                case 0xdd: return readArray(readUint(4))
+                case 0xde: return readMap(readUint(2))
+                case 0xdf: return readMap(readUint(4))
+            }
+            throw new Error("Unsupported MessagePack type: 0x" + type.toString(16))
+        }
+
+        return read()
+    }
+
+    return {encode: encode, decode: decode}
+})()
@@ -0,0 +1,39 @@
+import asyncio
+import os
+
+os.environ["SESSION_BACKEND"] = "memory"
+
+import pytest  # noqa: E402
+
+import server.backends as backends  # noqa: E402
+import server.session as session  # noqa: E402
+from server.models.game_state import GameBoard, Player  # noqa: E402
+
+
+def build_game_board() -> GameBoard:
+    """A one round board with two categories of two tiles each."""
+    categories = [
+        {"name": f"Category {category_num}", "tiles": {amount: {"clue": f"Clue {category_num} {amount}", "correct_response": "What is it?"} for amount in ("200", "400")}}
+        for category_num in range(2)
+    ]
+    return GameBoard.parse_obj({"rounds": [categories]})
+
+
+@pytest.fixture(autouse=True)
+def memory_store():
+    """Empties the in-process store every module's client shares, and the board cache in front of it."""
+    backends._memory_store.__init__()
+    session._board_cache.clear()
+    yield backends._memory_store
+
+
+@pytest.fixture
+def game_id() -> str:
+    """A game with a saved board and two players, "p1" and "p2", on no points."""
+    async def create_game(game_id: str):
+        await session.save_game_board(game_id, build_game_board())
+        for player_id in ("p1", "p2"):
+            await session.save_player(game_id, Player(id=player_id, name=player_id.upper(), score=0))
+
+    asyncio.run(create_game("TEST"))
+    return "TEST"
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+import server.buzzer as buzzer
+import server.session as session
+
+_BUZZERS = 300
+_ROUNDS = 5
+
+
+async def buzz_at_once(game_id: str, clue_id: str, player_ids: list[str]) -> list:
+    """Releases a buzz from every player at the same moment and returns what `arbitrate_buzz` returned for each."""
+    start = asyncio.Event()
+
+    async def buzz(player_id: str):
+        await start.wait()
+        return await buzzer.arbitrate_buzz(game_id, clue_id, player_id)
+
+    tasks = [asyncio.create_task(buzz(player_id)) for player_id in player_ids]
+    await asyncio.sleep(0)
+    start.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.mark.parametrize("buzz_window", [0, 0.05], ids=["first_come", "window"])
+def test_simultaneous_buzzes_have_one_winner(monkeypatch, game_id, buzz_window):
+    monkeypatch.setattr(buzzer, "_buzz_window", buzz_window)
+    player_ids = [f"player{i}" for i in range(_BUZZERS)]
+
+    async def run():
+        rounds = []
+        for round_num in range(_ROUNDS):
+            clue_id = f"0_0_{round_num}"
+            results = await buzz_at_once(game_id, clue_id, player_ids)
+            rounds.append((results, await session.get_players_buzzed(game_id, clue_id)))
+        return rounds
+
+    for results, players_buzzed in asyncio.run(run()):
+        winners = [winner for winner in results if winner is not None]
+        assert len(winners) == 1
+        assert players_buzzed == {winners[0]}
+
+
+def test_buzz_window_compensates_for_round_trip_time(monkeypatch, game_id):
+    monkeypatch.setattr(buzzer, "_buzz_window", 0.1)
+    monkeypatch.setitem(buzzer._round_trip_times, (game_id, "p2"), 0.05)
+
+    async def run():
+        first = asyncio.create_task(buzzer.arbitrate_buzz(game_id, "0_0_200", "p1"))
+        await asyncio.sleep(0.01)
+        second = await buzzer.arbitrate_buzz(game_id, "0_0_200", "p2")
+        return await first, second
+
+    assert asyncio.run(run()) == ("p2", None)
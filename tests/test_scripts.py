@@ -0,0 +1,125 @@
+"""Runs each of the session's Lua scripts on fakeredis alongside the Python twin the memory backend runs in its place,
+and checks that both return the same results and leave the same data behind."""
+import asyncio
+
+import pytest
+
+import server.session as session
+from server.memory_store import MemoryStore
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+_SCRIPTS = {
+    "buzz": (session._BUZZ_SCRIPT, session._buzz_locally),
+    "enter_buzz_window": (session._ENTER_BUZZ_WINDOW_SCRIPT, session._enter_buzz_window_locally),
+    "close_buzz_window": (session._CLOSE_BUZZ_WINDOW_SCRIPT, session._close_buzz_window_locally),
+    "claim_game": (session._CLAIM_GAME_SCRIPT, session._claim_game_locally),
+    "delete_if_equal": (session._DELETE_IF_EQUAL_SCRIPT, session._delete_if_equal_locally),
+    "append_event": (session._APPEND_EVENT_SCRIPT, session._append_event_locally),
+    "arm_clue_timer": (session._ARM_CLUE_TIMER_SCRIPT, session._arm_clue_timer_locally),
+    "pause_clue_timer": (session._PAUSE_CLUE_TIMER_SCRIPT, session._pause_clue_timer_locally),
+    "resume_clue_timer": (session._RESUME_CLUE_TIMER_SCRIPT, session._resume_clue_timer_locally),
+    "cancel_clue_timer": (session._CANCEL_CLUE_TIMER_SCRIPT, session._cancel_clue_timer_locally),
+    "claim_clue_timer": (session._CLAIM_CLUE_TIMER_SCRIPT, session._claim_clue_timer_locally),
+}
+
+_BUZZ_KEYS = ["lock", "buzzed", "window", "window_owner"]
+_TIMER_KEYS = ["deadlines", "clues", "paused"]
+
+
+def run_on_both(calls: list[tuple[str, list, list]], reads: list[tuple[str, tuple]]):
+    """Makes `calls` as (script, keys, args) on fakeredis and on a memory store, then reads both back with `reads` as
+    (command, args). Returns each side's results and reads."""
+    async def run():
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        store = MemoryStore()
+        redis_results, local_results = [], []
+        for name, keys, args in calls:
+            source, local_implementation = _SCRIPTS[name]
+            redis_results.append(await client.eval(source, len(keys), *keys, *args))
+            local_results.append(local_implementation(store, keys, args))
+        redis_reads = [await getattr(client, command)(*args) for command, args in reads]
+        local_reads = [getattr(store, command)(*args) for command, args in reads]
+        return (redis_results, redis_reads), (local_results, local_reads)
+
+    return asyncio.run(run())
+
+
+def test_buzz():
+    calls = [("buzz", _BUZZ_KEYS[:2], [player_id, 60]) for player_id in ("p1", "p2", "p3")]
+    on_redis, locally = run_on_both(calls, [("get", ("lock",)), ("smembers", ("buzzed",))])
+
+    assert on_redis == locally
+    assert locally == ([[1, ["p1"]], [0, ["p1"]], [0, ["p1"]]], ["3", {"p1"}])
+
+
+def test_buzz_window():
+    calls = [
+        ("enter_buzz_window", _BUZZ_KEYS[0:1] + _BUZZ_KEYS[2:], ["p2", 20.5, 60, 1600]),
+        ("enter_buzz_window", _BUZZ_KEYS[0:1] + _BUZZ_KEYS[2:], ["p1", 10.25, 60, 1600]),
+        ("enter_buzz_window", _BUZZ_KEYS[0:1] + _BUZZ_KEYS[2:], ["p1", 30, 60, 1600]),
+        ("close_buzz_window", _BUZZ_KEYS, [60]),
+        ("enter_buzz_window", _BUZZ_KEYS[0:1] + _BUZZ_KEYS[2:], ["p3", 5, 60, 1600]),
+        ("close_buzz_window", _BUZZ_KEYS, [60]),
+    ]
+    reads = [("get", ("lock",)), ("smembers", ("buzzed",)), ("exists", ("window", "window_owner"))]
+    on_redis, locally = run_on_both(calls, reads)
+
+    assert on_redis == locally
+    assert locally == ([1, 0, 0, "p1", -1, None], ["1", {"p1"}, 0])
+
+
+def test_empty_buzz_window_awards_nothing():
+    on_redis, locally = run_on_both([("close_buzz_window", _BUZZ_KEYS, [60])], [("get", ("lock",)), ("smembers", ("buzzed",))])
+
+    assert on_redis == locally
+    assert locally == ([None], [None, set()])
+
+
+def test_claim_and_release_game():
+    calls = [
+        ("claim_game", ["owner"], ["worker1", 10000]),
+        ("claim_game", ["owner"], ["worker2", 10000]),
+        ("delete_if_equal", ["owner"], ["worker2"]),
+        ("claim_game", ["owner"], ["worker1", 10000]),
+        ("delete_if_equal", ["owner"], ["worker1"]),
+        ("claim_game", ["owner"], ["worker2", 10000]),
+    ]
+    on_redis, locally = run_on_both(calls, [("get", ("owner",))])
+
+    assert on_redis == locally
+    assert locally == (["worker1", "worker1", 0, "worker1", 1, "worker2"], ["worker2"])
+
+
+def test_append_event():
+    calls = [
+        ("append_event", ["seq", "log", "workers"], ['["gameboard"]', "TEST", f'{{"operation":"TEST","payload":{{"n":{n}}}}}', 1000, 60, "", "1.5", "null"])
+        for n in range(3)
+    ]
+    on_redis, locally = run_on_both(calls, [("get", ("seq",)), ("xrange", ("log",))])
+
+    assert on_redis == locally
+    assert locally[0] == [1, 2, 3]
+    assert locally[1][1][2] == ("3-0", {"operation": "TEST", "channels": '["gameboard"]', "message": '{"operation":"TEST","payload":{"n":2},"seq":3}'})
+
+
+def test_clue_timer():
+    calls = [
+        ("arm_clue_timer", _TIMER_KEYS, ["GAME", 1000, "0_0_200"]),
+        ("claim_clue_timer", _TIMER_KEYS[:2], ["GAME", 999]),
+        ("pause_clue_timer", _TIMER_KEYS, ["GAME", 400]),
+        ("pause_clue_timer", _TIMER_KEYS, ["GAME", 500]),
+        ("claim_clue_timer", _TIMER_KEYS[:2], ["GAME", 1000]),
+        ("resume_clue_timer", _TIMER_KEYS, ["GAME", 2000]),
+        ("resume_clue_timer", _TIMER_KEYS, ["GAME", 2100]),
+        ("claim_clue_timer", _TIMER_KEYS[:2], ["GAME", 2600]),
+        ("claim_clue_timer", _TIMER_KEYS[:2], ["GAME", 2600]),
+        ("arm_clue_timer", _TIMER_KEYS, ["GAME", 5000, "0_1_400"]),
+        ("cancel_clue_timer", _TIMER_KEYS, ["GAME"]),
+    ]
+    reads = [("zrange", ("deadlines", 0, -1)), ("hgetall", ("clues",)), ("hgetall", ("paused",))]
+    on_redis, locally = run_on_both(calls, reads)
+
+    assert on_redis == locally
+    assert locally == ([1, None, 600, -1, None, 2600, -1, "0_0_200", None, 1, 1], [[], {}, {}])
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+
+import pytest
+from redis.exceptions import WatchError
+
+import server.session as session
+from server.models.game_state import Player
+
+
+def test_run_game_transaction_retries_when_the_game_changes(game_id):
+    attempts = []
+
+    async def award(game):
+        attempts.append(sorted(p.id for p in game.players))
+        if len(attempts) == 1:
+            await session.save_player(game_id, Player(id="p3", name="P3", score=0))
+        player = game.get_player("p1")
+        game.save_player(player.copy(update={"score": player.score + 200}))
+
+    async def run():
+        game = await session.run_game_transaction(game_id, award)
+        return game, await session.get_all_players(game_id), await session.get_state_changes(game_id, 0)
+
+    game, players, changes = asyncio.run(run())
+
+    assert attempts == [["p1", "p2"], ["p1", "p2", "p3"]]
+    assert {p.id: p.score for p in players} == {"p1": 200, "p2": 0, "p3": 0}
+    assert game.version == changes.version == 4
+
+
+def test_memory_pipeline_raises_watch_error_when_a_watched_key_changes(memory_store):
+    async def run():
+        memory_store.set("watched", 1)
+        async with session._session_db.pipeline(transaction=True) as pipe:
+            await pipe.watch("watched")
+            await session._session_db.set("watched", 2)
+            pipe.multi()
+            pipe.set("watched", 3)
+            with pytest.raises(WatchError):
+                await pipe.execute()
+        async with session._session_db.pipeline(transaction=True) as pipe:
+            await pipe.watch("watched")
+            await session._session_db.set("unwatched", 1)
+            pipe.multi()
+            pipe.set("watched", 4)
+            assert await pipe.execute() == [True]
+
+    asyncio.run(run())
+    assert memory_store.get("watched") == "4"
+
+
+def test_buzz_awards_the_clue_to_the_first_player_only(game_id):
+    async def run():
+        first = await session.buzz(game_id, "0_0_200", "p1")
+        second = await session.buzz(game_id, "0_0_200", "p2")
+        await session.reset_buzz_lock(game_id, "0_0_200")
+        after_reset = await session.buzz(game_id, "0_0_200", "p2")
+        return first, second, after_reset
+
+    first, second, after_reset = asyncio.run(run())
+
+    assert first == (True, {"p1"})
+    assert second == (False, {"p1"})
+    assert after_reset == (True, {"p1", "p2"})
+
+
+def test_buzz_window_awards_the_clue_to_the_earliest_buzz(game_id):
+    async def run():
+        opened = await session.enter_buzz_window(game_id, "0_0_200", "p2", 20.0, 0.15)
+        joined = await session.enter_buzz_window(game_id, "0_0_200", "p1", 10.0, 0.15)
+        winner = await session.close_buzz_window(game_id, "0_0_200")
+        late = await session.enter_buzz_window(game_id, "0_0_200", "p2", 30.0, 0.15)
+        closed_again = await session.close_buzz_window(game_id, "0_0_200")
+        return opened, joined, winner, late, closed_again, await session.get_players_buzzed(game_id, "0_0_200")
+
+    opened, joined, winner, late, closed_again, players_buzzed = asyncio.run(run())
+
+    assert (opened, joined, winner) == (1, 0, "p1")
+    assert (late, closed_again) == (-1, None)
+    assert players_buzzed == {"p1"}
+
+
+def test_append_event_numbers_logs_and_publishes_events(memory_store, game_id):
+    async def run():
+        pubsub = session._session_db.pubsub()
+        await pubsub.subscribe("worker")
+        await session.add_game_worker(game_id, "worker")
+        for n in range(3):
+            await session.append_event(game_id, '["gameboard"]', "TEST", json.dumps({"operation": "TEST", "payload": {"n": n}}))
+        frames = [(await pubsub.get_message(timeout=1))["data"] for _ in range(3)]
+        await pubsub.close()
+        return frames, await session.read_events(game_id), await session.read_events(game_id, after_seq=2)
+
+    frames, (latest_seq, events), (_, later_events) = asyncio.run(run())
+
+    assert latest_seq == 3
+    assert [(seq, operation, channels) for seq, operation, channels, _ in events] == [(1, "TEST", ["gameboard"]), (2, "TEST", ["gameboard"]), (3, "TEST", ["gameboard"])]
+    assert [json.loads(message) for *_, message in events] == [{"operation": "TEST", "payload": {"n": n}, "seq": n + 1} for n in range(3)]
+    assert [seq for seq, *_ in later_events] == [3]
+    header, message = frames[0].split("\n", 1)
+    assert json.loads(header)[:2] == [1, ["gameboard"]]
+    assert message == events[0][3]
+
+
+def test_read_events_only_goes_back_as_far_as_the_log(monkeypatch, game_id):
+    monkeypatch.setattr(session, "_EVENT_LOG_SIZE", 2)
+
+    async def run():
+        for n in range(5):
+            await session.append_event(game_id, '["gameboard"]', "TEST", json.dumps({"operation": "TEST"}))
+        return await session.read_events(game_id)
+
+    latest_seq, events = asyncio.run(run())
+
+    assert latest_seq == 5
+    assert [seq for seq, *_ in events] == [4, 5]
+
+
+def test_claim_game_gives_the_game_to_one_worker_until_it_is_released(game_id):
+    async def run():
+        claims = [await session.claim_game(game_id, "worker1", 10), await session.claim_game(game_id, "worker2", 10)]
+        await session.release_game(game_id, "worker2")
+        claims.append(await session.claim_game(game_id, "worker1", 10))
+        await session.release_game(game_id, "worker1")
+        claims.append(await session.claim_game(game_id, "worker2", 10))
+        return claims
+
+    assert asyncio.run(run()) == ["worker1", "worker1", "worker1", "worker2"]
+
+
+def test_game_lease_expires(memory_store, game_id):
+    async def run():
+        claims = [await session.claim_game(game_id, "worker1", 0.05)]
+        await asyncio.sleep(0.1)
+        claims.append(await session.claim_game(game_id, "worker2", 10))
+        return claims
+
+    assert asyncio.run(run()) == ["worker1", "worker2"]
+    assert memory_store.get(session._game_owner_key(game_id)) == "worker2"
+
+
+def test_memory_store_expires_keys(memory_store):
+    memory_store.set("seconds", 1, ex=10)
+    memory_store.set("milliseconds", 1, px=20)
+    memory_store.set("forever", 1)
+    memory_store.set("refreshed", 1, px=20)
+    memory_store.set("refreshed", 2)
+    time.sleep(0.05)
+
+    assert memory_store.get("milliseconds") is None
+    assert memory_store.version("milliseconds") is None
+    assert sorted(memory_store.keys()) == ["forever", "refreshed", "seconds"]
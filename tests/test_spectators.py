@@ -0,0 +1,148 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from starlette.websockets import WebSocketState
+
+import server.actors as actors
+import server.codec as codec
+import server.session as session
+import server.socket_handler as socket_handler
+from server.models.game_state import GameStateDelta
+from server.socket_handler import Audience, Spectator, gameboard_channel
+
+
+class SpectatorWebSocket:
+    """Records what is written to it. Writes wait while `open` is clear, like a client that has stopped reading."""
+
+    def __init__(self):
+        self.application_state = WebSocketState.CONNECTED
+        self.state = SimpleNamespace()
+        self.open = asyncio.Event()
+        self.open.set()
+        self.sent = []
+
+    async def send_bytes(self, data: bytes):
+        await self.open.wait()
+        self.sent.append(json.loads(data))
+
+    def operations(self) -> list:
+        return [(message["operation"], message["payload"].get("seq")) for message in self.sent]
+
+
+def event(seq: int, operation: str = "EVENT") -> dict[str, bytes]:
+    return {codec.JSON: json.dumps({"operation": operation, "payload": {"seq": seq}}).encode()}
+
+
+def snapshot_loader(seq: int, gate: asyncio.Event = None):
+    async def load(game_id: str):
+        if gate is not None:
+            await gate.wait()
+        return seq, await session.load_game(game_id), []
+
+    return load
+
+
+def test_events_that_arrive_while_a_snapshot_loads_are_sent_after_it(game_id):
+    async def run():
+        gate = asyncio.Event()
+        audience = Audience(game_id, snapshot_loader(2, gate))
+        spectator = Spectator(SpectatorWebSocket())
+        audience.add(spectator)
+        for seq in range(1, 5):
+            audience.broadcast(seq, event(seq))
+        gate.set()
+        await asyncio.sleep(0.01)
+        audience.broadcast(4, event(4))
+        audience.broadcast(5, event(5))
+        await asyncio.sleep(0.01)
+        audience.stop()
+        return spectator.websocket.operations()
+
+    assert asyncio.run(run()) == [("GAME_SNAPSHOT", 2), ("EVENT", 3), ("EVENT", 4), ("EVENT", 5)]
+
+
+def test_spectator_that_falls_behind_is_resynced(monkeypatch, game_id):
+    monkeypatch.setattr(socket_handler, "_spectator_queue_size", 2)
+
+    async def run():
+        audience = Audience(game_id, snapshot_loader(0))
+        spectator = Spectator(SpectatorWebSocket())
+        audience.add(spectator)
+        await asyncio.sleep(0.01)
+        spectator.websocket.open.clear()
+        audience._load_snapshot = snapshot_loader(6)
+        for seq in range(1, 8):
+            audience.broadcast(seq, event(seq))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        spectator.websocket.open.set()
+        await asyncio.sleep(0.01)
+        audience.resync(spectator)
+        await asyncio.sleep(0.01)
+        audience.stop()
+        return spectator.websocket.operations()
+
+    operations = asyncio.run(run())
+
+    assert operations[:2] == [("GAME_SNAPSHOT", 0), ("EVENT", 1)]
+    assert operations[-3:] == [("GAME_SNAPSHOT", 6), ("EVENT", 7), ("GAME_SNAPSHOT", 6)]
+
+
+def test_snapshot_includes_the_board_players_and_current_turn(game_id):
+    async def run():
+        def publish(operation: str, payload: dict, channels: list[str]):
+            return session.append_event(game_id, json.dumps(channels), operation, json.dumps({"operation": operation, "payload": payload}))
+
+        await publish("WAITING_FOR_PLAYER_CHOICE", {"playerName": "P1"}, [gameboard_channel(game_id)])
+        await publish("WAITING_FOR_PLAYER_CHOICE", {"playerName": "P2"}, [gameboard_channel(game_id)])
+        await publish("CLUE_SELECTED", {"categoryKey": "Category_0", "amount": "200", "clueText": "Clue 0 200"}, [gameboard_channel(game_id)])
+        await publish("PLAYER_TURN_START", {}, ["player"])
+        seq, game, events = await actors.load_snapshot(game_id)
+        return socket_handler._game_snapshot(game_id, seq, game, events)
+
+    snapshot = codec.to_wire(asyncio.run(run()))
+
+    assert (snapshot["seq"], snapshot["version"], snapshot["currentRound"]) == (4, 2, 0)
+    assert snapshot["rounds"][0][0] == {"name": "Category 0", "key": "Category_0", "tiles": {"200": {"id": "0_0_200", "answered": False}, "400": {"id": "0_0_400", "answered": False}}}
+    assert [player["id"] for player in snapshot["players"]] == ["p1", "p2"]
+    assert [message["operation"] for message in snapshot["events"]] == ["WAITING_FOR_PLAYER_CHOICE", "CLUE_SELECTED"]
+    assert snapshot["events"][0]["payload"] == {"playerName": "P2"}
+
+
+def test_snapshot_applies_logged_changes_that_were_not_checkpointed(game_id):
+    async def run():
+        game = await session.load_game(game_id)
+        game.mark_tile_answered(game.game_board.get_tile("Category_0", "200"))
+        game.save_player(game.get_player("p1").copy(update={"score": 200}))
+        game._stamp()
+        message = codec.encode_message(game_id, "STATE_CHANGED", game.changes()).decode()
+        await session.append_event(game_id, json.dumps([gameboard_channel(game_id)]), "STATE_CHANGED", message)
+        return await actors.load_snapshot(game_id)
+
+    seq, game, _ = asyncio.run(run())
+
+    assert seq == 1
+    assert game.game_board.version == 3
+    assert game.game_board.get_tile("Category_0", "200").answered
+    assert game.get_player("p1").score == 200
+
+
+def test_snapshot_of_a_game_owned_by_this_worker_comes_from_its_actor(monkeypatch, game_id):
+    async def run():
+        game = await session.load_game(game_id)
+        game.save_player(game.get_player("p2").copy(update={"score": 400}))
+        actor = SimpleNamespace(_owned=True, game_board=game.game_board, view=lambda: game)
+        monkeypatch.setitem(actors._actors, game_id, actor)
+        return await actors.load_snapshot(game_id)
+
+    _, game, _ = asyncio.run(run())
+
+    assert game.get_player("p2").score == 400
+
+
+def test_state_changes_replay_in_order_from_the_log():
+    changes = [GameStateDelta(since_version=v, version=v + 1, current_round=0, answered_tile_ids=[], players=[], removed_player_ids=[]) for v in (1, 3, 2)]
+    events = [(seq, "STATE_CHANGED", [], json.dumps({"payload": c.dict(by_alias=True)})) for seq, c in enumerate(changes, 1)]
+
+    assert [c.version for c in actors._unapplied_changes(events, 1)] == [2, 3]
@@ -0,0 +1,83 @@
+"""
+Measures the per-message cost of encoding outbound socket messages and decoding inbound ones.
+
+Compares the pydantic path the socket layer used to take (build a `SocketMessage`, `.dict(by_alias=True)`, then
+`json.dumps`; `receive_json` followed by two `parse_obj` calls) with the codec layer, for both JSON and MessagePack.
+Needs no Redis:
+
+    SESSION_BACKEND=memory PYTHONPATH=. python tools/benchmark_codec.py --iterations 20000
+"""
+import argparse
+import json
+import timeit
+
+import msgpack
+
+import server.codec as codec
+from server.models import SocketMessage
+from server.models.game_state import Player
+from server.models.message import ClueAnswered, GameOverMessage, PlayerBuzzMessage, ResponseCorrectMessage
+from server.socket_handler import _parse_envelope
+
+OUTBOUND = {
+    "CLUE_ANSWERED": ClueAnswered(category_key="Look_Up", amount="400", answered_correctly=False, player_id="p1", players_buzzed=["p1", "p2"]),
+    "GAME_OVER": GameOverMessage(players=[Player(id=f"player{i}", name=f"Player {i}", score=i * 200) for i in range(6)]),
+}
+INBOUND = {
+    "PLAYER_BUZZ": (PlayerBuzzMessage, {"playerId": "p1", "clueId": "0_0_400"}),
+    "RESPONSE_CORRECT": (ResponseCorrectMessage, {"playerId": "p1", "categoryKey": "Look_Up", "amount": "400"}),
+}
+
+
+def _pydantic_encode(operation, message):
+    data = SocketMessage(operation=operation, payload=message.dict(by_alias=True), game_id="ABCD").dict(by_alias=True)
+    return json.dumps(data).encode()
+
+
+def _pydantic_decode(model_type, text):
+    message = SocketMessage.parse_obj(json.loads(text))
+    return model_type.parse_obj(message.payload)
+
+
+def _codec_decode(model_type, frame, encoding):
+    message = _parse_envelope(codec.decode_frame(frame, encoding))
+    return model_type.parse_obj(message.payload)
+
+
+def _per_message_us(func, iterations: int) -> float:
+    return round(min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6, 2)
+
+
+def main(iterations: int):
+    results = []
+    for operation, message in OUTBOUND.items():
+        encoded = codec.encode_message("ABCD", operation, message)
+        results.append({
+            "direction": "encode",
+            "message": operation,
+            "pydantic_json_us": _per_message_us(lambda: _pydantic_encode(operation, message), iterations),
+            "codec_json_us": _per_message_us(lambda: codec.encode_message("ABCD", operation, message), iterations),
+            "codec_msgpack_us": _per_message_us(lambda: codec.transcode(codec.encode_message("ABCD", operation, message), codec.MSGPACK), iterations),
+            "json_bytes": len(encoded),
+            "msgpack_bytes": len(codec.transcode(encoded, codec.MSGPACK)),
+        })
+
+    for operation, (model_type, payload) in INBOUND.items():
+        data = {"operation": operation, "gameId": "ABCD", "payload": payload}
+        text_frame = {"type": "websocket.receive", "text": json.dumps(data)}
+        binary_frame = {"type": "websocket.receive", "bytes": msgpack.packb(data)}
+        results.append({
+            "direction": "decode",
+            "message": operation,
+            "pydantic_json_us": _per_message_us(lambda: _pydantic_decode(model_type, text_frame["text"]), iterations),
+            "codec_json_us": _per_message_us(lambda: _codec_decode(model_type, text_frame, codec.JSON), iterations),
+            "codec_msgpack_us": _per_message_us(lambda: _codec_decode(model_type, binary_frame, codec.MSGPACK), iterations),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark socket message encoding and decoding")
+    parser.add_argument("--iterations", action="store", dest="iterations", type=int, default=10000, help="Messages per timing run")
+    args = parser.parse_args()
+    main(args.iterations)
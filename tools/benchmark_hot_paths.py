@@ -0,0 +1,174 @@
+"""
+Measures the per-call CPU cost of the model and socket routing code that runs for every message, so a change to
+`server/models/` or the socket layer can be checked for regressions against a baseline.
+
+Covers parsing a realistic two round board (`GameBoard.parse_raw`, `GameBoard.load_trusted` on a board cache miss and
+`GameBoard.with_state` on a hit), `GameBoard.get_tile`, `GameBoard.remaining_tile_count`, `Category.initialize_key`, the
+encoding `publish_message` does before handing a message to Redis, `SocketHandler.handle_operation` dispatching a
+frame to its handler and `SocketHandler.handle_error` finding the handler for an exception through its MRO. Needs no Redis. Save a baseline,
+make the change, then compare:
+
+    SESSION_BACKEND=memory PYTHONPATH=. python tools/benchmark_hot_paths.py --output baseline.json
+    SESSION_BACKEND=memory PYTHONPATH=. python tools/benchmark_hot_paths.py --output after.json --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import timeit
+from json import JSONDecodeError
+from types import SimpleNamespace
+
+from pydantic import ValidationError
+from starlette.websockets import WebSocketDisconnect, WebSocketState
+
+import server.codec as codec
+from server.exceptions import InvalidOperation
+from server.models.game_state import Category, GameBoard, GameStateDelta, Player
+from server.models.message import ClueAnswered, PlayerBuzzMessage
+from server.socket_handler import SocketHandler, gameboard_channel, host_channel, player_channel
+
+_PLAYER_IDS = [f"player{i}" for i in range(4)]
+_FRAMES_PER_RUN = 100
+
+
+def build_board_json() -> str:
+    rounds = []
+    for round_num in range(2):
+        categories = []
+        for category_num in range(6):
+            tiles = {
+                str(amount * (round_num + 1)): {"clue": f"This is clue number {amount} in category {category_num}", "correct_response": "What is it?"}
+                for amount in range(200, 1200, 200)
+            }
+            categories.append({"name": f"Category & Name {category_num}!", "tiles": tiles})
+        rounds.append(categories)
+    return json.dumps({"rounds": rounds})
+
+
+class BenchmarkWebSocket:
+    """Just enough of a websocket for `SocketHandler`: it yields `frames`, then a disconnect."""
+
+    def __init__(self, frames: list[dict]):
+        self.frames = iter(frames)
+        self.application_state = WebSocketState.CONNECTED
+        self.state = SimpleNamespace()
+
+    async def receive(self) -> dict:
+        return next(self.frames, {"type": "websocket.disconnect", "code": 1000})
+
+    async def send_json(self, data):
+        pass
+
+
+def build_socket_handler() -> SocketHandler:
+    """A handler with the same error handler types as the server, none of which reply."""
+    handler = SocketHandler()
+
+    @handler.operation("PLAYER_BUZZ", PlayerBuzzMessage, stateless=True)
+    async def handle_player_buzz(game_id: str, buzz_message: PlayerBuzzMessage, player_id: str):
+        pass
+
+    async def ignore(websocket, exc):
+        return None
+
+    for exception_type in (InvalidOperation, ValidationError, JSONDecodeError, WebSocketDisconnect, Exception):
+        handler.error(exception_type)(ignore)
+    return handler
+
+
+def _publish_encoding(operation: str, message, channels: list[str]) -> tuple[str, str]:
+    """What `publish_message` does before calling Redis."""
+    return json.dumps(channels), codec.encode_message("ABCD", operation, message).decode()
+
+
+def _per_call_us(func, iterations: int, calls_per_run: int = 1) -> float:
+    return round(min(timeit.repeat(func, number=iterations, repeat=5)) / (iterations * calls_per_run) * 1e6, 3)
+
+
+def run_benchmarks(iterations: int) -> dict[str, float]:
+    raw_board = build_board_json()
+    stored_board = GameBoard.parse_raw(raw_board).json()
+    board = GameBoard.parse_raw(raw_board)
+    last_category = board.rounds[0][-1]
+    last_amount = list(last_category.tiles)[-1]
+    for tile in list(last_category.tiles.values())[:3]:
+        board.mark_tile_answered(tile)
+    answered_tile_versions = {tile.id: 4 for tile in [tile for category in board.rounds[0] for tile in category.tiles.values() if not tile.answered][:6]}
+
+    clue_answered = ClueAnswered(category_key="Look_Up", amount="400", answered_correctly=False, player_id="player1", players_buzzed=["player1", "player2"])
+    all_channels = [host_channel("ABCD"), gameboard_channel("ABCD"), *player_channel("ABCD", _PLAYER_IDS)]
+    state_changed = GameStateDelta(
+        since_version=3, version=4, current_round=0, answered_tile_ids=["0_0_200"], players=[Player(id=player_id, name=player_id, score=0) for player_id in _PLAYER_IDS]
+    )
+
+    socket_handler = build_socket_handler()
+    buzz_frame = {"type": "websocket.receive", "text": json.dumps({"operation": "PLAYER_BUZZ", "gameId": "ABCD", "payload": {"playerId": "p1", "clueId": "0_0_400"}})}
+    loop = asyncio.new_event_loop()
+
+    def dispatch():
+        loop.run_until_complete(socket_handler.handle_operation(BenchmarkWebSocket([buzz_frame] * _FRAMES_PER_RUN), player_id="p1"))
+
+    def handle_errors(exc: Exception):
+        async def run():
+            websocket = BenchmarkWebSocket([])
+            for _ in range(_FRAMES_PER_RUN):
+                await socket_handler.handle_error(websocket, exc)
+
+        loop.run_until_complete(run())
+
+    results = {
+        "game_board_parse_raw": _per_call_us(lambda: GameBoard.parse_raw(raw_board), max(iterations // 100, 10)),
+        "game_board_load_trusted": _per_call_us(lambda: GameBoard.load_trusted(stored_board), max(iterations // 100, 10)),
+        "game_board_with_state": _per_call_us(lambda: board.with_state(0, answered_tile_versions, 4), max(iterations // 100, 10)),
+        "game_board_get_tile": _per_call_us(lambda: board.get_tile(last_category.key, last_amount), iterations),
+        "game_board_remaining_tile_count": _per_call_us(board.remaining_tile_count, iterations),
+        "category_initialize_key": _per_call_us(lambda: Category.initialize_key({"name": "Category & Name 5!"}), iterations),
+        "publish_encoding_clue_answered": _per_call_us(lambda: _publish_encoding("CLUE_ANSWERED", clue_answered, all_channels), iterations),
+        "publish_encoding_state_changed": _per_call_us(lambda: _publish_encoding("STATE_CHANGED", state_changed, all_channels), iterations),
+        "handle_operation_dispatch": _per_call_us(dispatch, max(iterations // _FRAMES_PER_RUN, 10), _FRAMES_PER_RUN),
+        "handle_error_exact_match": _per_call_us(lambda: handle_errors(InvalidOperation("NOPE")), max(iterations // _FRAMES_PER_RUN, 10), _FRAMES_PER_RUN),
+        "handle_error_base_class_match": _per_call_us(lambda: handle_errors(KeyError("NOPE")), max(iterations // _FRAMES_PER_RUN, 10), _FRAMES_PER_RUN),
+    }
+    loop.close()
+    return results
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict[str, float], baseline: dict[str, float]) -> list[dict]:
+    comparison = []
+    for name, per_call_us in results.items():
+        before = baseline.get(name)
+        change = round((per_call_us - before) / before * 100, 1) if before else None
+        comparison.append({"benchmark": name, "baseline_us": before, "current_us": per_call_us, "change_percent": change})
+    return comparison
+
+
+def main(iterations: int, output: str, baseline_path: str):
+    report = {"commit": _commit(), "python": platform.python_version(), "iterations": iterations, "per_call_us": run_benchmarks(iterations)}
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"Comparing {report['commit']} against {baseline['commit']}")
+        print(json.dumps(compare(report["per_call_us"], baseline["per_call_us"]), indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark the per-message model and socket routing hot paths")
+    parser.add_argument("--iterations", action="store", dest="iterations", type=int, default=20000, help="Calls per timing run for the cheap benchmarks")
+    parser.add_argument("--output", action="store", dest="output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", action="store", dest="baseline", default=None, help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+    main(args.iterations, args.output, args.baseline)
@@ -0,0 +1,115 @@
+"""
+Measures how many concurrent game operations the session store can sustain from a single event loop.
+
+Compares the old blocking client (every call stalls the loop) with the async pooled session layer. Run from the
+repository root against a local Redis:
+
+    REDIS_HOST=localhost REDIS_PORT=6379 PYTHONPATH=. python tools/benchmark_session.py --games 200 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import redis
+
+import server.session as session
+from server.models.game_state import GameBoard, Player
+
+
+def build_game_board() -> GameBoard:
+    rounds = []
+    for round_num in range(2):
+        categories = []
+        for category_num in range(5):
+            tiles = {str(amount * (round_num + 1)): {"clue": f"Clue {category_num} {amount}", "correct_response": "What is it"} for amount in range(200, 1200, 200)}
+            categories.append({"name": f"Category {category_num}", "tiles": tiles})
+        rounds.append(categories)
+    return GameBoard.parse_obj({"rounds": rounds})
+
+
+def _players(count: int) -> list[Player]:
+    return [Player(id=f"player{i}", name=f"Player {i}", score=0) for i in range(count)]
+
+
+class BlockingSession:
+    """The pre-async session layer: a synchronous client called directly from coroutines."""
+
+    def __init__(self):
+        self.db = redis.StrictRedis(host=os.environ["REDIS_HOST"], port=int(os.environ["REDIS_PORT"]), decode_responses=True)
+
+    async def save_game_board(self, game_id: str, game_board: GameBoard):
+        self.db.set(f"{game_id}:board", game_board.json(), ex=600)
+
+    async def get_game_board(self, game_id: str) -> GameBoard:
+        return GameBoard.parse_raw(self.db.get(f"{game_id}:board"))
+
+    async def save_player(self, game_id: str, player: Player):
+        self.db.set(f"{game_id}:player:{player.id}", player.json(), ex=600)
+
+    async def get_all_players(self, game_id: str) -> list[Player]:
+        keys = list(self.db.scan_iter(f"{game_id}:player:*"))
+        return [Player.parse_raw(p) for p in self.db.mget(keys)] if keys else []
+
+    async def buzz(self, game_id: str, clue_id: str, player_id: str) -> tuple[bool, set[str]]:
+        won = self.db.incr(f"{game_id}:buzz_lock:{clue_id}") == 1
+        self.db.expire(f"{game_id}:buzz_lock:{clue_id}", time=600)
+        if won:
+            self.db.sadd(f"{game_id}:player_buzz:{clue_id}", player_id)
+        return won, self.db.smembers(f"{game_id}:player_buzz:{clue_id}")
+
+    async def close(self):
+        self.db.close()
+
+
+async def play_game(store, game_id: str, game_board: GameBoard, players: list[Player], rounds: int) -> int:
+    operations = 0
+    await store.save_game_board(game_id, game_board)
+    for player in players:
+        await store.save_player(game_id, player)
+    operations += 1 + len(players)
+
+    for clue_num in range(rounds):
+        roster = await store.get_all_players(game_id)
+        await store.buzz(game_id, f"clue{clue_num}", roster[0].id)
+        roster = await store.get_all_players(game_id)
+        roster[0].score += 200
+        await store.save_player(game_id, roster[0])
+        board = await store.get_game_board(game_id)
+        await store.save_game_board(game_id, board)
+        operations += 6
+    return operations
+
+
+async def run(store, label: str, games: int, players_per_game: int, rounds: int) -> dict:
+    game_board = build_game_board()
+    start = time.perf_counter()
+    counts = await asyncio.gather(
+        *(play_game(store, f"BENCH_{label}_{i}", game_board, _players(players_per_game), rounds) for i in range(games))
+    )
+    elapsed = time.perf_counter() - start
+    await store.close()
+    return {
+        "mode": label,
+        "games": games,
+        "elapsed_seconds": round(elapsed, 3),
+        "operations_per_second": round(sum(counts) / elapsed, 1),
+        "games_per_second": round(games / elapsed, 2),
+    }
+
+
+async def main(games: int, players_per_game: int, rounds: int):
+    blocking = await run(BlockingSession(), "blocking", games, players_per_game, rounds)
+    await session.start()
+    results = [blocking, await run(session, "async", games, players_per_game, rounds)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark concurrent game throughput of the session store")
+    parser.add_argument("--games", action="store", dest="games", type=int, default=100, help="Number of concurrent games")
+    parser.add_argument("--players", action="store", dest="players", type=int, default=6, help="Players per game")
+    parser.add_argument("--rounds", action="store", dest="rounds", type=int, default=20, help="Clues judged per game")
+    args = parser.parse_args()
+    asyncio.run(main(args.games, args.players, args.rounds))
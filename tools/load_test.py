@@ -0,0 +1,258 @@
+"""
+Plays full games against a running server to find how many concurrent games one instance can handle.
+
+Sets up `--games` games through the real endpoints, each with a host, a gameboard and `--players` players, and drives
+them with bots that follow the same operation flow as the bundled pages: every player sends PLAYER_INIT, the host
+sends START_GAME, the player whose turn it is sends SELECT_CLUE, the gameboard reveals the clue, every player buzzes
+and the host judges the winner with RESPONSE_CORRECT or RESPONSE_INCORRECT until the board is cleared and GAME_OVER
+arrives. Players answer PING with PONG like the real client does. The last player to buzz on a clue is always judged
+correct, so every clue ends the way a game without timers can.
+
+Reports messages delivered per second across all sockets, the websocket frames they came in (fewer than the messages
+with `--batch`, which has the sockets take batched frames), the latency from the first buzz of a clue to the host
+receiving PLAYER_BUZZED (which includes the buzz window), and the fan-out lag of each broadcast, i.e. how long after
+the first socket of a game received an event the last one did. Start the server against a local Redis, or with the
+in-memory backend, then run from the repository root:
+
+    REDIS_HOST=localhost REDIS_PORT=6379 uvicorn server.main:app --workers 4
+    SESSION_BACKEND=memory uvicorn server.main:app
+    python tools/load_test.py --url http://localhost:8000 --games 100 --players 4 --think-time 0.1
+    python tools/load_test.py --url http://localhost:8000 --games 100 --batch
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import urllib.request
+from typing import Optional
+
+import websockets
+
+
+def build_board(rounds: int, categories: int, clues: int) -> dict:
+    board = []
+    for round_num in range(rounds):
+        tiles = {str(200 * (i + 1) * (round_num + 1)): {"clue": f"Clue {i}", "correct_response": "Response"} for i in range(clues)}
+        board.append([{"name": f"Category {round_num} {c}", "tiles": tiles} for c in range(categories)])
+    return {"rounds": board}
+
+
+def board_tiles(board: dict) -> list[tuple[str, str]]:
+    """The board's tiles in the order they are played: every tile of a round before the next round starts."""
+    return [(category["name"].replace(" ", "_"), amount) for categories in board["rounds"] for category in categories for amount in category["tiles"]]
+
+
+def post(url: str, path: str, body: dict) -> dict:
+    request = urllib.request.Request(url + path, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def percentile_ms(values: list[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(len(values) * fraction), len(values) - 1)] * 1000, 2)
+
+
+class Results:
+    def __init__(self):
+        self.messages = 0
+        self.frames = 0
+        self.buzz_latencies: list[float] = []
+        self.clues = 0
+
+
+class Game:
+    """What the bots of one game share: the tiles left to play, the clue in play and when each event reached the
+    game's sockets."""
+
+    def __init__(self, game_id: str, tiles: list[tuple[str, str]], players: int, incorrect_rate: float, think_time: float):
+        self.game_id = game_id
+        self.tiles = list(tiles)
+        self.players = players
+        self.incorrect_rate = incorrect_rate
+        self.think_time = think_time
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.over = asyncio.Event()
+        self.clue: Optional[tuple[str, str]] = None
+        self.clue_id: Optional[str] = None
+        self.tried: set[str] = set()
+        self.awaiting_buzz = False
+        self.buzz_started: Optional[float] = None
+        self.received: dict[int, list[float]] = {}
+
+    def record(self, seq: Optional[int], received_at: float):
+        if seq is None:
+            return
+        times = self.received.setdefault(seq, [received_at, received_at])
+        times[1] = received_at
+
+    def fan_out_lags(self) -> list[float]:
+        return [last - first for first, last in self.received.values()]
+
+    async def think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+
+
+class Bot:
+    def __init__(self, role: str, game: Game, websocket, results: Results, player_id: Optional[str] = None):
+        self.role = role
+        self.game = game
+        self.websocket = websocket
+        self.results = results
+        self.player_id = player_id
+        self._actions: set[asyncio.Task] = set()
+
+    async def run(self):
+        async for frame in self.websocket:
+            received_at = time.perf_counter()
+            self.results.frames += 1
+            data = json.loads(frame)
+            for message in data if isinstance(data, list) else [data]:
+                operation, payload = message["operation"], message.get("payload") or {}
+                if operation != "PING":
+                    self.results.messages += 1
+                    self.game.record(message.get("seq"), received_at)
+                action = asyncio.create_task(getattr(self, f"on_{self.role}")(operation, payload, received_at))
+                self._actions.add(action)
+                action.add_done_callback(self._actions.discard)
+
+    async def send(self, operation: str, payload: dict):
+        await self.websocket.send(json.dumps({"operation": operation, "gameId": self.game.game_id, "payload": payload}))
+
+    async def on_host(self, operation: str, payload: dict, received_at: float):
+        game = self.game
+        if operation == "PLAYER_JOINED":
+            game.joined += 1
+            if game.joined == game.players:
+                game.all_joined.set()
+        elif operation == "PLAYER_BUZZED":
+            if game.buzz_started is not None:
+                self.results.buzz_latencies.append(received_at - game.buzz_started)
+                game.buzz_started = None
+            winner = payload["playerId"]
+            game.tried.add(winner)
+            await game.think()
+            category_key, amount = game.clue
+            correct = len(game.tried) == game.players or random.random() >= game.incorrect_rate
+            if not correct:
+                game.awaiting_buzz = True
+            else:
+                self.results.clues += 1
+            await self.send("RESPONSE_CORRECT" if correct else "RESPONSE_INCORRECT", {"playerId": winner, "categoryKey": category_key, "amount": amount})
+        elif operation == "GAME_OVER":
+            game.over.set()
+
+    async def on_gameboard(self, operation: str, payload: dict, _: float):
+        if operation == "CLUE_SELECTED":
+            await self.game.think()
+            await self.send("CLUE_REVEALED", {"categoryKey": payload["categoryKey"], "amount": payload["amount"]})
+
+    async def on_player(self, operation: str, payload: dict, _: float):
+        game = self.game
+        if operation == "PING":
+            await self.send("PONG", {"pingId": payload["pingId"]})
+        elif operation == "PLAYER_TURN_START" and game.tiles:
+            await game.think()
+            game.clue = game.tiles.pop(0)
+            game.tried.clear()
+            game.awaiting_buzz = True
+            await self.send("SELECT_CLUE", {"categoryKey": game.clue[0], "amount": game.clue[1]})
+        elif operation == "CLUE_REVEALED":
+            game.clue_id = payload["clueId"]
+            await self.buzz()
+        elif operation == "CLUE_ANSWERED" and payload.get("playersBuzzed") is not None and self.player_id not in payload["playersBuzzed"]:
+            await self.buzz()
+
+    async def buzz(self):
+        if self.game.awaiting_buzz:
+            self.game.awaiting_buzz = False
+            self.game.buzz_started = time.perf_counter()
+        await self.send("PLAYER_BUZZ", {"playerId": self.player_id, "clueId": self.game.clue_id})
+
+
+async def set_up_game(url: str, board: dict, players: int, incorrect_rate: float, think_time: float, batch: bool, results: Results) -> tuple[Game, list[Bot]]:
+    loop = asyncio.get_running_loop()
+    game_id = (await loop.run_in_executor(None, post, url, "/init_game", board))["gameId"]
+    await loop.run_in_executor(None, post, url, "/new_host", {"gameId": game_id})
+    game = Game(game_id, board_tiles(board), players, incorrect_rate, think_time)
+    socket_url = url.replace("http", "ws", 1)
+    query = f"batch={str(batch).lower()}"
+    bots = [
+        Bot("host", game, await websockets.connect(f"{socket_url}/host_socket/{game_id}?{query}"), results),
+        Bot("gameboard", game, await websockets.connect(f"{socket_url}/gameboard_socket/{game_id}?{query}"), results),
+    ]
+    for _ in range(players):
+        player = await loop.run_in_executor(None, post, url, "/new_player", {"gameId": game_id})
+        websocket = await websockets.connect(f"{socket_url}/player_socket/{game_id}/{player['playerId']}?resumeToken={player['resumeToken']}&{query}")
+        bots.append(Bot("player", game, websocket, results, player["playerId"]))
+    return game, bots
+
+
+async def play(game: Game, bots: list[Bot], timeout: float) -> bool:
+    for bot in bots:
+        if bot.role == "player":
+            await bot.send("PLAYER_INIT", {"playerName": f"Bot {bot.player_id[:6]}"})
+    try:
+        await asyncio.wait_for(game.all_joined.wait(), timeout=timeout)
+        await bots[0].send("START_GAME", {})
+        await asyncio.wait_for(game.over.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        print(f"Game {game.game_id} timed out with {len(game.tiles)} tiles left")
+        return False
+
+
+async def main(url: str, games: int, players: int, rounds: int, categories: int, clues: int, incorrect_rate: float, think_time: float, batch: bool, timeout: float):
+    results = Results()
+    board = build_board(rounds, categories, clues)
+    set_up = [await set_up_game(url, board, players, incorrect_rate, think_time, batch, results) for _ in range(games)]
+    sockets = [bot.websocket for _, bots in set_up for bot in bots]
+    readers = [asyncio.create_task(bot.run()) for _, bots in set_up for bot in bots]
+    print(f"Connected {len(sockets)} sockets across {games} games")
+
+    began = time.perf_counter()
+    completed = await asyncio.gather(*(play(game, bots, timeout) for game, bots in set_up))
+    await asyncio.sleep(0.5)
+    elapsed = time.perf_counter() - began
+
+    for task in readers:
+        task.cancel()
+    for websocket in sockets:
+        await websocket.close()
+
+    fan_out_lags = [lag for game, _ in set_up for lag in game.fan_out_lags()]
+    print(json.dumps({
+        "games": games,
+        "completed": sum(completed),
+        "sockets": len(sockets),
+        "clues_played": results.clues,
+        "seconds": round(elapsed, 2),
+        "messages": results.messages,
+        "messages_per_second": round(results.messages / elapsed, 1),
+        "frames": results.frames,
+        "buzz_latency_p50_ms": percentile_ms(results.buzz_latencies, 0.5),
+        "buzz_latency_p99_ms": percentile_ms(results.buzz_latencies, 0.99),
+        "fan_out_lag_p50_ms": percentile_ms(fan_out_lags, 0.5),
+        "fan_out_lag_p99_ms": percentile_ms(fan_out_lags, 0.99),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Play simulated games against a running server and report throughput and latency")
+    parser.add_argument("--url", action="store", dest="url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--games", action="store", dest="games", type=int, default=20, help="Number of concurrent games")
+    parser.add_argument("--players", action="store", dest="players", type=int, default=4, help="Players per game")
+    parser.add_argument("--rounds", action="store", dest="rounds", type=int, default=2, help="Rounds per game")
+    parser.add_argument("--categories", action="store", dest="categories", type=int, default=5, help="Categories per round")
+    parser.add_argument("--clues", action="store", dest="clues", type=int, default=5, help="Clues per category")
+    parser.add_argument("--incorrect-rate", action="store", dest="incorrect_rate", type=float, default=0.25, help="Chance the host judges a buzz incorrect")
+    parser.add_argument("--think-time", action="store", dest="think_time", type=float, default=0.05, help="Mean seconds a bot waits before acting")
+    parser.add_argument("--batch", action="store_true", dest="batch", help="Have the sockets take batched frames")
+    parser.add_argument("--timeout", action="store", dest="timeout", type=float, default=300, help="Seconds to wait for each game to finish")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.games, args.players, args.rounds, args.categories, args.clues, args.incorrect_rate, args.think_time, args.batch, args.timeout))
@@ -0,0 +1,20 @@
+"""
+One-off migration of live player records into the per-game player hash.
+
+Run from the repository root with the same Redis environment variables as the server:
+
+    REDIS_HOST=localhost REDIS_PORT=6379 PYTHONPATH=. python tools/migrate_player_index.py
+"""
+import asyncio
+
+import server.session as session
+
+
+async def main():
+    migrated = await session.migrate_legacy_players()
+    print(f"Migrated {migrated} player record(s)")
+    await session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
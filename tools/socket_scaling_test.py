@@ -0,0 +1,109 @@
+"""
+Measures how many socket messages a server delivers per second as the number of connected games grows, to compare
+runs with different worker counts.
+
+Sets up `--games` games, each with a host, a gameboard and `--players` player sockets, then has every player send
+SELECT_CATEGORY messages at `--rate` per second for `--duration` seconds. Each one is broadcast to the game's host and
+gameboard sockets, so the test exercises publishing, the per-worker routing table and socket writes without touching
+game state. Reports delivered messages per second and the send-to-receive latency. Start the server, then run from the
+repository root:
+
+    uvicorn server.main:app --workers 4
+    python tools/socket_scaling_test.py --url http://localhost:8000 --games 200 --players 4 --rate 2 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+
+import websockets
+
+_BOARD = {"rounds": [[{"name": "Load Test", "tiles": {"100": {"clue": "clue", "correct_response": "response"}}}]]}
+
+
+def post(url: str, path: str, body: dict) -> dict:
+    request = urllib.request.Request(url + path, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+async def receive(websocket, latencies: list[float]):
+    async for message in websocket:
+        data = json.loads(message)
+        if data.get("operation") == "CATEGORY_SELECTED":
+            latencies.append(time.time() - float(data["payload"]["categoryKey"]))
+
+
+async def send(websocket, game_id: str, rate: float, deadline: float):
+    while time.time() < deadline:
+        message = {"operation": "SELECT_CATEGORY", "gameId": game_id, "payload": {"categoryKey": repr(time.time())}}
+        await websocket.send(json.dumps(message))
+        await asyncio.sleep(1 / rate)
+
+
+async def set_up_game(url: str, players: int) -> tuple[str, list[str], list[str]]:
+    loop = asyncio.get_running_loop()
+    game_id = (await loop.run_in_executor(None, post, url, "/init_game", _BOARD))["gameId"]
+    await loop.run_in_executor(None, post, url, "/new_host", {"gameId": game_id})
+    socket_url = url.replace("http", "ws", 1)
+    listeners = [f"{socket_url}/host_socket/{game_id}", f"{socket_url}/gameboard_socket/{game_id}"]
+    senders = []
+    for _ in range(players):
+        player = await loop.run_in_executor(None, post, url, "/new_player", {"gameId": game_id})
+        senders.append(f"{socket_url}/player_socket/{game_id}/{player['playerId']}?resumeToken={player['resumeToken']}")
+    return game_id, listeners, senders
+
+
+async def main(url: str, games: int, players: int, rate: float, duration: float):
+    latencies: list[float] = []
+    sockets = []
+    receivers = []
+    players_by_game = []
+    for _ in range(games):
+        game_id, listeners, senders = await set_up_game(url, players)
+        for listener_url in listeners:
+            websocket = await websockets.connect(listener_url)
+            sockets.append(websocket)
+            receivers.append(asyncio.create_task(receive(websocket, latencies)))
+        for sender_url in senders:
+            websocket = await websockets.connect(sender_url)
+            sockets.append(websocket)
+            receivers.append(asyncio.create_task(receive(websocket, latencies)))
+            players_by_game.append((game_id, websocket))
+    print(f"Connected {len(sockets)} sockets across {games} games")
+
+    deadline = time.time() + duration
+    began = time.perf_counter()
+    await asyncio.gather(*(send(websocket, game_id, rate, deadline) for game_id, websocket in players_by_game))
+    await asyncio.sleep(1)
+    elapsed = time.perf_counter() - began
+
+    for task in receivers:
+        task.cancel()
+    for websocket in sockets:
+        await websocket.close()
+
+    expected = int(duration * rate) * 2 * len(players_by_game)
+    latencies.sort()
+    print(json.dumps({
+        "games": games,
+        "sockets": len(sockets),
+        "delivered": len(latencies),
+        "expected": expected,
+        "messages_per_second": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "latency_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Measure socket message throughput against a running server")
+    parser.add_argument("--url", action="store", dest="url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--games", action="store", dest="games", type=int, default=50, help="Number of concurrent games")
+    parser.add_argument("--players", action="store", dest="players", type=int, default=4, help="Player sockets per game")
+    parser.add_argument("--rate", action="store", dest="rate", type=float, default=2, help="Messages per second sent by each player")
+    parser.add_argument("--duration", action="store", dest="duration", type=float, default=20, help="Seconds to send for")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.games, args.players, args.rate, args.duration))
@@ -0,0 +1,90 @@
+"""
+Summarizes the spans the server writes to TRACE_FILE into where the time goes between an operation arriving and each
+socket being sent the events it caused.
+
+Every socket write of a traced event is broken down into the time from receiving the operation to its handler starting
+(`queued`, which includes forwarding to the game's owner in actor mode), from the handler starting to publishing the
+event (`handler`), the publish call until Redis ran it (`publish`), Redis pubsub reaching the worker's router
+(`pubsub`) and the event's wait in the socket's outbound queue plus the write itself (`socket`). Reports p50 and p99
+of each, and of the total, per published operation and recipient type, along with how many deliveries were dropped
+instead of written: duplicates, overflows of a full outbound queue and sockets that closed first. Run the server with
+tracing on, play a game, then run from the repository root:
+
+    TRACE_SAMPLE_RATE=0.1 TRACE_FILE=traces.jsonl uvicorn server.main:app
+    python tools/trace_report.py --file traces.jsonl
+"""
+import argparse
+import json
+from collections import defaultdict
+from typing import Optional
+
+_STAGES = ("queued", "handler", "publish", "pubsub", "socket", "total")
+
+
+def load_spans(path: str) -> dict[str, dict]:
+    with open(path) as trace_file:
+        return {span["spanId"]: span for span in map(json.loads, trace_file)}
+
+
+def recipient_type(channel: str) -> str:
+    """Channels look like `<game ID>:channel:<host|gameboard|player:<player ID>>`."""
+    return channel.split(":")[2]
+
+
+def percentile_ms(values: list[int], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(len(values) * fraction), len(values) - 1)] / 1e6, 2)
+
+
+def _attributes(span: dict) -> dict:
+    return {attribute["key"]: next(iter(attribute["value"].values())) for attribute in span["attributes"]}
+
+
+def deliveries(spans: dict[str, dict]) -> dict[tuple[str, str], dict[str, list]]:
+    """Each socket write's stage durations in nanoseconds, grouped by the published operation and recipient type, with
+    the reasons of dropped deliveries under `dropped`. Writes whose trace is missing a span, e.g. because it was
+    exported by a worker writing to another file, are skipped."""
+    grouped = defaultdict(lambda: defaultdict(list))
+    for deliver in spans.values():
+        if deliver["name"] != "deliver":
+            continue
+        route = spans.get(deliver["parentSpanId"])
+        publish = route and spans.get(route["parentSpanId"])
+        handle = publish and spans.get(publish["parentSpanId"])
+        receive = handle and spans.get(handle["parentSpanId"])
+        if not receive:
+            continue
+        received, handled, published, routed, delivered = (int(span["startTimeUnixNano"]) for span in (receive, handle, publish, route, deliver))
+        end = int(deliver["endTimeUnixNano"])
+        attributes = _attributes(deliver)
+        stages = grouped[(publish["name"].split(" ", 1)[1], recipient_type(attributes["channel"]))]
+        if "dropped" in attributes:
+            stages["dropped"].append(attributes["dropped"])
+            continue
+        stages["queued"].append(handled - received)
+        stages["handler"].append(published - handled)
+        stages["publish"].append(routed - published)
+        stages["pubsub"].append(delivered - routed)
+        stages["socket"].append(end - delivered)
+        stages["total"].append(end - received)
+    return grouped
+
+
+def main(path: str):
+    report = []
+    for (operation, recipient), stages in sorted(deliveries(load_spans(path)).items()):
+        row = {"operation": operation, "recipient": recipient, "deliveries": len(stages["total"]), "dropped": len(stages["dropped"])}
+        for stage in _STAGES:
+            row[f"{stage}_p50_ms"] = percentile_ms(stages[stage], 0.5)
+            row[f"{stage}_p99_ms"] = percentile_ms(stages[stage], 0.99)
+        report.append(row)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Break traced socket deliveries down into where the time went")
+    parser.add_argument("--file", action="store", dest="file", default="traces.jsonl", help="Spans written by the server to TRACE_FILE")
+    args = parser.parse_args()
+    main(args.file)